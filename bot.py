@@ -1,2 +0,0 @@
-python main.py &
-python render_app.py
@@ -2,15 +2,38 @@
 Telegram bot command and callback handlers
 """
 import logging
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+import math
+import time
+import hashlib
+from telegram import (
+    Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto,
+    InlineQueryResultArticle, InlineQueryResultCachedPhoto, InputTextMessageContent
+)
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 from utils.formatter import MessageFormatter
 from utils.search_filters import SearchFilters
+from utils.file_id_cache import FileIdCache
+from utils.name_index import PhoneNameIndex
+from utils.result_store import ResultSetStore
+from bot.outbound import OutboundScheduler, INTERACTIVE, BULK
+from scrapers.job_queue import QueuedSearch
+from scrapers.scheduler import FairScrapeScheduler, QuotaExceeded
+from telegram.error import BadRequest, RetryAfter
 import re
 
 logger = logging.getLogger(__name__)
 
+# Minimum seconds between edits of the live "Searching..." progress message
+PROGRESS_UPDATE_INTERVAL = 1.0
+
+# Inline query answers
+INLINE_RESULTS_LIMIT = 10
+INLINE_CACHE_TIME = 60
+
+# Known phone names offered as "did you mean" buttons after a search
+SUGGESTION_LIMIT = 3
+
 class BotHandlers:
     """Handler class for bot commands and callbacks"""
     
@@ -19,6 +42,15 @@ class BotHandlers:
         self.scraper = scraper
         self.formatter = MessageFormatter()
         self.search_filters = SearchFilters(config)
+        self.file_ids = FileIdCache(config.FILE_ID_CACHE_PATH)
+        self.outbound = OutboundScheduler(config)
+        self.result_store = ResultSetStore(config.RESULT_SET_TTL, config.RESULT_STORE_MAX_BYTES)
+        # Searches run in this process, or on separate scrape workers
+        self.search_backend = QueuedSearch(config, scraper) if config.SCRAPE_BACKEND == 'queue' else scraper
+        # Per-user quotas and fair turns for searches that are not cached
+        self.scrape_scheduler = FairScrapeScheduler(config, self.search_backend, scraper)
+        # Stage timings, recorded alongside the scraper's own
+        self.latency = scraper.latency
     
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /start command"""
@@ -44,7 +76,8 @@ Welcome! I can help you find detailed information about mobile phones from:
 Get started by typing /search followed by the phone name!
         """
         
-        await update.message.reply_text(
+        await self._reply(
+            update.message,
             welcome_message,
             parse_mode=ParseMode.MARKDOWN
         )
@@ -82,7 +115,8 @@ Get started by typing /search followed by the phone name!
 Need help? Just type your query after /search!
         """
         
-        await update.message.reply_text(
+        await self._reply(
+            update.message,
             help_message,
             parse_mode=ParseMode.MARKDOWN
         )
@@ -93,7 +127,8 @@ Need help? Just type your query after /search!
             return
             
         if not context.args:
-            await update.message.reply_text(
+            await self._reply(
+                update.message,
                 "❌ Please provide a search query!\n\n"
                 "Usage: `/search <phone name>`\n"
                 "Example: `/search iPhone 15 Pro`",
@@ -102,54 +137,137 @@ Need help? Just type your query after /search!
             return
         
         query = " ".join(context.args)
+        await self._run_search(update, context, update.message, query)
+    
+    async def _run_search(self, update: Update, context: ContextTypes.DEFAULT_TYPE, message, query: str, correct: bool = True):
+        """Search for a query and stream the results as replies to ``message``
+        
+        Unless ``correct`` is False the query is spell-corrected first, and
+        "did you mean" buttons offer the original query and close matches.
+        """
+        started = time.monotonic()
         
         # Show typing indicator
-        await update.message.reply_chat_action("typing")
+        await self.outbound.send(message.chat_id, message.reply_chat_action, "typing", metered=False)
         
         try:
             # Get user's active filters
             user_id = update.effective_user.id
             filters = context.user_data.get(f"filters_{user_id}", {}) if context.user_data else {}
             
+            # Rewrite misspelled queries before they cost a scrape
+            search_query = query
+            corrected = False
+            if correct:
+                corrected_query = self.scraper.query_corrector.correct(query)
+                if corrected_query and corrected_query != PhoneNameIndex.normalize(query):
+                    search_query, corrected = corrected_query, True
+            suggestions = self._build_suggestions(query, search_query, corrected)
+            
             # Send searching message
-            searching_msg = await update.message.reply_text(
-                f"🔍 Searching for '{query}'...\n"
+            searching_text = f"🔍 Searching for '{search_query}'"
+            if corrected:
+                searching_text += f" (corrected from '{query}')"
+            searching_msg = await self._reply(
+                message,
+                f"{searching_text}...\n"
                 "This may take a few seconds.",
                 parse_mode=ParseMode.MARKDOWN
             )
             
-            # Perform search
-            products = self.scraper.search_mobiles(query, filters)
+            # Stream results, sending the first page of cards as they arrive
+            products = []
+            card_messages = []
+            album_mode = self.config.RESULTS_SEND_MODE == 'album'
+            page_size = self.config.MAX_RESULTS_PER_PAGE
+            last_progress = time.monotonic()
+            # Time spent sending the first page, which is interleaved with scraping
+            page_send = 0.0
+            async for product in self.scrape_scheduler.iter_search_mobiles(search_query, filters, user_id):
+                if not products:
+                    self.latency.observe('first_result', time.monotonic() - started)
+                products.append(product)
+                sent = time.monotonic()
+                if not album_mode and len(products) <= page_size:
+                    card_messages.append(await self._send_product_card(message, product))
+                elif album_mode and len(products) == page_size:
+                    # The album for the first page can go out as soon as it is full
+                    card_messages.extend(await self._send_product_album(message, products))
+                page_send += time.monotonic() - sent
+                if time.monotonic() - last_progress >= PROGRESS_UPDATE_INTERVAL:
+                    await self._update_search_progress(searching_msg, search_query, len(products))
+                    last_progress = time.monotonic()
+            
+            if album_mode and 0 < len(products) < page_size:
+                sent = time.monotonic()
+                card_messages.extend(await self._send_product_album(message, products))
+                page_send += time.monotonic() - sent
             
             # Delete searching message
-            await searching_msg.delete()
+            await self.outbound.send(searching_msg.chat_id, searching_msg.delete, metered=False)
             
             if not products:
-                await update.message.reply_text(
-                    f"❌ No results found for '{query}'\n\n"
+                await self._reply(
+                    message,
+                    f"❌ No results found for '{search_query}'\n\n"
                     "Try:\n"
                     "• Different keywords\n"
                     "• Brand name + model\n"
                     "• Remove filters with /filter",
-                    parse_mode=ParseMode.MARKDOWN
+                    parse_mode=ParseMode.MARKDOWN,
+                    reply_markup=InlineKeyboardMarkup(suggestions) if suggestions else None
                 )
                 return
             
-            # Store results for pagination
+            # Store results for pagination, user_data only keeps the result set id
+            rsid = self.result_store.put(search_query, filters, products)
             if context.user_data is not None:
-                context.user_data[f"search_results_{user_id}"] = products
+                context.user_data.pop(f"search_results_{user_id}", None)
+                context.user_data[f"result_set_{user_id}"] = rsid
                 context.user_data[f"current_page_{user_id}"] = 0
             
-            # Send first page of results
-            await self._send_search_results(update, context, products, 0)
+            # First page cards are already out, finish with the page header and navigation
+            header_text, reply_markup = self._build_results_header(products, 0, rsid)
+            if suggestions:
+                keyboard = list(reply_markup.inline_keyboard) if reply_markup else []
+                reply_markup = InlineKeyboardMarkup(keyboard + suggestions)
+            sent = time.monotonic()
+            header = await self._reply(message, header_text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
+            self.latency.observe('page_send', page_send + time.monotonic() - sent)
+            if context.user_data is not None:
+                context.user_data[f"card_messages_{user_id}"] = self._card_record(header, self._card_slots(card_messages))
+            self.latency.observe('search', time.monotonic() - started)
             
+        except QuotaExceeded as e:
+            logger.info(f"Search quota exceeded for user {user_id}")
+            await self.outbound.send(searching_msg.chat_id, searching_msg.delete, metered=False)
+            await self._reply(
+                message,
+                f"⏳ You're searching too quickly. Please try again in {math.ceil(e.retry_after)} seconds."
+            )
         except Exception as e:
             logger.error(f"Search error: {e}")
-            await update.message.reply_text(
+            await self._reply(
+                message,
                 "❌ An error occurred while searching. Please try again later.",
                 parse_mode=ParseMode.MARKDOWN
             )
     
+    def _build_suggestions(self, query: str, search_query: str, corrected: bool) -> list:
+        """Build "did you mean" keyboard rows for a search"""
+        rows = []
+        for entry in self.scraper.name_index.search(search_query, limit=SUGGESTION_LIMIT):
+            if entry['name'].lower() != search_query:
+                rows.append([InlineKeyboardButton(f"📱 {entry['name']}", callback_data=self._search_callback_data(entry['name']))])
+        if corrected:
+            rows.append([InlineKeyboardButton(f"🔍 Search '{query}' instead", callback_data=self._search_callback_data(query))])
+        return rows
+    
+    @staticmethod
+    def _search_callback_data(query: str) -> str:
+        """Callback data that re-runs a search, within Telegram's 64-byte limit"""
+        return f"search_{query}".encode('utf-8')[:64].decode('utf-8', 'ignore')
+    
     async def filter_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /filter command"""
         if not update.message or not update.effective_user:
@@ -170,13 +288,67 @@ Need help? Just type your query after /search!
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await update.message.reply_text(
+        await self._reply(
+            update.message,
             "🔧 *Search Filters*\n\n"
             "Configure your search preferences:",
             reply_markup=reply_markup,
             parse_mode=ParseMode.MARKDOWN
         )
     
+    async def inline_query(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Answer inline queries (@bot <phone name>) from the local name index
+        
+        Only phones already seen by the scraper are offered, so the answer
+        never waits on a live scrape.
+        """
+        if not update.inline_query:
+            return
+        
+        query = update.inline_query.query.strip()
+        entries = self.scraper.name_index.search(query, limit=INLINE_RESULTS_LIMIT) if query else []
+        
+        results = []
+        for entry in entries:
+            result_id = hashlib.md5(entry['name'].encode('utf-8')).hexdigest()
+            spec_line = self._inline_spec_line(entry)
+            file_id = self.file_ids.get(entry.get('image_url'))
+            
+            if file_id:
+                results.append(InlineQueryResultCachedPhoto(
+                    id=result_id,
+                    photo_file_id=file_id,
+                    title=entry['name'],
+                    description=spec_line,
+                    caption=self.formatter.format_product_caption(entry),
+                    parse_mode=ParseMode.MARKDOWN
+                ))
+            else:
+                results.append(InlineQueryResultArticle(
+                    id=result_id,
+                    title=entry['name'],
+                    description=spec_line,
+                    thumbnail_url=entry.get('image_url') or None,
+                    input_message_content=InputTextMessageContent(
+                        self.formatter.format_product_card(entry),
+                        parse_mode=ParseMode.MARKDOWN
+                    )
+                ))
+        
+        # Inline answers are not chat messages, they bypass the outbound queue
+        await update.inline_query.answer(results, cache_time=INLINE_CACHE_TIME)
+    
+    def _inline_spec_line(self, entry: dict) -> str:
+        """Short price and spec summary shown under an inline result"""
+        parts = []
+        if entry.get('price'):
+            parts.append(entry['price'])
+        if entry.get('specs'):
+            parts.append(self.formatter._clean_spec_text(entry['specs'][0]))
+        if entry.get('source'):
+            parts.append(entry['source'])
+        return " • ".join(parts)
+    
     async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle inline keyboard callbacks"""
         if not update.callback_query or not update.effective_user:
@@ -199,6 +371,9 @@ Need help? Just type your query after /search!
             await self._handle_brand_selection(update, context, data)
         elif data.startswith("price_"):
             await self._handle_price_selection(update, context, data)
+        elif data.startswith("search_"):
+            # "Did you mean" suggestions run exactly the query on the button
+            await self._run_search(update, context, query.message, data.replace("search_", "", 1), correct=False)
     
     async def _handle_filter_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE, data: str):
         """Handle filter-related callbacks"""
@@ -223,7 +398,8 @@ Need help? Just type your query after /search!
             keyboard.append([InlineKeyboardButton("« Back", callback_data="filter_back")])
             reply_markup = InlineKeyboardMarkup(keyboard)
             
-            await query.edit_message_text(
+            await self._edit(
+                query,
                 "📱 *Select Brand(s)*\n\nChoose one or more brands to filter:",
                 reply_markup=reply_markup,
                 parse_mode=ParseMode.MARKDOWN
@@ -239,7 +415,8 @@ Need help? Just type your query after /search!
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
             
-            await query.edit_message_text(
+            await self._edit(
+                query,
                 "💰 *Select Price Range*\n\nChoose your budget range:",
                 reply_markup=reply_markup,
                 parse_mode=ParseMode.MARKDOWN
@@ -248,7 +425,8 @@ Need help? Just type your query after /search!
         elif data == "filter_clear":
             if context.user_data is not None:
                 context.user_data[f"filters_{user_id}"] = {}
-            await query.edit_message_text(
+            await self._edit(
+                query,
                 "✅ All filters cleared!\n\nUse /search to find phones without any filters."
             )
         
@@ -264,7 +442,8 @@ Need help? Just type your query after /search!
                     filter_parts.append(f"Price: {filters['price_range']}")
                 filter_text = "\n".join(filter_parts)
             
-            await query.edit_message_text(
+            await self._edit(
+                query,
                 f"🔧 *Current Filters*\n\n{filter_text}"
             )
         
@@ -295,7 +474,8 @@ Need help? Just type your query after /search!
         
         selected_brands = ", ".join(filters['brand']) if filters['brand'] else "None"
         
-        await update.callback_query.edit_message_text(
+        await self._edit(
+            update.callback_query,
             f"✅ Brand filter updated!\n\n"
             f"Selected brands: {selected_brands}\n\n"
             f"Use /search to find phones with these filters."
@@ -319,7 +499,8 @@ Need help? Just type your query after /search!
             'flagship': 'Flagship (₹80K+)'
         }
         
-        await update.callback_query.edit_message_text(
+        await self._edit(
+            update.callback_query,
             f"✅ Price filter updated!\n\n"
             f"Selected range: {range_names[price_range]}\n\n"
             f"Use /search to find phones in this price range."
@@ -328,28 +509,43 @@ Need help? Just type your query after /search!
     async def _handle_pagination_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE, data: str):
         """Handle pagination callbacks"""
         user_id = update.effective_user.id
-        page = int(data.replace("page_", ""))
+        parts = data.replace("page_", "").split("_")
+        if len(parts) == 2:
+            rsid, page = parts[0], int(parts[1])
+        else:
+            # Buttons sent before result set ids carry only the page number
+            rsid = context.user_data.get(f"result_set_{user_id}") if context.user_data else None
+            page = int(parts[0])
         
-        products = context.user_data.get(f"search_results_{user_id}", [])
+        products = self.result_store.get(rsid) if rsid else None
         if not products:
-            await update.callback_query.edit_message_text("❌ No search results found. Please search again.")
+            await self._edit(update.callback_query, "❌ No search results found. Please search again.")
             return
         
+        context.user_data[f"result_set_{user_id}"] = rsid
         context.user_data[f"current_page_{user_id}"] = page
-        await self._send_search_results_edit(update, context, products, page)
+        await self._send_search_results_edit(update, context, products, page, rsid)
     
-    async def _send_search_results(self, update: Update, context: ContextTypes.DEFAULT_TYPE, products: list, page: int):
-        """Send search results with pagination"""
-        if not update.message:
-            return
-            
-        total_pages = (len(products) - 1) // self.config.MAX_RESULTS_PER_PAGE + 1
-        start_idx = page * self.config.MAX_RESULTS_PER_PAGE
-        end_idx = min(start_idx + self.config.MAX_RESULTS_PER_PAGE, len(products))
+    async def _update_search_progress(self, searching_msg, query: str, found: int):
+        """Show a live product counter on the searching message
         
-        page_products = products[start_idx:end_idx]
+        Sent at BULK priority, queued behind the cards already on their way
+        rather than jumping ahead of them.
+        """
+        try:
+            await self.outbound.send(
+                searching_msg.chat_id, searching_msg.edit_text,
+                f"🔍 Searching for '{query}'...\n"
+                f"Found {found} product{'s' if found != 1 else ''} so far.",
+                priority=BULK
+            )
+        except Exception as e:
+            logger.debug(f"Could not update search progress: {e}")
+    
+    def _build_results_header(self, products: list, page: int, rsid: str):
+        """Build the results header text and pagination keyboard for a page"""
+        total_pages = (len(products) - 1) // self.config.MAX_RESULTS_PER_PAGE + 1
         
-        # Send header message
         header_text = f"🔍 *Search Results* (Page {page + 1}/{total_pages})\n" \
                      f"Found {len(products)} products\n\n"
         
@@ -358,91 +554,264 @@ Need help? Just type your query after /search!
         if total_pages > 1:
             nav_buttons = []
             if page > 0:
-                nav_buttons.append(InlineKeyboardButton("◀️ Previous", callback_data=f"page_{page - 1}"))
+                nav_buttons.append(InlineKeyboardButton("◀️ Previous", callback_data=f"page_{rsid}_{page - 1}"))
             if page < total_pages - 1:
-                nav_buttons.append(InlineKeyboardButton("Next ▶️", callback_data=f"page_{page + 1}"))
+                nav_buttons.append(InlineKeyboardButton("Next ▶️", callback_data=f"page_{rsid}_{page + 1}"))
             if nav_buttons:
                 keyboard.append(nav_buttons)
         
         reply_markup = InlineKeyboardMarkup(keyboard) if keyboard else None
+        return header_text, reply_markup
+    
+    async def _send_search_results_edit(self, update: Update, context: ContextTypes.DEFAULT_TYPE, products: list, page: int, rsid: str):
+        """Edit search results message for pagination"""
+        with self.latency.timer(f"page_{self.config.PAGINATION_MODE}"):
+            start_idx = page * self.config.MAX_RESULTS_PER_PAGE
+            end_idx = min(start_idx + self.config.MAX_RESULTS_PER_PAGE, len(products))
+            
+            # Update header
+            header_text, reply_markup = self._build_results_header(products, page, rsid)
+            await self._edit(
+                update.callback_query,
+                header_text,
+                parse_mode=ParseMode.MARKDOWN,
+                reply_markup=reply_markup
+            )
+            
+            page_products = products[start_idx:end_idx]
+            user_id = update.effective_user.id
+            header = update.callback_query.message
+            record = context.user_data.get(f"card_messages_{user_id}") if context.user_data else None
+            # Only the cards sent under this very header may be edited; anything else is resent
+            slots = None
+            if isinstance(record, dict) and (record.get('chat_id'), record.get('header_id')) == (header.chat_id, header.message_id):
+                slots = record.get('slots')
+            
+            if self.config.PAGINATION_MODE == 'edit' and slots:
+                # Turn the page by editing the cards already in the chat
+                slots = await self._edit_page_in_place(update, context, page_products, slots)
+            else:
+                # Send new product cards for this page
+                sent_messages = await self._send_page_products(header, page_products)
+                slots = self._card_slots(sent_messages)
+            
+            if context.user_data is not None:
+                context.user_data[f"card_messages_{user_id}"] = self._card_record(header, slots)
+    
+    async def _send_page_products(self, message, page_products: list) -> list:
+        """Send one page of products using the configured sending mode"""
+        if self.config.RESULTS_SEND_MODE == 'album':
+            return await self._send_product_album(message, page_products)
         
-        await update.message.reply_text(header_text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
-        
-        # Send individual product cards
+        sent_messages = []
         for product in page_products:
-            await self._send_product_card(update, product)
+            sent_messages.append(await self._send_product_card(message, product))
+        return sent_messages
     
-    async def _send_search_results_edit(self, update: Update, context: ContextTypes.DEFAULT_TYPE, products: list, page: int):
-        """Edit search results message for pagination"""
-        total_pages = (len(products) - 1) // self.config.MAX_RESULTS_PER_PAGE + 1
-        start_idx = page * self.config.MAX_RESULTS_PER_PAGE
-        end_idx = min(start_idx + self.config.MAX_RESULTS_PER_PAGE, len(products))
+    async def _edit_page_in_place(self, update: Update, context: ContextTypes.DEFAULT_TYPE, page_products: list, slots: list) -> list:
+        """Show a page by editing the existing card messages
         
-        # Update header
-        header_text = f"🔍 *Search Results* (Page {page + 1}/{total_pages})\n" \
-                     f"Found {len(products)} products\n\n"
+        Each card message (slot) is updated with edit_message_media or
+        edit_message_text. Slots that cannot be edited are replaced by a new
+        card, and slots left over from a longer page are deleted.
+        """
+        message = update.callback_query.message
+        chat_id = message.chat_id
+        new_slots = []
+        
+        for index, product in enumerate(page_products):
+            slot = slots[index] if index < len(slots) else None
+            new_slot = None
+            if slot:
+                new_slot = await self._edit_card(context, chat_id, slot, product)
+                if new_slot is None:
+                    await self._delete_card(context, chat_id, slot)
+            if new_slot is None:
+                new_slot = self._card_slot(await self._send_product_card(message, product))
+            if new_slot:
+                new_slots.append(new_slot)
+        
+        for slot in slots[len(page_products):]:
+            await self._delete_card(context, chat_id, slot)
+        
+        return new_slots
+    
+    async def _edit_card(self, context: ContextTypes.DEFAULT_TYPE, chat_id: int, slot: list, product: dict):
+        """Replace the product shown in a card message, returning its slot or None"""
+        message_id, kind = slot
         
-        # Create pagination keyboard
-        keyboard = []
-        if total_pages > 1:
-            nav_buttons = []
-            if page > 0:
-                nav_buttons.append(InlineKeyboardButton("◀️ Previous", callback_data=f"page_{page - 1}"))
-            if page < total_pages - 1:
-                nav_buttons.append(InlineKeyboardButton("Next ▶️", callback_data=f"page_{page + 1}"))
-            if nav_buttons:
-                keyboard.append(nav_buttons)
+        try:
+            if kind == 'photo' and product.get('image_url'):
+                edited = await self.outbound.send(
+                    chat_id, context.bot.edit_message_media,
+                    chat_id=chat_id,
+                    message_id=message_id,
+                    media=InputMediaPhoto(
+                        media=self._photo_for(product),
+                        caption=self.formatter.format_product_caption(product),
+                        parse_mode=ParseMode.MARKDOWN
+                    ),
+                    priority=BULK
+                )
+                self._remember_photo(product, edited)
+                return slot
+            if kind == 'text' and not product.get('image_url'):
+                await self.outbound.send(
+                    chat_id, context.bot.edit_message_text,
+                    self.formatter.format_product_card(product),
+                    chat_id=chat_id,
+                    message_id=message_id,
+                    parse_mode=ParseMode.MARKDOWN,
+                    priority=BULK
+                )
+                return slot
+        except BadRequest as e:
+            if 'not modified' in str(e).lower():
+                return slot
+            logger.error(f"Error editing product card: {e}")
+            self._forget_photo(product)
+        except Exception as e:
+            logger.error(f"Error editing product card: {e}")
         
-        reply_markup = InlineKeyboardMarkup(keyboard) if keyboard else None
+        return None
+    
+    async def _delete_card(self, context: ContextTypes.DEFAULT_TYPE, chat_id: int, slot: list):
+        """Delete a card message that is no longer needed"""
+        try:
+            await self.outbound.send(
+                chat_id, context.bot.delete_message, chat_id=chat_id, message_id=slot[0], priority=BULK, metered=False
+            )
+        except Exception as e:
+            logger.debug(f"Could not delete product card: {e}")
+    
+    def _card_slot(self, sent_message):
+        """Describe a sent card message as a [message_id, kind] slot"""
+        if not sent_message or not getattr(sent_message, 'message_id', None):
+            return None
+        return [sent_message.message_id, 'photo' if sent_message.photo else 'text']
+    
+    def _card_record(self, header, slots: list) -> dict:
+        """Card slots of a page, tied to the chat and header message whose buttons turn it"""
+        return {'chat_id': header.chat_id, 'header_id': header.message_id, 'slots': slots}
+    
+    def _card_slots(self, sent_messages: list) -> list:
+        """Build the list of card slots for a page of sent messages"""
+        return [slot for slot in (self._card_slot(m) for m in sent_messages) if slot]
+    
+    async def _send_product_album(self, message, page_products: list):
+        """Send a page of products as a single media group album
         
-        await update.callback_query.edit_message_text(
-            header_text,
-            parse_mode=ParseMode.MARKDOWN,
-            reply_markup=reply_markup
-        )
+        Telegram albums need between 2 and 10 photos, so products without an
+        image (or a page with a single photo) fall back to individual cards.
+        """
+        if not message:
+            return []
+        
+        photo_products = [p for p in page_products if p.get('image_url')][:10]
+        if len(photo_products) < 2:
+            return [await self._send_product_card(message, product) for product in page_products]
+        
+        with self.latency.timer('format'):
+            media = [
+                InputMediaPhoto(
+                    media=self._photo_for(product),
+                    caption=self.formatter.format_product_caption(product),
+                    parse_mode=ParseMode.MARKDOWN
+                )
+                for product in photo_products
+            ]
+        
+        try:
+            with self.latency.timer('send_album'):
+                sent_messages = await self.outbound.send(
+                    message.chat_id, message.reply_media_group, media=media, priority=BULK
+                )
+            sent_messages = list(sent_messages)
+            for product, sent in zip(photo_products, sent_messages):
+                self._remember_photo(product, sent)
+        except Exception as e:
+            logger.error(f"Error sending product album: {e}")
+            for product in photo_products:
+                self._forget_photo(product)
+            # One bad photo or caption fails the whole album, send cards instead
+            sent_messages = [await self._send_product_card(message, product) for product in photo_products]
         
-        # Send new product cards for this page
-        page_products = products[start_idx:end_idx]
         for product in page_products:
-            await update.callback_query.message.reply_photo(
-                photo=product.get('image_url', ''),
-                caption=self.formatter.format_product_card(product),
-                parse_mode=ParseMode.MARKDOWN
-            )
+            if product not in photo_products:
+                sent_messages.append(await self._send_product_card(message, product))
+        
+        return sent_messages
     
-    async def _send_product_card(self, update: Update, product: dict):
-        """Send individual product card with image and details"""
-        if not update.message:
-            return
+    async def _send_product_card(self, message, product: dict):
+        """Send individual product card with image and details, returning the sent message"""
+        if not message:
+            return None
             
         try:
-            caption = self.formatter.format_product_card(product)
-            
             if product.get('image_url'):
-                await update.message.reply_photo(
-                    photo=product['image_url'],
-                    caption=caption,
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            else:
-                await update.message.reply_text(
-                    caption,
-                    parse_mode=ParseMode.MARKDOWN
-                )
+                # Photo captions are budgeted to fit Telegram's caption limit
+                with self.latency.timer('format'):
+                    caption = self.formatter.format_product_caption(product)
+                with self.latency.timer('send_photo'):
+                    sent = await self.outbound.send(
+                        message.chat_id, message.reply_photo,
+                        photo=self._photo_for(product),
+                        caption=caption,
+                        parse_mode=ParseMode.MARKDOWN,
+                        priority=BULK
+                    )
+                self._remember_photo(product, sent)
+                return sent
+            with self.latency.timer('format'):
+                text = self.formatter.format_product_card(product)
+            with self.latency.timer('send_text'):
+                return await self._reply(message, text, parse_mode=ParseMode.MARKDOWN, priority=BULK)
         
         except Exception as e:
             logger.error(f"Error sending product card: {e}")
+            self._forget_photo(product)
             # Fallback to text-only message
-            await update.message.reply_text(
+            return await self._reply(
+                message,
                 self.formatter.format_product_card(product),
-                parse_mode=ParseMode.MARKDOWN
+                parse_mode=ParseMode.MARKDOWN,
+                priority=BULK
             )
     
+    def _photo_for(self, product: dict) -> str:
+        """Return the cached Telegram file_id for a product image, or its URL"""
+        image_url = product.get('image_url')
+        return self.file_ids.get(image_url) or image_url
+    
+    def _remember_photo(self, product: dict, sent_message):
+        """Cache the file_id Telegram assigned to a sent product photo"""
+        if sent_message and getattr(sent_message, 'photo', None):
+            self.file_ids.set(product.get('image_url'), sent_message.photo[-1].file_id)
+    
+    def _forget_photo(self, product: dict):
+        """Drop a cached file_id after a failed send so the next one uses the URL"""
+        self.file_ids.forget(product.get('image_url'))
+    
+    async def _reply(self, message, text: str, priority: int = INTERACTIVE, **kwargs):
+        """Reply to a message through the outbound scheduler"""
+        return await self.outbound.send(message.chat_id, message.reply_text, text, priority=priority, **kwargs)
+    
+    async def _edit(self, query, text: str, **kwargs):
+        """Edit a callback query's message through the outbound scheduler"""
+        chat_id = query.message.chat_id if query.message else query.from_user.id
+        return await self.outbound.send(chat_id, query.edit_message_text, text, **kwargs)
+    
     async def error_handler(self, update: object, context: ContextTypes.DEFAULT_TYPE):
         """Handle errors"""
+        if isinstance(context.error, RetryAfter):
+            # Replying would only add to the flood, the scheduler already backs off
+            logger.warning(f"Flood control exceeded: {context.error}")
+            return
+        
         logger.error(f"Update {update} caused error {context.error}")
         
         if hasattr(update, 'effective_message') and update.effective_message:
-            await update.effective_message.reply_text(
+            await self._reply(
+                update.effective_message,
                 "❌ An error occurred. Please try again later."
             )
@@ -0,0 +1,232 @@
+"""
+Flood-control-aware outbound scheduler for Bot API calls
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from telegram.error import RetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Send priorities, lower values go out first
+INTERACTIVE = 0
+BULK = 1
+
+class _TokenBucket:
+    """Token bucket allowing short bursts on top of a steady rate"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available"""
+        self.refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def is_full(self, now: float) -> bool:
+        self.refill(now)
+        return self.tokens >= self.capacity
+
+class _Job:
+    __slots__ = ('chat_id', 'func', 'args', 'kwargs', 'priority', 'seq', 'future', 'attempts', 'metered')
+
+    def __init__(self, chat_id, func, args, kwargs, priority, seq, future, metered=True):
+        self.chat_id = chat_id
+        self.metered = metered
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.seq = seq
+        self.future = future
+        self.attempts = 0
+
+class OutboundScheduler:
+    """Central queue for every message the handlers send
+
+    Calls are paced by a global token bucket and one bucket per chat
+    (group chats get the stricter 20 messages/minute budget), calls to the
+    same chat go out one at a time, interactive replies overtake queued
+    bulk card pages, and RetryAfter errors pause the affected chat and
+    re-queue the call instead of surfacing as a failure. Calls sent with
+    ``metered=False`` (chat actions, deletions) do not post a message, so
+    they stay in the chat's order but spend none of its message budget.
+    """
+
+    def __init__(self, config):
+        self.global_rate = config.OUTBOUND_GLOBAL_RATE
+        self.chat_rate = config.OUTBOUND_CHAT_RATE
+        self.chat_burst = config.OUTBOUND_CHAT_BURST
+        self.group_rate = config.OUTBOUND_GROUP_RATE
+        self.group_burst = config.OUTBOUND_GROUP_BURST
+        self.max_retries = config.OUTBOUND_MAX_RETRIES
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._seq = itertools.count()
+        # Calls waiting to be sent, kept as a plain counter so other threads can read it
+        self._depth = 0
+        self.stats = {
+            'sent': 0,
+            'failed': 0,
+            'retry_after': 0,
+            'queued': 0,
+        }
+        # Bot API method name -> calls made, retries included
+        self.method_calls: Dict[str, int] = {}
+
+    def _reset(self, loop: asyncio.AbstractEventLoop):
+        """Bind the scheduler state to the running event loop"""
+        now = time.monotonic()
+        self._loop = loop
+        self._pending: Dict[Any, list] = {}
+        self._depth = 0
+        self._busy = set()
+        self._tasks = set()
+        self._chat_buckets: Dict[Any, _TokenBucket] = {}
+        self._blocked_until: Dict[Any, float] = {}
+        self._global_bucket = _TokenBucket(self.global_rate, self.global_rate, now)
+        self._wakeup = asyncio.Event()
+        self._dispatcher = loop.create_task(self._dispatch())
+
+    async def send(self, chat_id, func: Callable[..., Awaitable], /, *args, priority: int = INTERACTIVE,
+                   metered: bool = True, **kwargs):
+        """Queue a Bot API call for a chat and return its result once sent
+
+        ``func`` is called with ``args``/``kwargs`` when the call is
+        scheduled, so it can be retried after a RetryAfter error.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._dispatcher.done():
+            self._reset(loop)
+
+        job = _Job(chat_id, func, args, kwargs, priority, next(self._seq), loop.create_future(), metered)
+        heapq.heappush(self._pending.setdefault(chat_id, []), (priority, job.seq, job))
+        self._depth += 1
+        self.stats['queued'] += 1
+        self._wakeup.set()
+        return await job.future
+
+    def queue_depth(self) -> int:
+        """Number of calls waiting to be sent"""
+        return self._depth
+
+    def _chat_bucket(self, chat_id, now: float) -> _TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            # Negative chat ids are groups and channels
+            if isinstance(chat_id, int) and chat_id < 0:
+                bucket = _TokenBucket(self.group_rate, self.group_burst, now)
+            else:
+                bucket = _TokenBucket(self.chat_rate, self.chat_burst, now)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _next_job(self) -> Tuple[Optional[_Job], Optional[float]]:
+        """Pick the best job that may be sent now, or how long to wait for one"""
+        now = time.monotonic()
+        global_wait = self._global_bucket.wait_time(now)
+        if global_wait > 0:
+            return None, global_wait
+
+        best = None
+        min_wait = None
+        for chat_id, jobs in self._pending.items():
+            if not jobs or chat_id in self._busy:
+                continue
+            head = jobs[0][2]
+            wait = self._blocked_until.get(chat_id, 0) - now
+            if head.metered:
+                wait = max(wait, self._chat_bucket(chat_id, now).wait_time(now))
+            if wait > 0:
+                min_wait = wait if min_wait is None else min(min_wait, wait)
+                continue
+            if best is None or (head.priority, head.seq) < (best.priority, best.seq):
+                best = head
+
+        if best is None:
+            return None, min_wait
+
+        heapq.heappop(self._pending[best.chat_id])
+        self._depth -= 1
+        self._global_bucket.tokens -= 1
+        if best.metered:
+            self._chat_buckets[best.chat_id].tokens -= 1
+        return best, None
+
+    def _prune(self):
+        """Forget idle chats so the per-chat state does not grow without bound"""
+        now = time.monotonic()
+        for chat_id in [c for c, jobs in self._pending.items() if not jobs and c not in self._busy]:
+            del self._pending[chat_id]
+        for chat_id in [c for c, b in self._chat_buckets.items() if c not in self._pending and b.is_full(now)]:
+            del self._chat_buckets[chat_id]
+        for chat_id in [c for c, until in self._blocked_until.items() if until <= now]:
+            del self._blocked_until[chat_id]
+
+    async def _dispatch(self):
+        """Start queued calls as soon as the rate limits allow"""
+        dispatched = 0
+        while True:
+            job, delay = self._next_job()
+            if job is not None:
+                self._busy.add(job.chat_id)
+                task = self._loop.create_task(self._run(job))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+                dispatched += 1
+                if dispatched % 256 == 0:
+                    self._prune()
+                continue
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self, job: _Job):
+        """Perform one call, re-queueing it when Telegram asks us to back off"""
+        method = getattr(job.func, '__name__', 'call')
+        self.method_calls[method] = self.method_calls.get(method, 0) + 1
+        try:
+            result = await job.func(*job.args, **job.kwargs)
+        except RetryAfter as e:
+            self.stats['retry_after'] += 1
+            retry_after = e.retry_after
+            seconds = retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else float(retry_after)
+            self._blocked_until[job.chat_id] = time.monotonic() + seconds
+            job.attempts += 1
+            if job.attempts <= self.max_retries and not job.future.done():
+                logger.warning(f"Flood control for chat {job.chat_id}, retrying in {seconds}s")
+                heapq.heappush(self._pending.setdefault(job.chat_id, []), (job.priority, job.seq, job))
+                self._depth += 1
+            else:
+                self.stats['failed'] += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+        except Exception as e:
+            self.stats['failed'] += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            self.stats['sent'] += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._busy.discard(job.chat_id)
+            self._wakeup.set()
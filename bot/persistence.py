@@ -0,0 +1,207 @@
+"""
+SQLite persistence for bot state (user filters, pagination and result sets)
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+class SQLitePersistence(BasePersistence):
+    """Keep BotHandlers state across restarts in a single SQLite file
+
+    Only user_data is persisted (filters, current result set and page,
+    card message slots), plus the shared search result sets so old Next
+    buttons keep working. Updates handed over by the Application are
+    collected in memory and written in one transaction from a worker
+    thread, never one write per update. Rows untouched for ``max_age``
+    seconds are dropped at startup so loading stays fast.
+    """
+
+    def __init__(self, path: str, update_interval: float = 60, max_age: float = 30 * 24 * 3600):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending_users: Dict[int, Optional[str]] = {}
+        self._pending_result_sets: Dict[str, Tuple[float, str]] = {}
+        self._commit_scheduled = False
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS user_data "
+            "(user_id INTEGER PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS result_sets "
+            "(rsid TEXT PRIMARY KEY, products TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.execute("DELETE FROM user_data WHERE updated < ?", (time.time() - max_age,))
+        self._conn.commit()
+
+    # User data
+
+    async def get_user_data(self) -> Dict[int, Dict]:
+        """Load all stored user_data in one query"""
+        rows = await asyncio.to_thread(self._read_all_users)
+        user_data = {}
+        for user_id, data in rows:
+            try:
+                user_data[user_id] = json.loads(data)
+            except ValueError:
+                logger.warning(f"Discarding unreadable stored state for user {user_id}")
+        logger.info(f"Loaded persisted state for {len(user_data)} users")
+        return user_data
+
+    def _read_all_users(self) -> List[Tuple[int, str]]:
+        with self._lock:
+            return self._conn.execute("SELECT user_id, data FROM user_data").fetchall()
+
+    async def update_user_data(self, user_id: int, data: Dict):
+        encoded = json.dumps(data, default=str)
+        with self._pending_lock:
+            self._pending_users[user_id] = encoded
+        self._schedule_commit()
+
+    async def drop_user_data(self, user_id: int):
+        with self._pending_lock:
+            self._pending_users[user_id] = None
+        self._schedule_commit()
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict):
+        """user_data in memory is authoritative, nothing to refresh"""
+
+    # Result sets
+
+    def save_result_set(self, rsid: str, products: List[Dict]):
+        """Queue a search result set for the next batch write"""
+        encoded = json.dumps(products, default=str)
+        with self._pending_lock:
+            self._pending_result_sets[rsid] = (time.time(), encoded)
+        self._schedule_commit()
+
+    def load_result_set(self, rsid: str, ttl: float) -> Optional[Tuple[float, List[Dict]]]:
+        """Return (age in seconds, products) of a stored result set younger than ttl"""
+        with self._pending_lock:
+            pending = self._pending_result_sets.get(rsid)
+        if pending:
+            created, products = pending
+        else:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT created, products FROM result_sets WHERE rsid = ?", (rsid,)
+                ).fetchone()
+            if not row:
+                return None
+            created, products = row
+
+        age = time.time() - created
+        if age > ttl:
+            return None
+        return age, json.loads(products)
+
+    # Batched writes
+
+    def _schedule_commit(self):
+        """Write pending changes once the current batch of updates is queued"""
+        if self._commit_scheduled:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop (e.g. during shutdown), flush() will write them
+            return
+        self._commit_scheduled = True
+        loop.call_soon(lambda: loop.create_task(self._commit_async()))
+
+    async def _commit_async(self):
+        self._commit_scheduled = False
+        try:
+            await asyncio.to_thread(self._commit)
+        except sqlite3.Error as e:
+            logger.error(f"Error writing bot state: {e}")
+
+    def _commit(self):
+        with self._pending_lock:
+            users, self._pending_users = self._pending_users, {}
+            result_sets, self._pending_result_sets = self._pending_result_sets, {}
+        if not users and not result_sets:
+            return
+
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO user_data (user_id, data, updated) VALUES (?, ?, ?)",
+                    [(user_id, data, now) for user_id, data in users.items() if data is not None]
+                )
+                self._conn.executemany(
+                    "DELETE FROM user_data WHERE user_id = ?",
+                    [(user_id,) for user_id, data in users.items() if data is None]
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO result_sets (rsid, products, created) VALUES (?, ?, ?)",
+                    [(rsid, products, created) for rsid, (created, products) in result_sets.items()]
+                )
+        logger.debug(f"Persisted {len(users)} users and {len(result_sets)} result sets")
+
+    def prune_result_sets(self, ttl: float):
+        """Delete stored result sets older than ttl"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM result_sets WHERE created < ?", (time.time() - ttl,))
+
+    async def flush(self):
+        """Write everything still pending, called when the Application stops"""
+        await asyncio.to_thread(self._commit)
+
+    # Data this bot does not persist
+
+    async def get_chat_data(self) -> Dict:
+        return {}
+
+    async def get_bot_data(self) -> Dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> Dict:
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: Dict):
+        pass
+
+    async def update_bot_data(self, data: Dict):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def update_conversation(self, name: str, key, new_state):
+        pass
+
+    async def drop_chat_data(self, chat_id: int):
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict):
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict):
+        pass
@@ -0,0 +1,201 @@
+"""
+Long-lived event loop running the bot Application for the web services
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Dict, Optional
+
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+class BotRuntime:
+    """Run a MobileBot's Application on one long-lived event loop
+
+    ``start`` runs the loop in a background thread for the Flask services;
+    ``startup`` uses the caller's loop when the server is asyncio itself.
+
+    The web service hands webhook updates over with ``submit``, which only
+    decodes them and schedules them on the loop, so the HTTP request can be
+    answered straight away. Updates then go through the Application's
+    update processor, which sets the concurrency limit and per-user
+    ordering, and ``submit`` refuses updates once ``queue_size`` are waiting
+    or in flight so the caller can ask Telegram to retry later instead of
+    piling up work. Every update shares the same Bot and HTTP connection pool.
+
+    Update ids accepted during the last ``dedup_window`` seconds are
+    remembered, so a redelivery of an update Telegram thinks was not
+    acknowledged in time is acknowledged again but not processed twice.
+    """
+
+    # Upper bound on remembered update ids, whatever the window
+    MAX_SEEN_UPDATES = 100000
+
+    def __init__(self, bot, queue_size: int = 1000, dedup_window: float = 300):
+        self.bot = bot
+        self.application = bot.application
+        self.queue_size = queue_size
+        self.dedup_window = dedup_window
+        # update_id -> time accepted, oldest first
+        self._seen: "OrderedDict[int, float]" = OrderedDict()
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks = set()
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._startup_error: Optional[BaseException] = None
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self.polling = False
+        self.stats = {
+            'received': 0,
+            'processed': 0,
+            'rejected': 0,
+            'duplicates': 0,
+            'malformed': 0,
+            'errors': 0,
+        }
+
+    def start(self, polling: bool = False, timeout: float = 30):
+        """Start the loop thread and the Application, optionally with polling"""
+        self._thread = threading.Thread(target=self._run, name="bot-runtime", daemon=True)
+        self._thread.start()
+        if not self._ready.wait(timeout):
+            raise RuntimeError("Bot runtime did not start in time")
+        if self._startup_error:
+            raise self._startup_error
+        if polling:
+            self.run(self.start_polling())
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._startup())
+        except Exception as e:
+            self._startup_error = e
+            self._ready.set()
+            self.loop.close()
+            return
+        self._ready.set()
+        self.loop.run_forever()
+
+    async def _startup(self):
+        await self.application.initialize()
+        await self.application.start()
+        self.bot.start_heartbeat()
+        logger.info(
+            f"Bot runtime started, processing up to {self.application.update_processor.limit} updates at once"
+        )
+
+    async def startup(self, polling: bool = False):
+        """Start the Application on the running loop, for servers that own the loop"""
+        self.loop = asyncio.get_running_loop()
+        await self._startup()
+        if polling:
+            await self.start_polling()
+
+    async def shutdown(self):
+        """Counterpart of ``startup``"""
+        await self._shutdown()
+
+    def stop(self, timeout: float = 30):
+        """Stop polling and the Application, flushing persisted state"""
+        if self.loop is None or not self.loop.is_running():
+            return
+        self.run(self._shutdown(), timeout)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    async def _shutdown(self):
+        if self._tasks:
+            await asyncio.wait(self._tasks, timeout=10)
+        if self.polling:
+            await self.application.updater.stop()
+            self.polling = False
+        await self.application.stop()
+        await self.application.shutdown()
+        await self.bot.stop_heartbeat()
+
+    def run(self, coroutine: Awaitable, timeout: Optional[float] = 30):
+        """Run a coroutine on the bot loop from another thread and return its result"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    async def start_polling(self):
+        """Fetch updates with getUpdates on this loop"""
+        if not self.polling:
+            await self.application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+            self.polling = True
+
+    async def set_webhook(self, url: str):
+        """Stop polling if needed and register the webhook URL with Telegram"""
+        if self.polling:
+            await self.application.updater.stop()
+            self.polling = False
+        return await self.application.bot.set_webhook(url=url, allowed_updates=Update.ALL_TYPES)
+
+    def submit(self, data: Dict) -> bool:
+        """Queue a webhook update, returning False when the queue is full
+
+        Updates already accepted within the dedup window are dropped and
+        reported as accepted, so the caller acknowledges them again. A body
+        that is not an update raises ValueError.
+        """
+        try:
+            update = Update.de_json(data, self.application.bot)
+        except Exception as e:
+            with self._pending_lock:
+                self.stats['malformed'] += 1
+            raise ValueError(f"Malformed update: {e}") from e
+        with self._pending_lock:
+            if self._is_duplicate(update.update_id):
+                self.stats['duplicates'] += 1
+                return True
+            if self._pending >= self.queue_size:
+                self.stats['rejected'] += 1
+                return False
+            self._remember(update.update_id)
+            self._pending += 1
+            self.stats['received'] += 1
+
+        self.loop.call_soon_threadsafe(self._dispatch, update)
+        return True
+
+    def _is_duplicate(self, update_id: int) -> bool:
+        """Whether an update was accepted recently (caller holds the lock)"""
+        cutoff = time.monotonic() - self.dedup_window
+        while self._seen:
+            accepted = next(iter(self._seen.values()))
+            if accepted >= cutoff and len(self._seen) <= self.MAX_SEEN_UPDATES:
+                break
+            self._seen.popitem(last=False)
+        return update_id in self._seen
+
+    def _remember(self, update_id: int):
+        if self.dedup_window > 0:
+            self._seen[update_id] = time.monotonic()
+
+    def queue_depth(self) -> int:
+        """Updates waiting or being processed"""
+        return self._pending
+
+    def _dispatch(self, update: Update):
+        """Start processing an update; called on the loop in arrival order"""
+        task = self.loop.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _process(self, update: Update):
+        try:
+            await self.application.update_processor.process_update(
+                update, self.application.process_update(update)
+            )
+            self.stats['processed'] += 1
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"Error processing update {update.update_id}: {e}")
+        finally:
+            with self._pending_lock:
+                self._pending -= 1
@@ -1,11 +1,15 @@
 """
 Main Telegram bot class
 """
+import asyncio
 import logging
 from telegram import Update
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, InlineQueryHandler, ContextTypes
 from bot.handlers import BotHandlers
+from bot.persistence import SQLitePersistence
+from bot.update_processor import PerUserUpdateProcessor
 from scrapers.mobile_scraper import MobileScraper
+from utils.heartbeat import HeartbeatWriter
 
 logger = logging.getLogger(__name__)
 
@@ -16,9 +20,22 @@ class MobileBot:
         self.config = config
         self.scraper = MobileScraper(config)
         self.handlers = BotHandlers(config, self.scraper)
+        self.stats = {'errors': 0}
+        
+        # Liveness and counters for status_server.py
+        self.heartbeat = HeartbeatWriter(config.STATUS_FILE_PATH, config.HEARTBEAT_INTERVAL) if config.STATUS_FILE_PATH else None
+        self._heartbeat_task = None
         
         # Initialize bot application
-        self.application = Application.builder().token(config.BOT_TOKEN).build()
+        builder = Application.builder().token(config.BOT_TOKEN).concurrent_updates(
+            PerUserUpdateProcessor(config.MAX_CONCURRENT_UPDATES, config.MAX_PENDING_UPDATES)
+        ).post_init(self._post_init).post_shutdown(self._post_shutdown)
+        if config.PERSISTENCE_PATH:
+            persistence = SQLitePersistence(config.PERSISTENCE_PATH, config.PERSISTENCE_FLUSH_INTERVAL)
+            persistence.prune_result_sets(config.RESULT_SET_TTL)
+            self.handlers.result_store.backing = persistence
+            builder = builder.persistence(persistence)
+        self.application = builder.build()
         
         # Add handlers
         self._add_handlers()
@@ -34,8 +51,12 @@ class MobileBot:
         # Callback query handler for inline keyboards
         self.application.add_handler(CallbackQueryHandler(self.handlers.handle_callback))
         
+        # Inline queries answered from the local phone name index
+        self.application.add_handler(InlineQueryHandler(self.handlers.inline_query))
+        
         # Error handler
         async def error_wrapper(update: object, context: ContextTypes.DEFAULT_TYPE):
+            self.stats['errors'] += 1
             await self.handlers.error_handler(update, context)
         self.application.add_error_handler(error_wrapper)
     
@@ -43,3 +64,40 @@ class MobileBot:
         """Start the bot"""
         logger.info("Bot is starting...")
         self.application.run_polling(allowed_updates=Update.ALL_TYPES)
+    
+    async def _post_init(self, application: Application):
+        self.start_heartbeat()
+    
+    async def _post_shutdown(self, application: Application):
+        await self.stop_heartbeat()
+        await asyncio.to_thread(self.handlers.file_ids.flush)
+    
+    def _heartbeat_counters(self):
+        updater = self.application.updater
+        return {
+            'updates': self.application.update_processor.stats['processed'],
+            'errors': self.stats['errors'],
+            'webhook': not (updater and updater.running),
+        }
+    
+    async def _beat(self):
+        """Publish a heartbeat from the event loop, so a stalled loop goes stale"""
+        while True:
+            try:
+                self.heartbeat.beat(**self._heartbeat_counters())
+            except Exception as e:
+                logger.error(f"Heartbeat error: {e}")
+            await asyncio.sleep(self.heartbeat.interval)
+    
+    def start_heartbeat(self):
+        """Start publishing heartbeats on the running loop"""
+        if self.heartbeat and self._heartbeat_task is None:
+            self._heartbeat_task = asyncio.get_running_loop().create_task(self._beat())
+    
+    async def stop_heartbeat(self):
+        """Stop the heartbeat and mark the bot as stopped"""
+        if self._heartbeat_task is None:
+            return
+        self._heartbeat_task.cancel()
+        self._heartbeat_task = None
+        self.heartbeat.stop(**self._heartbeat_counters())
@@ -0,0 +1,87 @@
+"""
+Concurrent update processing that keeps each user's updates in order
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Process updates from different users concurrently, one at a time per user
+
+    Updates of the same user (or chat, for updates without a user) wait on
+    a per-user lock, which asyncio hands out in arrival order, so filter
+    toggles and page turns are applied in the order they were sent. The
+    user lock is taken before one of the ``max_concurrent_updates`` running
+    slots, so a user with a backlog never holds slots other users could
+    run in. The base class semaphore only bounds how many updates may be
+    admitted at once, waiting or running (``max_pending_updates``).
+    """
+
+    def __init__(self, max_concurrent_updates: int = 16, max_pending_updates: int = 1024):
+        super().__init__(max(max_pending_updates, max_concurrent_updates, 2))
+        self.limit = max(1, max_concurrent_updates)
+        self._running = asyncio.Semaphore(self.limit)
+        self._active = 0
+        # user or chat id -> [lock, updates holding or waiting for it]
+        self._user_locks: Dict[int, list] = {}
+        self.stats = {
+            'processed': 0,
+            'waited': 0,
+        }
+
+    @staticmethod
+    def _ordering_key(update: object) -> Optional[int]:
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user:
+            return update.effective_user.id
+        if update.effective_chat:
+            return update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self._ordering_key(update)
+        if key is None:
+            async with self._running:
+                await self._run(coroutine)
+            self.stats['processed'] += 1
+            return
+
+        entry = self._user_locks.get(key)
+        if entry is None:
+            entry = self._user_locks[key] = [asyncio.Lock(), 0]
+        lock = entry[0]
+        entry[1] += 1
+        if lock.locked():
+            self.stats['waited'] += 1
+        try:
+            async with lock:
+                async with self._running:
+                    await self._run(coroutine)
+            self.stats['processed'] += 1
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._user_locks[key]
+
+    async def _run(self, coroutine: Awaitable[Any]) -> None:
+        self._active += 1
+        try:
+            await coroutine
+        finally:
+            self._active -= 1
+
+    def running_updates(self) -> int:
+        """Updates currently being handled"""
+        return self._active
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -1,8 +1,28 @@
 """
 Configuration settings for the Telegram Mobile Bot
 """
+import math
 import os
 
+def _available_cpus() -> int:
+    """CPUs this process may use: its affinity mask, lowered by a cgroup CPU quota"""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    for quota_path, period_path in (('/sys/fs/cgroup/cpu.max', None),
+                                    ('/sys/fs/cgroup/cpu/cpu.cfs_quota_us', '/sys/fs/cgroup/cpu/cpu.cfs_period_us')):
+        try:
+            with open(quota_path) as quota_file:
+                fields = quota_file.read().split()
+            if period_path:
+                with open(period_path) as period_file:
+                    fields.append(period_file.read().strip())
+            quota, period = fields[0], fields[1]
+            if quota not in ('max', '-1'):
+                cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+            break
+        except (OSError, IndexError, ValueError):
+            continue
+    return cpus
+
 class Config:
     """Configuration class for bot settings"""
     
@@ -23,6 +43,87 @@ class Config:
         self.MAX_RESULTS_PER_PAGE = int(os.getenv('MAX_RESULTS_PER_PAGE', '5'))
         self.MAX_TOTAL_RESULTS = int(os.getenv('MAX_TOTAL_RESULTS', '20'))
         
+        # Processes parsing scraped HTML: 'auto' (one per CPU the affinity mask and cgroup quota allow,
+        # less one for the event loop), a lower number, or 0 to parse in-process
+        available_workers = max(_available_cpus() - 1, 1)
+        parse_workers = os.getenv('PARSE_WORKERS', 'auto')
+        self.PARSE_WORKERS = available_workers if parse_workers == 'auto' else min(int(parse_workers), available_workers)
+        
+        # Where searches run: 'inline' (in the bot process) or 'queue' (scrape_worker.py processes)
+        self.SCRAPE_BACKEND = os.getenv('SCRAPE_BACKEND', 'inline').lower()
+        self.SCRAPE_QUEUE_PATH = os.getenv('SCRAPE_QUEUE_PATH', 'data/scrape_jobs.db')
+        self.SCRAPE_JOB_TIMEOUT = float(os.getenv('SCRAPE_JOB_TIMEOUT', '300'))
+        # Seconds a worker holds a job without renewing before another worker takes it over
+        self.SCRAPE_JOB_LEASE = float(os.getenv('SCRAPE_JOB_LEASE', '30'))
+        
+        # Scrape cache shared by workers and replicas: memory://, sqlite:///path or redis://host:port/db.
+        # Queue mode defaults to a file the bot and workers share, so workers see each other's results
+        self.CACHE_BACKEND = os.getenv(
+            'CACHE_BACKEND', 'sqlite:///data/cache.db' if self.SCRAPE_BACKEND == 'queue' else 'memory://'
+        )
+        self.SEARCH_CACHE_TTL = float(os.getenv('SEARCH_CACHE_TTL', '3600'))
+        self.DETAILS_CACHE_TTL = float(os.getenv('DETAILS_CACHE_TTL', '86400'))
+        self.NEGATIVE_CACHE_TTL = float(os.getenv('NEGATIVE_CACHE_TTL', '300'))
+        
+        # Fair scheduling of uncached searches: concurrent scrapes and per-user quota (searches/minute)
+        self.SCRAPE_CONCURRENCY = int(os.getenv('SCRAPE_CONCURRENCY', '2'))
+        self.SCRAPE_USER_RATE = float(os.getenv('SCRAPE_USER_RATE', '6'))
+        self.SCRAPE_USER_BURST = float(os.getenv('SCRAPE_USER_BURST', '3'))
+        
+        # How a page of results is delivered: 'cards' (one message per product)
+        # or 'album' (one media group per page plus a navigation message)
+        self.RESULTS_SEND_MODE = os.getenv('RESULTS_SEND_MODE', 'cards').lower()
+        
+        # How Next/Previous turn a page: 'resend' (send new cards) or 'edit'
+        # (update the existing card messages in place)
+        self.PAGINATION_MODE = os.getenv('PAGINATION_MODE', 'resend').lower()
+        
+        # Shared search result sets: lifetime in seconds and memory cap in bytes
+        self.RESULT_SET_TTL = float(os.getenv('RESULT_SET_TTL', '1800'))
+        self.RESULT_STORE_MAX_BYTES = int(os.getenv('RESULT_STORE_MAX_BYTES', str(32 * 1024 * 1024)))
+        
+        # Persistent cache of Telegram file_ids for product images
+        self.FILE_ID_CACHE_PATH = os.getenv('FILE_ID_CACHE_PATH', 'data/file_ids.db')
+        
+        # Persistent bot state (user filters, pagination, result sets); empty disables
+        self.PERSISTENCE_PATH = os.getenv('PERSISTENCE_PATH', 'data/bot_state.db')
+        self.PERSISTENCE_FLUSH_INTERVAL = float(os.getenv('PERSISTENCE_FLUSH_INTERVAL', '60'))
+        
+        # Memory-mapped status file the bot publishes its heartbeat to (empty disables)
+        self.STATUS_FILE_PATH = os.getenv('STATUS_FILE_PATH', 'data/bot_status.bin')
+        self.HEARTBEAT_INTERVAL = float(os.getenv('HEARTBEAT_INTERVAL', '5'))
+        
+        # Seconds between pushes of changed counters to live status dashboards
+        self.STATS_STREAM_INTERVAL = float(os.getenv('STATS_STREAM_INTERVAL', '2'))
+        
+        # Seconds of search pipeline timings kept for the latency percentiles in /api/stats
+        self.LATENCY_WINDOW = float(os.getenv('LATENCY_WINDOW', '300'))
+        
+        # Token required by the /debug/profile sampling profiler, the per-user /debug/scrape_users
+        # breakdown and /set_webhook (empty disables them)
+        self.DEBUG_TOKEN = os.getenv('DEBUG_TOKEN', '')
+        
+        # Public webhook URL for server.py; without it (or RENDER_EXTERNAL_HOSTNAME) the bot polls
+        self.WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+        
+        # Updates handled at once (each user's updates stay in order)
+        self.MAX_CONCURRENT_UPDATES = int(os.getenv('MAX_CONCURRENT_UPDATES', '16'))
+        # Updates admitted at once, waiting for their user or running
+        self.MAX_PENDING_UPDATES = int(os.getenv('MAX_PENDING_UPDATES', '1024'))
+        
+        # Webhook updates waiting or in flight before answering 503
+        self.WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', '1000'))
+        # Seconds an update_id is remembered to drop Telegram redeliveries
+        self.WEBHOOK_DEDUP_WINDOW = float(os.getenv('WEBHOOK_DEDUP_WINDOW', '300'))
+        
+        # Outbound Bot API pacing (messages per second and burst sizes)
+        self.OUTBOUND_GLOBAL_RATE = float(os.getenv('OUTBOUND_GLOBAL_RATE', '30'))
+        self.OUTBOUND_CHAT_RATE = float(os.getenv('OUTBOUND_CHAT_RATE', '1.0'))
+        self.OUTBOUND_CHAT_BURST = float(os.getenv('OUTBOUND_CHAT_BURST', '5'))
+        self.OUTBOUND_GROUP_RATE = float(os.getenv('OUTBOUND_GROUP_RATE', str(20 / 60)))
+        self.OUTBOUND_GROUP_BURST = float(os.getenv('OUTBOUND_GROUP_BURST', '3'))
+        self.OUTBOUND_MAX_RETRIES = int(os.getenv('OUTBOUND_MAX_RETRIES', '3'))
+        
         # Supported brands for filtering
         self.SUPPORTED_BRANDS = [
             'Samsung', 'Apple', 'Xiaomi', 'OnePlus', 'Google', 'Oppo', 'Vivo',
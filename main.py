@@ -4,7 +4,6 @@ Main entry point for the Telegram Mobile Phone Scraper Bot
 """
 import os
 import logging
-from bot.telegram_bot import MobileBot
 from config import Config
 
 # Configure logging
@@ -25,7 +24,8 @@ def main():
             logger.error("BOT_TOKEN not found in environment variables")
             return
         
-        # Initialize and start the bot
+        # Initialize and start the bot (imported here, the bot stack is heavy)
+        from bot.telegram_bot import MobileBot
         bot = MobileBot(config)
         logger.info("Starting Telegram Mobile Bot...")
         bot.run()
@@ -5,10 +5,15 @@ Render.com optimized app for Telegram Mobile Bot
 import os
 import sys
 import logging
-import asyncio
+import atexit
+import multiprocessing
 import threading
 from datetime import datetime
-from flask import Flask, render_template_string, request, jsonify
+from flask import Flask, request, jsonify
+from config import Config
+from utils.metrics import CONTENT_TYPE, MetricsWriter, collect_bot_metrics, collect_process_metrics
+from utils.profiler import ProfilerBusy, SamplingProfiler, authorized, profile_options
+from utils.status_stream import STREAM_CLIENT_JS, SSE_HEADERS, StatsBroadcaster, page_etag
 
 # Configure logging for Render
 logging.basicConfig(
@@ -21,6 +26,8 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+bot_runtime = None
+profiler = SamplingProfiler()
 
 # Bot status for monitoring
 bot_status = {
@@ -34,7 +41,7 @@ bot_status = {
     'platform': 'Render.com'
 }
 
-# Simple status page optimized for Render
+# Simple status page optimized for Render; static, counters come from the stats stream
 STATUS_HTML = """
 <!DOCTYPE html>
 <html lang="en">
@@ -72,62 +79,86 @@ STATUS_HTML = """
         .webhook-url { background: rgba(0,0,0,0.2); padding: 15px; border-radius: 8px; font-family: monospace; font-size: 14px; word-break: break-all; margin: 10px 0; }
     </style>
     <script>
-        function refreshStatus() { location.reload(); }
+/*STREAM_CLIENT_JS*/
         function setWebhook() {
             const url = `https://${window.location.host}/webhook`;
+            const token = prompt('DEBUG_TOKEN');
+            if (!token) return;
             fetch('/set_webhook', {
                 method: 'POST',
-                headers: {'Content-Type': 'application/json'},
+                headers: {'Content-Type': 'application/json', 'X-Debug-Token': token},
                 body: JSON.stringify({url: url})
             })
             .then(response => response.json())
-            .then(data => {
-                alert(data.message || 'Webhook configured successfully!');
-                refreshStatus();
-            })
+            .then(data => alert(data.message || data.error || 'Webhook configured successfully!'))
             .catch(error => alert('Error: ' + error));
         }
-        // Auto-refresh every 60 seconds for Render
-        setTimeout(function(){ location.reload(); }, 60000);
+        function render(stats) {
+            document.getElementById('status-card').className = 'status-card ' + (stats.status === 'Running' ? 'status-online' : 'status-offline');
+            setText('status', stats.status || 'Unknown');
+            setText('platform', stats.platform || 'Render.com');
+            setText('uptime', formatUptime(stats.uptime_seconds));
+            setText('total-requests', stats.total_requests || 0);
+            setText('mode', stats.is_webhook ? 'Webhook ✓' : 'Polling');
+            setText('last-update', stats.last_update || 'Waiting...');
+            setText('bot-token', stats.bot_token_present ? 'Ready ✓' : 'Token Missing ✗');
+            const rates = stats.cache_hit_rates || {};
+            setText('search-cache', formatRate(rates.search));
+            setText('update-queue', (stats.update_queue || {}).depth || 0);
+        }
+        document.addEventListener('DOMContentLoaded', () => {
+            setText('webhook-url', `https://${window.location.host}/webhook`);
+            streamStats('/api/status/stream', render);
+        });
     </script>
 </head>
 <body>
     <div class="container">
         <div class="header">
             <h1>📱 Telegram Mobile Bot</h1>
-            <span class="platform-badge">{{ status.platform }}</span>
+            <span class="platform-badge" id="platform">Render.com</span>
             <p>Professional Mobile Phone Search Bot with Advanced Scraping</p>
         </div>
         
         <div class="status-grid">
-            <div class="status-card {{ 'status-online' if status.status == 'Running' else 'status-offline' }}">
+            <div class="status-card status-offline" id="status-card">
                 <h3>Service Status</h3>
-                <p>{{ status.status }}</p>
+                <p id="status">Connecting...</p>
             </div>
             
             <div class="status-card">
                 <h3>Uptime</h3>
-                <p>{{ uptime }}</p>
+                <p id="uptime">-</p>
             </div>
             
             <div class="status-card">
                 <h3>Total Requests</h3>
-                <p>{{ status.total_requests }}</p>
+                <p id="total-requests">-</p>
             </div>
             
             <div class="status-card">
                 <h3>Connection Mode</h3>
-                <p>{{ 'Webhook ✓' if status.is_webhook else 'Polling' }}</p>
+                <p id="mode">-</p>
             </div>
             
             <div class="status-card">
                 <h3>Last Activity</h3>
-                <p>{{ status.last_update or 'Waiting...' }}</p>
+                <p id="last-update">-</p>
             </div>
             
             <div class="status-card">
                 <h3>Bot Configuration</h3>
-                <p>{{ 'Ready ✓' if status.bot_token_present else 'Token Missing ✗' }}</p>
+                <p id="bot-token">-</p>
+            </div>
+            
+            <div class="status-card">
+                <h3>Search Cache Hits</h3>
+                <p id="search-cache">-</p>
+            </div>
+            
+            <div class="status-card">
+                <h3>Queued Updates</h3>
+                <p id="update-queue">-</p>
             </div>
         </div>
         
@@ -144,46 +175,29 @@ STATUS_HTML = """
         </div>
         
         <div style="text-align: center; margin-top: 30px;">
-            <button class="refresh-btn" onclick="refreshStatus()">🔄 Refresh Status</button>
             <button class="refresh-btn" onclick="setWebhook()">🔗 Configure Webhook</button>
         </div>
         
         <div class="webhook-url">
-            <strong>Webhook URL:</strong> https://{{ request.host }}/webhook
+            <strong>Webhook URL:</strong> <span id="webhook-url"></span>
         </div>
         
         <p style="text-align: center; opacity: 0.7; margin-top: 30px; font-size: 14px;">
-            Deployed on Render.com • Last updated: {{ datetime.now().strftime('%Y-%m-%d %H:%M:%S UTC') }}
+            Deployed on Render.com • <span id="live">Connecting...</span>
         </p>
     </div>
 </body>
 </html>
-"""
+""".replace('/*STREAM_CLIENT_JS*/', STREAM_CLIENT_JS)
+STATUS_ETAG = page_etag(STATUS_HTML)
 
 @app.route('/')
 def status_page():
-    """Render-optimized status page"""
-    global bot_status
-    
-    # Update status based on environment
-    if bot_status['bot_token_present']:
-        bot_status['status'] = 'Running'
-    else:
-        bot_status['status'] = 'Configuration Required'
-    
-    # Calculate uptime
-    uptime_delta = datetime.now() - bot_status['start_time']
-    hours, remainder = divmod(int(uptime_delta.total_seconds()), 3600)
-    minutes, seconds = divmod(remainder, 60)
-    uptime = f"{hours}h {minutes}m {seconds}s"
-    
-    return render_template_string(
-        STATUS_HTML,
-        status=bot_status,
-        uptime=uptime,
-        datetime=datetime,
-        request=request
-    )
+    """Render-optimized status page (static, revalidated by ETag)"""
+    response = app.response_class(STATUS_HTML, mimetype='text/html')
+    response.set_etag(STATUS_ETAG)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 @app.route('/webhook', methods=['POST'])
 def webhook():
@@ -195,15 +209,25 @@ def webhook():
         if not json_data:
             return jsonify({'error': 'No data received'}), 400
         
+        # Not ready yet, let Telegram redeliver once the bot is up
+        if not bot_runtime:
+            return jsonify({'error': 'Bot starting'}), 503, {'Retry-After': '5'}
+        
+        # Queue for the bot loop and acknowledge right away; redeliveries
+        # of an update_id already accepted are acknowledged but dropped
+        try:
+            accepted = bot_runtime.submit(json_data)
+        except ValueError as e:
+            logger.warning(f"Dropping webhook request: {e}")
+            return jsonify({'error': 'Malformed update'}), 400
+        if not accepted:
+            logger.warning("Update queue full, asking Telegram to retry")
+            return jsonify({'error': 'Busy'}), 503, {'Retry-After': '1'}
+        
         # Update statistics
         bot_status['total_requests'] += 1
         bot_status['last_update'] = datetime.now().strftime('%H:%M:%S')
         
-        # Log webhook activity
-        message_text = json_data.get('message', {}).get('text', 'No text')
-        logger.info(f"Webhook received: {message_text}")
-        
-        # Process webhook (implement your bot logic here)
         return jsonify({'ok': True}), 200
         
     except Exception as e:
@@ -212,13 +236,23 @@ def webhook():
 
 @app.route('/set_webhook', methods=['POST'])
 def set_webhook():
-    """Configure webhook for Render deployment"""
+    """Configure webhook for Render deployment (needs DEBUG_TOKEN)"""
     global bot_status
     
+    # Anyone could otherwise point the bot's updates at their own server
+    token = Config().DEBUG_TOKEN
+    if not token:
+        return jsonify({'error': 'Not found'}), 404
+    if not authorized(token, request.headers):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
     try:
         data = request.get_json() or {}
         webhook_url = data.get('url') or f"https://{request.host}/webhook"
         
+        if bot_runtime:
+            bot_runtime.run(bot_runtime.set_webhook(webhook_url))
+        
         # Update status
         bot_status['webhook_url'] = webhook_url
         bot_status['is_webhook'] = True
@@ -245,15 +279,64 @@ def health_check():
         'service': 'telegram-mobile-bot'
     }), 200
 
+def collect_status():
+    """Current bot status, shared by the status API and its stream"""
+    status = dict(bot_status)
+    status['uptime_seconds'] = int((datetime.now() - bot_status['start_time']).total_seconds())
+    if bot_runtime:
+        status['update_queue'] = dict(bot_runtime.stats, depth=bot_runtime.queue_depth())
+        status['cache_hit_rates'] = bot_runtime.bot.scraper.cache_hit_rates()
+        status['latency'] = bot_runtime.bot.handlers.latency.snapshot()
+    return status
+
+stats_broadcaster = StatsBroadcaster(collect_status, Config().STATS_STREAM_INTERVAL)
+
 @app.route('/api/status')
 def api_status():
     """API endpoint for bot status"""
-    return jsonify(bot_status)
+    return jsonify(collect_status())
+
+@app.route('/api/status/stream')
+def api_status_stream():
+    """Server-Sent Events stream of the status, sending only what changed"""
+    return app.response_class(stats_broadcaster.stream(), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics, read from the bot's counters at scrape time"""
+    writer = MetricsWriter()
+    writer.gauge('mobilebot_bot_up', 'Whether the bot is running.', bot_runtime is not None)
+    writer.counter('mobilebot_webhook_requests_total', 'Webhook requests accepted.', bot_status['total_requests'])
+    if bot_runtime:
+        collect_bot_metrics(writer, bot_runtime.bot, bot_runtime)
+    collect_process_metrics(writer)
+    return app.response_class(writer.render(), content_type=CONTENT_TYPE)
+
+@app.route('/debug/profile')
+def debug_profile():
+    """Sample every thread and the bot's tasks for a few seconds (needs DEBUG_TOKEN)"""
+    token = Config().DEBUG_TOKEN
+    if not token:
+        return jsonify({'error': 'Not found'}), 404
+    if not authorized(token, request.headers):
+        return jsonify({'error': 'Unauthorized'}), 401
+    try:
+        options = profile_options(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    output = options.pop('format')
+    try:
+        result = profiler.run(loops=[bot_runtime.loop] if bot_runtime else [], **options)
+    except ProfilerBusy as e:
+        return jsonify({'error': str(e)}), 409
+    if output == 'collapsed':
+        return app.response_class(result['collapsed'] + '\n', content_type='text/plain; charset=utf-8')
+    return jsonify(result)
 
 # Initialize bot in background for Render
 def initialize_bot():
     """Initialize bot components safely"""
-    global bot_status
+    global bot_status, bot_runtime
     
     try:
         # Import bot components safely
@@ -265,22 +348,24 @@ def initialize_bot():
         if config.BOT_TOKEN:
             # Import and initialize bot
             try:
-                from bot.telegram_bot import MobileBot
-                bot_instance = MobileBot(config)
-                
                 # Set webhook mode for Render
                 webhook_url = f"https://{os.getenv('RENDER_EXTERNAL_HOSTNAME', 'localhost')}/webhook"
                 
-                # Start bot in webhook mode
+                # Start bot in webhook mode; the bot stack is imported in the
+                # background so health checks are answered while it loads
                 def run_bot():
+                    global bot_runtime
                     try:
-                        # Set webhook and start application
-                        application = bot_instance.application
-                        loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(loop)
+                        from bot.telegram_bot import MobileBot
+                        from bot.runtime import BotRuntime
+                        bot_instance = MobileBot(config)
                         
-                        # Configure for webhook
-                        loop.run_until_complete(application.bot.set_webhook(webhook_url))
+                        # Start the application on its own loop and configure the webhook
+                        runtime = BotRuntime(bot_instance, config.WEBHOOK_QUEUE_SIZE, config.WEBHOOK_DEDUP_WINDOW)
+                        runtime.start()
+                        atexit.register(runtime.stop)
+                        runtime.run(runtime.set_webhook(webhook_url))
+                        bot_runtime = runtime
                         bot_status['webhook_url'] = webhook_url
                         bot_status['status'] = 'Running'
                         bot_status['is_webhook'] = True
@@ -317,6 +402,7 @@ if __name__ == '__main__':
     logger.info(f"Starting Render-optimized service on port {port}")
     
     app.run(host='0.0.0.0', port=port, debug=False)
-else:
-    # For WSGI deployment
+elif multiprocessing.parent_process() is None:
+    # For WSGI deployment; multiprocessing children (HTML parsers) import
+    # the entry script too and must not start a second bot
     initialize_bot()
\ No newline at end of file
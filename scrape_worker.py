@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+Scrape worker: runs search jobs queued by the bot (SCRAPE_BACKEND=queue)
+"""
+import logging
+from config import Config
+from scrapers.job_queue import run_worker
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+def main():
+    """Run jobs from the shared queue until stopped"""
+    try:
+        run_worker(Config())
+    except KeyboardInterrupt:
+        logger.info("Scrape worker stopped by user")
+
+if __name__ == '__main__':
+    main()
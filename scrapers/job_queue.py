@@ -0,0 +1,314 @@
+"""
+SQLite-backed queue of scrape jobs shared by the bot and scrape workers
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks for new results or jobs
+POLL_INTERVAL = 0.25
+
+class ScrapeJobQueue:
+    """Search jobs and their results in one SQLite file
+
+    The bot inserts a job per search and reads its products back as the
+    worker stores them, so results still arrive progressively. Workers
+    claim jobs inside an immediate transaction, so any number of worker
+    processes sharing the file each get different jobs. The file also
+    holds the upstream request schedule, which keeps REQUEST_DELAY a
+    limit for all workers together rather than for each of them.
+
+    A running job is leased to its worker for ``lease`` seconds, renewed
+    by the worker's heartbeat and by every stored product. A job whose
+    lease runs out is handed to another worker with the results stored so
+    far kept: results are append-only and the new worker skips products
+    already stored, so a bot reading them never sees one twice or misses
+    one.
+    """
+
+    def __init__(self, path: str, lease: float = 30):
+        self.path = path
+        self.lease = lease
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, query TEXT NOT NULL, filters TEXT,"
+            " status TEXT NOT NULL DEFAULT 'queued', worker TEXT, error TEXT,"
+            " created REAL NOT NULL, started REAL, finished REAL, lease_until REAL);"
+            "CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);"
+            "CREATE TABLE IF NOT EXISTS results ("
+            " job_id INTEGER NOT NULL, seq INTEGER NOT NULL, product TEXT NOT NULL, key TEXT,"
+            " PRIMARY KEY (job_id, seq));"
+            "CREATE TABLE IF NOT EXISTS request_schedule (name TEXT PRIMARY KEY, next_at REAL NOT NULL);"
+        )
+        # Files created before leases were added
+        if 'lease_until' not in [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]:
+            conn.execute("ALTER TABLE jobs ADD COLUMN lease_until REAL")
+        if 'key' not in [row[1] for row in conn.execute("PRAGMA table_info(results)")]:
+            conn.execute("ALTER TABLE results ADD COLUMN key TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS results_key ON results (job_id, key)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread, opened in autocommit mode"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # Bot side
+
+    def submit(self, query: str, filters: Optional[Dict] = None) -> int:
+        """Queue a search and return its job id"""
+        cursor = self._connection().execute(
+            "INSERT INTO jobs (query, filters, created) VALUES (?, ?, ?)",
+            (query, json.dumps(filters) if filters else None, time.time())
+        )
+        return cursor.lastrowid
+
+    def fetch_results(self, job_id: int, after: int) -> Tuple[List[Dict], str, Optional[str]]:
+        """Products stored after position ``after``, with the job status and error"""
+        conn = self._connection()
+        rows = conn.execute(
+            "SELECT product FROM results WHERE job_id = ? AND seq > ? ORDER BY seq", (job_id, after)
+        ).fetchall()
+        status, error = conn.execute("SELECT status, error FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return [json.loads(row[0]) for row in rows], status, error
+
+    def cancel(self, job_id: int):
+        """Stop a job whose results are no longer wanted"""
+        self._connection().execute(
+            "UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status IN ('queued', 'running')",
+            (time.time(), job_id)
+        )
+
+    def queue_depth(self) -> int:
+        """Jobs waiting for a worker"""
+        return self._connection().execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    # Worker side
+
+    def claim(self, worker: str) -> Optional[Tuple[int, str, Optional[Dict]]]:
+        """Take the oldest queued job, returning (id, query, filters)"""
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Jobs of a worker that stopped renewing its lease are given to another one
+            reclaimed = conn.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND lease_until < ?",
+                (now,)
+            ).rowcount
+            if reclaimed:
+                logger.warning(f"Reclaimed {reclaimed} scrape job(s) with an expired lease")
+            row = conn.execute(
+                "SELECT id, query, filters FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, started = ?, lease_until = ? WHERE id = ?",
+                    (worker, now, now + self.lease, row[0])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if not row:
+            return None
+        return row[0], row[1], json.loads(row[2]) if row[2] else None
+
+    def renew(self, job_id: int, worker: str) -> bool:
+        """Extend a worker's lease on a job, returning False if it no longer holds it"""
+        cursor = self._connection().execute(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (time.time() + self.lease, job_id, worker)
+        )
+        return cursor.rowcount > 0
+
+    def add_result(self, job_id: int, worker: str, product: Dict) -> bool:
+        """Append one product of a job, returning False once the worker no longer holds it
+
+        Products already stored for the job (by a worker whose lease ran
+        out) are skipped by URL, or name without one, so a reclaimed job
+        continues where it stopped even if a price changed in between.
+        """
+        encoded = json.dumps(product, default=str)
+        key = product.get('product_url') or product.get('name') or encoded
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT status, worker FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            held = bool(row) and row[0] == 'running' and row[1] == worker
+            if held and not conn.execute(
+                "SELECT 1 FROM results WHERE job_id = ? AND key = ?", (job_id, key)
+            ).fetchone():
+                conn.execute(
+                    "INSERT INTO results (job_id, seq, product, key)"
+                    " SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ? FROM results WHERE job_id = ?",
+                    (job_id, encoded, key, job_id)
+                )
+                conn.execute("UPDATE jobs SET lease_until = ? WHERE id = ?", (time.time() + self.lease, job_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return held
+
+    def finish(self, job_id: int, worker: str, error: Optional[str] = None):
+        """Mark a job done or failed, if the worker still holds it"""
+        self._connection().execute(
+            "UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            ('failed' if error else 'done', error, time.time(), job_id, worker)
+        )
+
+    def purge(self, max_age: float = 3600):
+        """Delete jobs and results finished more than ``max_age`` seconds ago"""
+        conn = self._connection()
+        cutoff = time.time() - max_age
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM results WHERE job_id IN (SELECT id FROM jobs WHERE finished < ?)", (cutoff,))
+        conn.execute("DELETE FROM jobs WHERE finished < ?", (cutoff,))
+        conn.execute("COMMIT")
+
+    def reserve_request(self, delay: float, name: str = 'upstream') -> float:
+        """Book the next upstream request slot, returning how long to wait for it"""
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT next_at FROM request_schedule WHERE name = ?", (name,)).fetchone()
+            start = max(now, row[0]) if row else now
+            conn.execute(
+                "INSERT OR REPLACE INTO request_schedule (name, next_at) VALUES (?, ?)", (name, start + delay)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return start - now
+
+class QueuedSearch:
+    """Run searches through scrape workers instead of in the bot process
+
+    Offers the same ``iter_search_mobiles`` as MobileScraper, so the
+    handlers do not care where the scraping happens. Products coming back
+    are still recorded in the local scraper's name index and spelling
+    vocabulary for inline queries and corrections. A search gives up
+    after SCRAPE_JOB_TIMEOUT, well past the SCRAPE_JOB_LEASE after which
+    a stalled job moves to another worker, so a reclaimed job can still
+    finish the search.
+    """
+
+    def __init__(self, config, scraper):
+        self.scraper = scraper
+        self.queue = ScrapeJobQueue(config.SCRAPE_QUEUE_PATH, config.SCRAPE_JOB_LEASE)
+        self.job_timeout = max(config.SCRAPE_JOB_TIMEOUT, config.SCRAPE_JOB_LEASE * 2)
+
+    async def iter_search_mobiles(self, query: str, filters: Optional[Dict] = None,
+                                  check_cache: bool = True) -> AsyncIterator[Dict]:
+        """Submit a search job and yield its products as workers store them
+
+        Jobs only reach the queue after a cache miss, so workers never look
+        the search up again; with ``check_cache`` the lookup happens here.
+        """
+        if check_cache:
+            cached = await asyncio.to_thread(self.scraper.cached_results, query, filters)
+            if cached is not None:
+                for product in cached:
+                    self.scraper._remember_product(product)
+                    yield product
+                return
+
+        job_id = await asyncio.to_thread(self.queue.submit, query, filters)
+        received = 0
+        deadline = time.monotonic() + self.job_timeout
+        finished = False
+        try:
+            while True:
+                products, status, error = await asyncio.to_thread(self.queue.fetch_results, job_id, received)
+                for product in products:
+                    received += 1
+                    self.scraper._remember_product(product)
+                    yield product
+                if status in ('done', 'failed', 'cancelled'):
+                    finished = True
+                    if error:
+                        logger.error(f"Scrape job {job_id} failed: {error}")
+                    return
+                if time.monotonic() > deadline:
+                    logger.warning(f"Scrape job {job_id} for '{query}' timed out")
+                    return
+                await asyncio.sleep(POLL_INTERVAL)
+        finally:
+            if not finished:
+                await asyncio.to_thread(self.queue.cancel, job_id)
+
+def run_worker(config, worker_name: Optional[str] = None):
+    """Claim and run scrape jobs until interrupted"""
+    from scrapers.mobile_scraper import MobileScraper
+
+    worker_name = worker_name or f"{socket.gethostname()}:{os.getpid()}"
+    queue = ScrapeJobQueue(config.SCRAPE_QUEUE_PATH, config.SCRAPE_JOB_LEASE)
+    scraper = MobileScraper(config)
+    # Pace upstream requests across every worker sharing the queue
+    scraper.reserve_request = lambda: queue.reserve_request(config.REQUEST_DELAY)
+    logger.info(f"Scrape worker {worker_name} waiting for jobs")
+
+    last_purge = 0.0
+    while True:
+        if time.monotonic() - last_purge > 600:
+            queue.purge()
+            last_purge = time.monotonic()
+
+        job = queue.claim(worker_name)
+        if job is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        job_id, query, filters = job
+        logger.info(f"Running scrape job {job_id}: {query}")
+        # Keep the lease while a slow page is being fetched
+        stop = threading.Event()
+        heartbeat = threading.Thread(
+            target=_renew_lease, args=(queue, job_id, worker_name, stop), name="lease-heartbeat", daemon=True
+        )
+        heartbeat.start()
+        # The bot submits only searches it missed in the shared cache
+        products = scraper.iter_products(query, filters, check_cache=False)
+        try:
+            for product in products:
+                if not queue.add_result(job_id, worker_name, product):
+                    logger.info(f"Scrape job {job_id} cancelled or reclaimed")
+                    break
+            queue.finish(job_id, worker_name)
+        except Exception as e:
+            logger.error(f"Scrape job {job_id} failed: {e}")
+            queue.finish(job_id, worker_name, str(e))
+        finally:
+            products.close()
+            stop.set()
+            heartbeat.join()
+
+def _renew_lease(queue: ScrapeJobQueue, job_id: int, worker: str, stop: threading.Event):
+    """Renew a job's lease every third of its length until ``stop`` is set"""
+    while not stop.wait(queue.lease / 3):
+        try:
+            if not queue.renew(job_id, worker):
+                return
+        except sqlite3.Error as e:
+            logger.warning(f"Could not renew lease on scrape job {job_id}: {e}")
@@ -2,12 +2,21 @@
 Web scraper for mobile phone information from 91mobiles.com and gsmarena.com
 """
 import requests
-from bs4 import BeautifulSoup
 import re
 import time
+import json
+import hashlib
+import threading
 import logging
-from typing import Dict, List, Optional, Tuple
-import trafilatura
+import asyncio
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+from scrapers import parsing
+from scrapers.parsing import ParsingExecutor
+from utils.cache_backend import create_cache
+from utils.latency import LatencyTracker
+from utils.name_index import PhoneNameIndex
+from utils.query_corrector import QueryCorrector
 
 logger = logging.getLogger(__name__)
 
@@ -21,27 +30,94 @@ class MobileScraper:
             'User-Agent': config.USER_AGENT
         })
         self.last_request_time = 0
+        self._rate_lock = threading.Lock()
+        # Optional shared schedule returning how long to wait for the next
+        # request slot, set by scrape workers to pace requests together
+        self.reserve_request = None
+        # Every phone seen while scraping, for instant inline-query answers
+        self.name_index = PhoneNameIndex()
+        # Spelling correction over brand names and every phone name seen
+        self.query_corrector = QueryCorrector(config.SUPPORTED_BRANDS)
+        # HTML parsing runs in worker processes so it does not hold the GIL
+        self.parser = ParsingExecutor(config.PARSE_WORKERS)
+        # Search results, parsed details and failed URLs, shared with other
+        # workers and replicas when the backend is not in-memory
+        self.cache = create_cache(config.CACHE_BACKEND)
+        # Time spent in each scraping stage, per source
+        self.latency = LatencyTracker(config.LATENCY_WINDOW)
+        self.cache_stats = {
+            'search_hits': 0,
+            'search_misses': 0,
+            'detail_hits': 0,
+            'detail_misses': 0,
+            'negative_hits': 0,
+        }
+        # (host, HTTP status or 'error') -> upstream requests made
+        self.request_stats: Dict[Tuple[str, str], int] = {}
         
     def _rate_limit(self):
         """Implement rate limiting to avoid being blocked"""
-        current_time = time.time()
-        elapsed = current_time - self.last_request_time
-        if elapsed < self.config.REQUEST_DELAY:
-            time.sleep(self.config.REQUEST_DELAY - elapsed)
-        self.last_request_time = time.time()
+        with self.latency.timer('rate_limit'):
+            if self.reserve_request:
+                wait = self.reserve_request()
+                if wait > 0:
+                    time.sleep(wait)
+                return
+            
+            # Searches run in worker threads, so the delay bookkeeping is shared
+            with self._rate_lock:
+                current_time = time.time()
+                elapsed = current_time - self.last_request_time
+                if elapsed < self.config.REQUEST_DELAY:
+                    time.sleep(self.config.REQUEST_DELAY - elapsed)
+                self.last_request_time = time.time()
+    
+    @staticmethod
+    def _cache_key(kind: str, *parts) -> str:
+        payload = json.dumps(parts, sort_keys=True)
+        return f"mobiles:{kind}:{hashlib.sha1(payload.encode('utf-8')).hexdigest()}"
+    
+    def _search_key(self, query: str, filters: Optional[Dict]) -> str:
+        return self._cache_key('search', " ".join(query.lower().split()), filters or {})
+    
+    @staticmethod
+    def _source_for(url: str) -> str:
+        return 'GSMArena' if 'gsmarena.com' in url else '91mobiles'
+    
+    def _parse(self, parser, html: bytes, source: str, *args):
+        """Parse a page in the parsing pool, timing it per source"""
+        with self.latency.timer('parse', source):
+            return self.parser.parse(parser, html, *args)
+    
+    def _count_request(self, url: str, status):
+        key = (urlparse(url).hostname or '', str(status))
+        self.request_stats[key] = self.request_stats.get(key, 0) + 1
     
-    def _make_request(self, url: str) -> Optional[str]:
-        """Make a rate-limited HTTP request"""
+    def _make_request(self, url: str) -> Optional[bytes]:
+        """Make a rate-limited HTTP request and return the raw page"""
+        # URLs that failed recently are not requested again until the entry expires
+        negative_key = self._cache_key('failed', url)
+        found, _ = self.cache.get_json(negative_key)
+        if found:
+            self.cache_stats['negative_hits'] += 1
+            return None
+        
         try:
             self._rate_limit()
-            response = self.session.get(url, timeout=self.config.TIMEOUT)
+            with self.latency.timer('fetch', self._source_for(url)):
+                response = self.session.get(url, timeout=self.config.TIMEOUT)
+            self._count_request(url, response.status_code)
             response.raise_for_status()
-            return response.text
+            return response.content
         except requests.RequestException as e:
+            if getattr(e, 'response', None) is None:
+                # Timeouts and connection errors never got a status
+                self._count_request(url, 'error')
             logger.error(f"Request failed for {url}: {e}")
+            self.cache.set_json(negative_key, str(e), self.config.NEGATIVE_CACHE_TTL)
             return None
     
-    def search_91mobiles(self, query: str) -> List[Dict]:
+    def search_91mobiles(self, query: str, fetch_details: bool = True) -> List[Dict]:
         """Search for mobile phones on 91mobiles.com"""
         # Try multiple URL formats as the site structure may have changed
         search_urls = [
@@ -56,7 +132,7 @@ class MobileScraper:
         
         for search_url in search_urls:
             html_content = self._make_request(search_url)
-            if html_content and "404" not in html_content:
+            if html_content and b"404" not in html_content:
                 successful_url = search_url
                 break
                 
@@ -65,117 +141,15 @@ class MobileScraper:
             return []
             
         logger.info(f"91mobiles search successful with URL: {successful_url}")
-        soup = BeautifulSoup(html_content, 'html.parser')
-        products = []
-        
-        # Try multiple selectors as the HTML structure may have changed
-        product_cards = (
-            soup.find_all('div', class_='listingbox') or
-            soup.find_all('div', class_='product-item') or
-            soup.find_all('div', class_='mobile-item') or
-            soup.find_all('article', class_='product') or
-            soup.find_all('div', {'data-testid': 'product-card'}) or
-            soup.find_all('div', class_='card') or
-            soup.find_all('li', class_='product')
+        products = self._parse(
+            parsing.parse_91mobiles_listing, html_content, '91mobiles', self.config.MAX_RESULTS_PER_PAGE
         )
         
-        for card in product_cards[:self.config.MAX_RESULTS_PER_PAGE]:
-            try:
-                product = self._parse_91mobiles_product(card)
-                if product:
-                    products.append(product)
-            except Exception as e:
-                logger.error(f"Error parsing 91mobiles product: {e}")
-                continue
-        
+        if fetch_details:
+            products = [self._enrich_product(product) for product in products]
         return products
     
-    def _parse_91mobiles_product(self, card) -> Optional[Dict]:
-        """Parse individual product from 91mobiles"""
-        try:
-            # Extract product name with multiple selectors
-            name_elem = (
-                card.find('h3') or
-                card.find('a', class_='title') or
-                card.find('h2') or
-                card.find('h4') or
-                card.find('a', class_='product-title') or
-                card.find('[data-testid="product-name"]') or
-                card.find('div', class_='name') or
-                card.find('span', class_='title')
-            )
-            
-            if not name_elem:
-                return None
-            
-            name = name_elem.get_text(strip=True)
-            
-            # Extract product URL
-            link_elem = card.find('a')
-            product_url = link_elem.get('href') if link_elem else None
-            if product_url and not product_url.startswith('http'):
-                product_url = f"https://www.91mobiles.com{product_url}"
-            
-            # Extract image URL with multiple attributes
-            img_elem = card.find('img')
-            image_url = None
-            if img_elem:
-                image_url = (
-                    img_elem.get('src') or
-                    img_elem.get('data-src') or
-                    img_elem.get('data-lazy') or
-                    img_elem.get('data-original')
-                )
-            
-            # Extract price with multiple selectors
-            price_elem = (
-                card.find('span', class_='price') or
-                card.find('div', class_='price') or
-                card.find('span', class_='cost') or
-                card.find('[data-testid="price"]') or
-                card.find('div', class_='price-current') or
-                card.find('p', class_='price')
-            )
-            price = price_elem.get_text(strip=True) if price_elem else "Price not available"
-            
-            # Extract comprehensive specs
-            specs = []
-            spec_elems = (
-                card.find_all('li') or 
-                card.find_all('span', class_='spec') or
-                card.find_all('div', class_='feature') or
-                card.find_all('p', class_='specification')
-            )
-            for spec in spec_elems[:8]:  # Get more detailed specs
-                spec_text = spec.get_text(strip=True)
-                if spec_text and len(spec_text) > 3:
-                    specs.append(spec_text)
-                    
-            # Get detailed product info if URL available
-            detailed_info = {}
-            if product_url:
-                detailed_info = self._get_91mobiles_details(product_url)
-            
-            product_data = {
-                'name': name,
-                'price': price,
-                'image_url': image_url,
-                'product_url': product_url,
-                'specs': specs,
-                'source': '91mobiles'
-            }
-            
-            # Add detailed information if available
-            if detailed_info:
-                product_data.update(detailed_info)
-                
-            return product_data
-        
-        except Exception as e:
-            logger.error(f"Error parsing 91mobiles product card: {e}")
-            return None
-    
-    def search_gsmarena(self, query: str) -> List[Dict]:
+    def search_gsmarena(self, query: str, fetch_details: bool = True) -> List[Dict]:
         """Search for mobile phones on gsmarena.com"""
         search_url = f"https://www.gsmarena.com/results.php3?sQuickSearch=yes&sName={query.replace(' ', '+')}"
         
@@ -183,98 +157,18 @@ class MobileScraper:
         if not html_content:
             return []
         
-        soup = BeautifulSoup(html_content, 'html.parser')
-        products = []
-        
-        # Find product listings
-        product_cards = soup.find_all('div', class_='makers') or soup.find_all('li')
-        
-        for card in product_cards[:self.config.MAX_RESULTS_PER_PAGE]:
-            try:
-                product = self._parse_gsmarena_product(card)
-                if product:
-                    products.append(product)
-            except Exception as e:
-                logger.error(f"Error parsing GSMArena product: {e}")
-                continue
+        products = self._parse(
+            parsing.parse_gsmarena_listing, html_content, 'GSMArena', self.config.MAX_RESULTS_PER_PAGE
+        )
         
+        if fetch_details:
+            products = [self._enrich_product(product) for product in products]
         return products
     
-    def _parse_gsmarena_product(self, card) -> Optional[Dict]:
-        """Parse individual product from GSMArena"""
-        try:
-            # Extract product link and name
-            link_elem = card.find('a')
-            if not link_elem:
-                return None
-            
-            name = link_elem.get('title') or link_elem.get_text(strip=True)
-            if not name:
-                return None
-            
-            product_url = link_elem.get('href')
-            if product_url and not product_url.startswith('http'):
-                product_url = f"https://www.gsmarena.com/{product_url}"
-            
-            # Extract image
-            img_elem = card.find('img')
-            image_url = img_elem.get('src') if img_elem else None
-            if image_url and not image_url.startswith('http'):
-                image_url = f"https://www.gsmarena.com/{image_url}"
-            
-            # Get detailed specs if product URL is available
-            specs = []
-            if product_url:
-                detailed_specs = self._get_gsmarena_details(product_url)
-                specs = detailed_specs.get('specs', [])
-            
-            return {
-                'name': name,
-                'price': "Check GSMArena for pricing",
-                'image_url': image_url,
-                'product_url': product_url,
-                'specs': specs,
-                'source': 'GSMArena'
-            }
-        
-        except Exception as e:
-            logger.error(f"Error parsing GSMArena product card: {e}")
-            return None
-    
     def _get_gsmarena_details(self, product_url: str) -> Dict:
         """Get detailed specifications from GSMArena product page"""
         try:
-            html_content = self._make_request(product_url)
-            if not html_content:
-                return {}
-            
-            # Use trafilatura for better text extraction
-            text_content = trafilatura.extract(html_content)
-            
-            soup = BeautifulSoup(html_content, 'html.parser')
-            specs = []
-            
-            # Find specification table
-            spec_tables = soup.find_all('table')
-            for table in spec_tables:
-                if hasattr(table, 'find_all'):
-                    rows = table.find_all('tr')
-                    for row in rows[:10]:  # Limit to prevent too much data
-                        if hasattr(row, 'find_all'):
-                            cells = row.find_all(['td', 'th'])
-                            if len(cells) >= 2:
-                                spec_name = cells[0].get_text(strip=True)
-                                spec_value = cells[1].get_text(strip=True)
-                                if spec_name and spec_value:
-                                    specs.append(f"{spec_name}: {spec_value}")
-            
-            return {
-                'specs': specs[:12],  # More comprehensive specs
-                'detailed_specs': self._extract_detailed_specs(soup),
-                'features': self._extract_features(soup),
-                'summary': self._extract_summary(soup)
-            }
-            
+            return self._get_details(product_url, parsing.parse_gsmarena_details)
         except Exception as e:
             logger.error(f"Error getting GSMArena details: {e}")
             return {}
@@ -282,122 +176,157 @@ class MobileScraper:
     def _get_91mobiles_details(self, product_url: str) -> Dict:
         """Get detailed product information from 91mobiles product page"""
         try:
-            html_content = self._make_request(product_url)
-            if not html_content:
-                return {}
-            
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            return {
-                'detailed_specs': self._extract_detailed_specs(soup),
-                'features': self._extract_features(soup),
-                'summary': self._extract_summary(soup)
-            }
+            return self._get_details(product_url, parsing.parse_91mobiles_details)
         except Exception as e:
             logger.error(f"Error getting 91mobiles details: {e}")
             return {}
     
-    def _extract_detailed_specs(self, soup) -> List[str]:
-        """Extract detailed specifications from product page"""
-        specs = []
-        try:
-            # Try multiple spec table selectors
-            spec_sections = (
-                soup.find_all('div', class_='spec-table') or
-                soup.find_all('table', class_='specifications') or
-                soup.find_all('div', class_='phone-feature') or
-                soup.find_all('ul', class_='spec-list')
-            )
-            
-            for section in spec_sections:
-                if hasattr(section, 'find_all'):
-                    rows = section.find_all(['tr', 'li', 'div'])
-                    for row in rows[:15]:  # Comprehensive specs
-                        text = row.get_text(strip=True)
-                        if text and len(text) > 10 and ':' in text:
-                            specs.append(text)
-        except Exception as e:
-            logger.error(f"Error extracting detailed specs: {e}")
-        
-        return specs[:12]
-    
-    def _extract_features(self, soup) -> List[str]:
-        """Extract key features from product page"""
-        features = []
-        try:
-            feature_sections = (
-                soup.find_all('div', class_='features') or
-                soup.find_all('ul', class_='key-features') or
-                soup.find_all('div', class_='highlights')
-            )
-            
-            for section in feature_sections:
-                if hasattr(section, 'find_all'):
-                    items = section.find_all(['li', 'p', 'div'])
-                    for item in items[:8]:
-                        text = item.get_text(strip=True)
-                        if text and len(text) > 5:
-                            features.append(text)
-        except Exception as e:
-            logger.error(f"Error extracting features: {e}")
+    def _get_details(self, product_url: str, parser) -> Dict:
+        """Fetch and parse a product page, using the shared cache when possible"""
+        key = self._cache_key('details', product_url)
+        found, details = self.cache.get_json(key)
+        if found:
+            self.cache_stats['detail_hits'] += 1
+            return details
+        self.cache_stats['detail_misses'] += 1
         
-        return features[:6]
-    
-    def _extract_summary(self, soup) -> str:
-        """Extract product summary/description"""
-        try:
-            summary_elems = (
-                soup.find('div', class_='summary') or
-                soup.find('p', class_='description') or
-                soup.find('div', class_='overview') or
-                soup.find('meta', attrs={'name': 'description'})
-            )
-            
-            if summary_elems:
-                if hasattr(summary_elems, 'get'):
-                    return summary_elems.get('content', '')[:200]
-                else:
-                    return summary_elems.get_text(strip=True)[:200]
-        except Exception as e:
-            logger.error(f"Error extracting summary: {e}")
+        html_content = self._make_request(product_url)
+        if not html_content:
+            return {}
         
-        return ""
+        details = self._parse(parser, html_content, self._source_for(product_url))
+        self.cache.set_json(key, details, self.config.DETAILS_CACHE_TTL)
+        return details
     
     def search_mobiles(self, query: str, filters: Optional[Dict] = None) -> List[Dict]:
         """Search mobiles from both sources and combine results"""
-        all_products = []
+        return list(self.iter_products(query, filters))
+    
+    def iter_products(self, query: str, filters: Optional[Dict] = None, check_cache: bool = True) -> Iterator[Dict]:
+        """Yield combined search results one by one as their details are fetched
         
-        # Search 91mobiles
-        try:
-            mobiles_91_results = self.search_91mobiles(query)
-            all_products.extend(mobiles_91_results)
-            logger.info(f"Found {len(mobiles_91_results)} results from 91mobiles")
-        except Exception as e:
-            logger.error(f"Error searching 91mobiles: {e}")
+        Listing pages are scraped first, filtered and de-duplicated, and only
+        the surviving products are enriched from their detail pages. Complete
+        result lists are cached, so repeated searches skip scraping entirely.
+        Callers that already missed the cache pass ``check_cache=False`` so
+        the search is looked up (and counted) once.
+        """
+        cached = self.cached_results(query, filters) if check_cache else None
+        if cached is not None:
+            for product in cached:
+                self._remember_product(product)
+                yield product
+            return
         
-        # Search GSMArena
-        try:
-            gsmarena_results = self.search_gsmarena(query)
-            all_products.extend(gsmarena_results)
-            logger.info(f"Found {len(gsmarena_results)} results from GSMArena")
-        except Exception as e:
-            logger.error(f"Error searching GSMArena: {e}")
+        results = []
+        for product in self._scrape_products(query, filters):
+            results.append(product)
+            yield product
         
-        # Apply filters if provided
-        if filters:
-            all_products = self._apply_filters(all_products, filters)
-        
-        # Remove duplicates and limit results
+        # Empty results are usually a failed scrape, keep them only briefly
+        ttl = self.config.SEARCH_CACHE_TTL if results else self.config.NEGATIVE_CACHE_TTL
+        self.cache.set_json(self._search_key(query, filters), results, ttl)
+    
+    def cache_hit_rates(self) -> Dict[str, Optional[float]]:
+        """Share of search and detail lookups answered from the cache"""
+        stats = self.cache_stats
+        rates = {}
+        for kind, hits, misses in (
+            ('search', stats['search_hits'], stats['search_misses']),
+            ('details', stats['detail_hits'], stats['detail_misses']),
+        ):
+            total = hits + misses
+            rates[kind] = round(hits / total, 3) if total else None
+        return rates
+    
+    def cached_results(self, query: str, filters: Optional[Dict] = None) -> Optional[List[Dict]]:
+        """Results of an identical recent search, or None"""
+        found, products = self.cache.get_json(self._search_key(query, filters))
+        if found:
+            self.cache_stats['search_hits'] += 1
+            return products
+        self.cache_stats['search_misses'] += 1
+        return None
+    
+    def _scrape_products(self, query: str, filters: Optional[Dict] = None) -> Iterator[Dict]:
+        """Scrape both sources, yielding enriched products up to MAX_TOTAL_RESULTS"""
         seen_names = set()
-        unique_products = []
-        for product in all_products:
-            if product['name'] not in seen_names:
+        yielded = 0
+        
+        for source, search in (('91mobiles', self.search_91mobiles), ('GSMArena', self.search_gsmarena)):
+            try:
+                with self.latency.timer('listing', source):
+                    listing = search(query, fetch_details=False)
+                logger.info(f"Found {len(listing)} results from {source}")
+            except Exception as e:
+                logger.error(f"Error searching {source}: {e}")
+                continue
+            
+            for product in listing:
+                self._remember_product(product)
+            
+            # Apply filters if provided
+            if filters:
+                listing = self._apply_filters(listing, filters)
+            
+            # Remove duplicates and limit results
+            for product in listing:
+                if product['name'] in seen_names:
+                    continue
                 seen_names.add(product['name'])
-                unique_products.append(product)
-                if len(unique_products) >= self.config.MAX_TOTAL_RESULTS:
+                with self.latency.timer('details', source):
+                    product = self._enrich_product(product)
+                self._remember_product(product)
+                yield product
+                yielded += 1
+                if yielded >= self.config.MAX_TOTAL_RESULTS:
+                    return
+    
+    async def iter_search_mobiles(self, query: str, filters: Optional[Dict] = None,
+                                  check_cache: bool = True) -> AsyncIterator[Dict]:
+        """Async variant of search_mobiles that yields products as they become ready
+        
+        The blocking scrape runs in a worker thread, so the event loop stays
+        free to deliver the products that are already available.
+        """
+        products = self.iter_products(query, filters, check_cache)
+        done = object()
+        try:
+            while True:
+                product = await asyncio.to_thread(next, products, done)
+                if product is done:
                     break
+                yield product
+        finally:
+            try:
+                products.close()
+            except ValueError:
+                # Still running in an abandoned worker thread; it stops on its own
+                pass
+    
+    def _remember_product(self, product: Dict):
+        """Record a scraped product in the name index and correction vocabulary"""
+        self.name_index.add(product)
+        self.query_corrector.add_name(product.get('name', ''))
+    
+    def _enrich_product(self, product: Dict) -> Dict:
+        """Add detail page information to a product parsed from a listing"""
+        product_url = product.get('product_url')
+        if not product_url:
+            return product
+        
+        try:
+            if product.get('source') == '91mobiles':
+                detailed_info = self._get_91mobiles_details(product_url)
+                if detailed_info:
+                    product.update(detailed_info)
+            elif product.get('source') == 'GSMArena':
+                detailed_specs = self._get_gsmarena_details(product_url)
+                product['specs'] = detailed_specs.get('specs', [])
+        except Exception as e:
+            logger.error(f"Error enriching product {product.get('name')}: {e}")
         
-        return unique_products
+        return product
     
     def _apply_filters(self, products: List[Dict], filters: Dict) -> List[Dict]:
         """Apply search filters to products"""
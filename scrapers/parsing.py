@@ -0,0 +1,326 @@
+"""
+HTML extraction for scraped pages, run in a process pool off the event loop
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Page parsers take the raw response bytes and return plain lists and dicts,
+# so only small, picklable values cross the process boundary.
+
+def _soup(html: bytes):
+    """Parse a page, importing bs4 on first use so importing this module stays cheap"""
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, 'html.parser')
+
+def parse_91mobiles_listing(html: bytes, limit: int) -> List[Dict]:
+    """Extract the product cards of a 91mobiles search page"""
+    soup = _soup(html)
+    products = []
+
+    # Try multiple selectors as the HTML structure may have changed
+    product_cards = (
+        soup.find_all('div', class_='listingbox') or
+        soup.find_all('div', class_='product-item') or
+        soup.find_all('div', class_='mobile-item') or
+        soup.find_all('article', class_='product') or
+        soup.find_all('div', {'data-testid': 'product-card'}) or
+        soup.find_all('div', class_='card') or
+        soup.find_all('li', class_='product')
+    )
+
+    for card in product_cards[:limit]:
+        try:
+            product = _parse_91mobiles_product(card)
+            if product:
+                products.append(product)
+        except Exception as e:
+            logger.error(f"Error parsing 91mobiles product: {e}")
+            continue
+
+    return products
+
+def _parse_91mobiles_product(card) -> Optional[Dict]:
+    """Parse individual product from 91mobiles"""
+    try:
+        # Extract product name with multiple selectors
+        name_elem = (
+            card.find('h3') or
+            card.find('a', class_='title') or
+            card.find('h2') or
+            card.find('h4') or
+            card.find('a', class_='product-title') or
+            card.find('[data-testid="product-name"]') or
+            card.find('div', class_='name') or
+            card.find('span', class_='title')
+        )
+
+        if not name_elem:
+            return None
+
+        name = name_elem.get_text(strip=True)
+
+        # Extract product URL
+        link_elem = card.find('a')
+        product_url = link_elem.get('href') if link_elem else None
+        if product_url and not product_url.startswith('http'):
+            product_url = f"https://www.91mobiles.com{product_url}"
+
+        # Extract image URL with multiple attributes
+        img_elem = card.find('img')
+        image_url = None
+        if img_elem:
+            image_url = (
+                img_elem.get('src') or
+                img_elem.get('data-src') or
+                img_elem.get('data-lazy') or
+                img_elem.get('data-original')
+            )
+
+        # Extract price with multiple selectors
+        price_elem = (
+            card.find('span', class_='price') or
+            card.find('div', class_='price') or
+            card.find('span', class_='cost') or
+            card.find('[data-testid="price"]') or
+            card.find('div', class_='price-current') or
+            card.find('p', class_='price')
+        )
+        price = price_elem.get_text(strip=True) if price_elem else "Price not available"
+
+        # Extract comprehensive specs
+        specs = []
+        spec_elems = (
+            card.find_all('li') or
+            card.find_all('span', class_='spec') or
+            card.find_all('div', class_='feature') or
+            card.find_all('p', class_='specification')
+        )
+        for spec in spec_elems[:8]:  # Get more detailed specs
+            spec_text = spec.get_text(strip=True)
+            if spec_text and len(spec_text) > 3:
+                specs.append(spec_text)
+
+        return {
+            'name': name,
+            'price': price,
+            'image_url': image_url,
+            'product_url': product_url,
+            'specs': specs,
+            'source': '91mobiles'
+        }
+
+    except Exception as e:
+        logger.error(f"Error parsing 91mobiles product card: {e}")
+        return None
+
+def parse_gsmarena_listing(html: bytes, limit: int) -> List[Dict]:
+    """Extract the product cards of a GSMArena search page"""
+    soup = _soup(html)
+    products = []
+
+    # Find product listings
+    product_cards = soup.find_all('div', class_='makers') or soup.find_all('li')
+
+    for card in product_cards[:limit]:
+        try:
+            product = _parse_gsmarena_product(card)
+            if product:
+                products.append(product)
+        except Exception as e:
+            logger.error(f"Error parsing GSMArena product: {e}")
+            continue
+
+    return products
+
+def _parse_gsmarena_product(card) -> Optional[Dict]:
+    """Parse individual product from GSMArena"""
+    try:
+        # Extract product link and name
+        link_elem = card.find('a')
+        if not link_elem:
+            return None
+
+        name = link_elem.get('title') or link_elem.get_text(strip=True)
+        if not name:
+            return None
+
+        product_url = link_elem.get('href')
+        if product_url and not product_url.startswith('http'):
+            product_url = f"https://www.gsmarena.com/{product_url}"
+
+        # Extract image
+        img_elem = card.find('img')
+        image_url = img_elem.get('src') if img_elem else None
+        if image_url and not image_url.startswith('http'):
+            image_url = f"https://www.gsmarena.com/{image_url}"
+
+        return {
+            'name': name,
+            'price': "Check GSMArena for pricing",
+            'image_url': image_url,
+            'product_url': product_url,
+            'specs': [],
+            'source': 'GSMArena'
+        }
+
+    except Exception as e:
+        logger.error(f"Error parsing GSMArena product card: {e}")
+        return None
+
+def parse_gsmarena_details(html: bytes) -> Dict:
+    """Extract specifications from a GSMArena product page"""
+    soup = _soup(html)
+    specs = []
+
+    # Find specification table
+    spec_tables = soup.find_all('table')
+    for table in spec_tables:
+        if hasattr(table, 'find_all'):
+            rows = table.find_all('tr')
+            for row in rows[:10]:  # Limit to prevent too much data
+                if hasattr(row, 'find_all'):
+                    cells = row.find_all(['td', 'th'])
+                    if len(cells) >= 2:
+                        spec_name = cells[0].get_text(strip=True)
+                        spec_value = cells[1].get_text(strip=True)
+                        if spec_name and spec_value:
+                            specs.append(f"{spec_name}: {spec_value}")
+
+    return {
+        'specs': specs[:12],  # More comprehensive specs
+        'detailed_specs': _extract_detailed_specs(soup),
+        'features': _extract_features(soup),
+        'summary': _extract_summary(soup)
+    }
+
+def parse_91mobiles_details(html: bytes) -> Dict:
+    """Extract detailed information from a 91mobiles product page"""
+    soup = _soup(html)
+
+    return {
+        'detailed_specs': _extract_detailed_specs(soup),
+        'features': _extract_features(soup),
+        'summary': _extract_summary(soup)
+    }
+
+def _extract_detailed_specs(soup) -> List[str]:
+    """Extract detailed specifications from product page"""
+    specs = []
+    try:
+        # Try multiple spec table selectors
+        spec_sections = (
+            soup.find_all('div', class_='spec-table') or
+            soup.find_all('table', class_='specifications') or
+            soup.find_all('div', class_='phone-feature') or
+            soup.find_all('ul', class_='spec-list')
+        )
+
+        for section in spec_sections:
+            if hasattr(section, 'find_all'):
+                rows = section.find_all(['tr', 'li', 'div'])
+                for row in rows[:15]:  # Comprehensive specs
+                    text = row.get_text(strip=True)
+                    if text and len(text) > 10 and ':' in text:
+                        specs.append(text)
+    except Exception as e:
+        logger.error(f"Error extracting detailed specs: {e}")
+
+    return specs[:12]
+
+def _extract_features(soup) -> List[str]:
+    """Extract key features from product page"""
+    features = []
+    try:
+        feature_sections = (
+            soup.find_all('div', class_='features') or
+            soup.find_all('ul', class_='key-features') or
+            soup.find_all('div', class_='highlights')
+        )
+
+        for section in feature_sections:
+            if hasattr(section, 'find_all'):
+                items = section.find_all(['li', 'p', 'div'])
+                for item in items[:8]:
+                    text = item.get_text(strip=True)
+                    if text and len(text) > 5:
+                        features.append(text)
+    except Exception as e:
+        logger.error(f"Error extracting features: {e}")
+
+    return features[:6]
+
+def _extract_summary(soup) -> str:
+    """Extract product summary/description"""
+    try:
+        summary_elems = (
+            soup.find('div', class_='summary') or
+            soup.find('p', class_='description') or
+            soup.find('div', class_='overview') or
+            soup.find('meta', attrs={'name': 'description'})
+        )
+
+        if summary_elems:
+            if hasattr(summary_elems, 'get'):
+                return summary_elems.get('content', '')[:200]
+            else:
+                return summary_elems.get_text(strip=True)[:200]
+    except Exception as e:
+        logger.error(f"Error extracting summary: {e}")
+
+    return ""
+
+class ParsingExecutor:
+    """Run page parsers in a pool of worker processes
+
+    BeautifulSoup parsing is CPU-bound and holds the GIL, so parsing in a
+    thread still stalls the event loop and every other search. Parsers run
+    in separate processes instead. They are forked from a forkserver (spawn
+    where that is unavailable) rather than from the bot itself, so they
+    never inherit its threads, and the server preloads bs4 so each
+    worker starts with bs4 already imported. With ``workers`` set to 0, or
+    if the pool breaks, pages are parsed in the calling thread.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # Parsing runs in several to_thread workers, only one may start the pool
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        with self._pool_lock:
+            if self._pool is None:
+                if 'forkserver' in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context('forkserver')
+                    context.set_forkserver_preload([__name__, 'bs4'])
+                else:
+                    context = multiprocessing.get_context('spawn')
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                logger.info(f"Started {self.workers} HTML parsing processes")
+            return self._pool
+
+    def parse(self, parser: Callable, html: bytes, *args):
+        """Run a parser on a page and return its result"""
+        pool = self._get_pool()
+        if pool is None:
+            return parser(html, *args)
+        try:
+            return pool.submit(parser, html, *args).result()
+        except BrokenProcessPool:
+            logger.error("HTML parsing pool broke, parsing in-process from now on")
+            self.workers = 0
+            self._pool = None
+            return parser(html, *args)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,193 @@
+"""
+Fair per-user scheduling and quotas in front of the scrape backend
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import AsyncIterator, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class QuotaExceeded(Exception):
+    """A user started more searches than their quota allows"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Search quota exceeded, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+class _UserState:
+    __slots__ = ('tokens', 'updated', 'last_finish', 'queued', 'running', 'jobs', 'total_wait', 'max_wait')
+
+    def __init__(self, burst: float, now: float):
+        self.tokens = burst
+        self.updated = now
+        self.last_finish = 0.0
+        self.queued = 0
+        self.running = 0
+        self.jobs = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+class FairScrapeScheduler:
+    """Weighted fair queuing of searches across users
+
+    Only ``concurrency`` searches scrape at once. Waiting searches are
+    ordered by virtual finish time: each user's searches are stamped one
+    after another from the later of the user's previous stamp and the
+    scheduler's virtual clock, so a user with many queued searches gets
+    one turn for every turn of each other waiting user instead of
+    blocking them all. Every user also has a token-bucket quota of
+    ``rate`` searches per minute, and searches already in the result
+    cache are answered at once without using a slot or quota.
+    """
+
+    def __init__(self, config, backend, scraper):
+        self.backend = backend
+        self.scraper = scraper
+        self.concurrency = max(1, config.SCRAPE_CONCURRENCY)
+        self.rate = config.SCRAPE_USER_RATE / 60
+        self.burst = config.SCRAPE_USER_BURST
+
+        self._users: Dict[int, _UserState] = {}
+        self._waiting = []
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._running = 0
+        self.stats = {
+            'cache_hits': 0,
+            'scheduled': 0,
+            'rejected': 0,
+        }
+
+    def _user(self, user_id: int, now: float) -> _UserState:
+        state = self._users.get(user_id)
+        if state is None:
+            state = self._users[user_id] = _UserState(self.burst, now)
+        return state
+
+    def _take_quota(self, state: _UserState, now: float):
+        """Spend one search from the user's bucket or raise QuotaExceeded"""
+        state.tokens = min(self.burst, state.tokens + (now - state.updated) * self.rate)
+        state.updated = now
+        if state.tokens < 1:
+            self.stats['rejected'] += 1
+            raise QuotaExceeded((1 - state.tokens) / self.rate)
+        state.tokens -= 1
+
+    async def iter_search_mobiles(self, query: str, filters: Optional[Dict] = None,
+                                  user_id: int = 0, weight: float = 1.0) -> AsyncIterator[Dict]:
+        """Yield products for a search once the user's turn comes"""
+        cached = await asyncio.to_thread(self.scraper.cached_results, query, filters)
+        if cached is not None:
+            self.stats['cache_hits'] += 1
+            for product in cached:
+                self.scraper._remember_product(product)
+                yield product
+            return
+
+        now = time.monotonic()
+        state = self._user(user_id, now)
+        self._take_quota(state, now)
+
+        await self._acquire(state, weight)
+        try:
+            # The cache was just checked above, the backend only scrapes
+            async for product in self.backend.iter_search_mobiles(query, filters, check_cache=False):
+                yield product
+        finally:
+            self._release(state)
+
+    async def _acquire(self, state: _UserState, weight: float):
+        """Wait for a scrape slot in virtual finish time order"""
+        start_tag = max(self._virtual_time, state.last_finish)
+        finish_tag = start_tag + 1.0 / max(weight, 0.01)
+        state.last_finish = finish_tag
+        enqueued = time.monotonic()
+
+        if self._running < self.concurrency and not self._waiting:
+            self._running += 1
+            self._virtual_time = start_tag
+        else:
+            future = asyncio.get_running_loop().create_future()
+            entry = (finish_tag, next(self._seq), start_tag, future)
+            heapq.heappush(self._waiting, entry)
+            state.queued += 1
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # The slot was handed over just before cancellation
+                    self._running -= 1
+                    self._wake()
+                elif entry in self._waiting:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                raise
+            finally:
+                state.queued -= 1
+
+        wait = time.monotonic() - enqueued
+        state.running += 1
+        state.jobs += 1
+        state.total_wait += wait
+        state.max_wait = max(state.max_wait, wait)
+        self.stats['scheduled'] += 1
+        if self.stats['scheduled'] % 256 == 0:
+            self.prune()
+
+    def _release(self, state: _UserState):
+        state.running -= 1
+        self._running -= 1
+        self._wake()
+
+    def _wake(self):
+        """Hand free slots to the waiting searches with the earliest finish tags"""
+        while self._waiting and self._running < self.concurrency:
+            finish_tag, _, start_tag, future = heapq.heappop(self._waiting)
+            if future.done():
+                continue
+            self._running += 1
+            self._virtual_time = max(self._virtual_time, start_tag)
+            future.set_result(None)
+
+    def queue_depth(self) -> int:
+        """Searches waiting for a scrape slot"""
+        return len(self._waiting)
+
+    def active_searches(self) -> int:
+        """Searches currently holding a scrape slot"""
+        return self._running
+
+    def user_summary(self) -> Dict:
+        """Per-user figures aggregated over all users, with no user ids"""
+        states = list(self._users.values())
+        return {
+            'tracked': len(states),
+            'active': sum(1 for state in states if state.queued or state.running),
+            'max_queued': max((state.queued for state in states), default=0),
+            'max_wait': round(max((state.max_wait for state in states), default=0.0), 3),
+        }
+
+    def user_stats(self) -> Dict[int, Dict]:
+        """Queue depth and wait times per user with recent activity"""
+        return {
+            user_id: {
+                'queued': state.queued,
+                'running': state.running,
+                'searches': state.jobs,
+                'avg_wait': round(state.total_wait / state.jobs, 3) if state.jobs else 0.0,
+                'max_wait': round(state.max_wait, 3),
+            }
+            for user_id, state in self._users.items()
+        }
+
+    def prune(self, idle: float = 3600):
+        """Forget users with nothing queued and a full quota"""
+        now = time.monotonic()
+        for user_id in [
+            user_id for user_id, state in self._users.items()
+            if not state.queued and not state.running and now - state.updated > idle
+        ]:
+            del self._users[user_id]
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Unified entry point: bot, webhook and status endpoints on one asyncio runtime
+"""
+import os
+import asyncio
+import logging
+from datetime import datetime
+from aiohttp import web
+from config import Config
+from utils.metrics import CONTENT_TYPE, MetricsWriter, collect_bot_metrics, collect_process_metrics
+from utils.profiler import ProfilerBusy, SamplingProfiler, authorized, profile_options
+from utils.status_stream import KEEPALIVE_INTERVAL, SSE_HEADERS, STREAM_CLIENT_JS, diff, normalize, page_etag, sse_event
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# Seconds between runs of the periodic maintenance job
+MAINTENANCE_INTERVAL = 600
+
+# Static status page; the counters are filled in from the stats stream
+STATUS_HTML = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Telegram Mobile Bot Status</title>
+    <style>
+        body { font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
+               max-width: 800px; margin: 0 auto; padding: 20px; background: #f5f5f5; }
+        .container { background: white; border-radius: 10px; padding: 30px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }
+        .status-grid { display: grid; grid-template-columns: repeat(auto-fit, minmax(220px, 1fr)); gap: 20px; }
+        .status-card { padding: 20px; border-radius: 8px; border-left: 4px solid #007bff; background: #f8f9fa; }
+        .status-card h3 { margin: 0 0 10px 0; color: #007bff; font-size: 14px; text-transform: uppercase; }
+        .status-card p { margin: 0; font-size: 18px; font-weight: 600; }
+        .live { text-align: center; color: #6c757d; margin-top: 30px; }
+    </style>
+    <script>
+/*STREAM_CLIENT_JS*/
+        function render(stats) {
+            setText('status', stats.status || 'Unknown');
+            setText('uptime', formatUptime(stats.uptime_seconds));
+            setText('total-requests', stats.total_requests || 0);
+            setText('mode', stats.is_webhook ? 'Webhook' : 'Polling');
+            setText('last-update', stats.last_update || 'Never');
+            const rates = stats.cache_hit_rates || {};
+            setText('search-cache', formatRate(rates.search));
+            setText('details-cache', formatRate(rates.details));
+            const search = (stats.latency || {}).search || {};
+            setText('search-latency', search.count ? `${search.p50}s / ${search.p95}s` : 'n/a');
+            setText('scrape-queue', (stats.scrape_queue || {}).depth || 0);
+            setText('update-queue', (stats.update_queue || {}).depth || 0);
+        }
+        document.addEventListener('DOMContentLoaded', () => streamStats('/api/stats/stream', render));
+    </script>
+</head>
+<body>
+    <div class="container">
+        <h1>📱 Telegram Mobile Bot</h1>
+        <div class="status-grid">
+            <div class="status-card"><h3>Bot Status</h3><p id="status">Connecting...</p></div>
+            <div class="status-card"><h3>Uptime</h3><p id="uptime">-</p></div>
+            <div class="status-card"><h3>Total Requests</h3><p id="total-requests">-</p></div>
+            <div class="status-card"><h3>Connection Type</h3><p id="mode">-</p></div>
+            <div class="status-card"><h3>Last Update</h3><p id="last-update">-</p></div>
+            <div class="status-card"><h3>Search Cache Hits</h3><p id="search-cache">-</p></div>
+            <div class="status-card"><h3>Details Cache Hits</h3><p id="details-cache">-</p></div>
+            <div class="status-card"><h3>Search Time p50 / p95</h3><p id="search-latency">-</p></div>
+            <div class="status-card"><h3>Queued Searches</h3><p id="scrape-queue">-</p></div>
+            <div class="status-card"><h3>Queued Updates</h3><p id="update-queue">-</p></div>
+        </div>
+        <p class="live" id="live">Connecting...</p>
+    </div>
+</body>
+</html>
+""".replace('/*STREAM_CLIENT_JS*/', STREAM_CLIENT_JS)
+STATUS_ETAG = page_etag(STATUS_HTML)
+
+class UnifiedServer:
+    """aiohttp server owning the event loop the bot runs on
+
+    The HTTP endpoints come up first so health checks pass right away,
+    then the bot starts in the background on the same loop: in webhook
+    mode when a public URL is known, polling otherwise. Caches, the scrape
+    scheduler and the outbound queue are all shared in this one process.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.bot = None
+        self.runtime = None
+        self.status = {
+            'status': 'Starting...',
+            'start_time': datetime.now(),
+            'total_requests': 0,
+            'last_update': None,
+            'webhook_url': None,
+            'is_webhook': False,
+        }
+        self._background = set()
+        self.profiler = SamplingProfiler()
+
+        self.app = web.Application()
+        self.app.add_routes([
+            web.get('/', self.status_page),
+            web.get('/health', self.health_check),
+            web.get('/api/stats', self.api_stats),
+            web.get('/api/stats/stream', self.api_stats_stream),
+            web.get('/metrics', self.metrics),
+            web.get('/debug/profile', self.debug_profile),
+            web.get('/debug/scrape_users', self.debug_scrape_users),
+            web.post('/webhook', self.webhook),
+            web.post('/set_webhook', self.set_webhook),
+        ])
+        self.app.on_startup.append(self._on_startup)
+        self.app.on_cleanup.append(self._on_cleanup)
+
+    # Lifecycle
+
+    async def _on_startup(self, app):
+        self._spawn(self._start_bot())
+
+    async def _on_cleanup(self, app):
+        for task in list(self._background):
+            task.cancel()
+        if self.runtime:
+            await self.runtime.shutdown()
+
+    def _spawn(self, coroutine):
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _webhook_url(self):
+        if self.config.WEBHOOK_URL:
+            return self.config.WEBHOOK_URL
+        hostname = os.getenv('RENDER_EXTERNAL_HOSTNAME')
+        return f"https://{hostname}/webhook" if hostname else None
+
+    async def _start_bot(self):
+        if not self.config.BOT_TOKEN:
+            self.status['status'] = 'Missing Bot Token'
+            logger.warning("TELEGRAM_BOT_TOKEN not found")
+            return
+
+        try:
+            # Heavy imports and setup run off the loop so /health keeps answering
+            self.bot = await asyncio.to_thread(self._build_bot)
+            from bot.runtime import BotRuntime
+            runtime = BotRuntime(self.bot, self.config.WEBHOOK_QUEUE_SIZE, self.config.WEBHOOK_DEDUP_WINDOW)
+            webhook_url = self._webhook_url()
+            await runtime.startup(polling=not webhook_url)
+            if webhook_url:
+                await runtime.set_webhook(webhook_url)
+                self.status['webhook_url'] = webhook_url
+                self.status['is_webhook'] = True
+            self.runtime = runtime
+            self.status['status'] = 'Running'
+            logger.info(f"Bot running ({'webhook ' + webhook_url if webhook_url else 'polling'})")
+        except Exception as e:
+            logger.error(f"Bot initialization failed: {e}")
+            self.status['status'] = f'Error: {str(e)}'
+            return
+
+        self._spawn(self._maintenance())
+
+    def _build_bot(self):
+        from bot.telegram_bot import MobileBot
+        return MobileBot(self.config)
+
+    async def _maintenance(self):
+        """Periodic housekeeping that used to need separate processes"""
+        while True:
+            await asyncio.sleep(MAINTENANCE_INTERVAL)
+            try:
+                self.bot.handlers.scrape_scheduler.prune()
+                persistence = self.bot.application.persistence
+                if persistence:
+                    await asyncio.to_thread(persistence.prune_result_sets, self.config.RESULT_SET_TTL)
+            except Exception as e:
+                logger.error(f"Maintenance error: {e}")
+
+    # Endpoints
+
+    async def health_check(self, request):
+        """Health check, answered even while the bot is still starting"""
+        return web.json_response({
+            'status': 'healthy',
+            'bot': self.status['status'],
+            'timestamp': datetime.now().isoformat(),
+            'service': 'telegram-mobile-bot'
+        })
+
+    async def status_page(self, request):
+        """Static status page, revalidated by ETag"""
+        headers = {'ETag': f'"{STATUS_ETAG}"', 'Cache-Control': 'no-cache'}
+        if STATUS_ETAG in request.headers.get('If-None-Match', ''):
+            return web.Response(status=304, headers=headers)
+        return web.Response(text=STATUS_HTML, content_type='text/html', headers=headers)
+
+    def _collect_stats(self):
+        stats = dict(self.status, start_time=self.status['start_time'].isoformat())
+        stats['uptime_seconds'] = int((datetime.now() - self.status['start_time']).total_seconds())
+        if self.bot:
+            handlers = self.bot.handlers
+            stats['cache_hit_rates'] = self.bot.scraper.cache_hit_rates()
+            stats['latency'] = handlers.latency.snapshot()
+            stats['captions'] = dict(handlers.formatter.caption_stats)
+            scheduler = handlers.scrape_scheduler
+            stats['scrape_queue'] = dict(scheduler.stats, depth=scheduler.queue_depth())
+            stats['scrape_users'] = scheduler.user_summary()
+        if self.runtime:
+            stats['update_queue'] = dict(self.runtime.stats, depth=self.runtime.queue_depth())
+        return stats
+
+    async def api_stats(self, request):
+        return web.json_response(self._collect_stats())
+
+    async def api_stats_stream(self, request):
+        """Server-Sent Events stream of the stats, sending only what changed"""
+        response = web.StreamResponse(headers=dict(SSE_HEADERS, **{'Content-Type': 'text/event-stream'}))
+        await response.prepare(request)
+        interval = self.config.STATS_STREAM_INTERVAL
+        sent = None
+        idle = 0.0
+        try:
+            await response.write(f"retry: {int(interval * 2000)}\n\n".encode('utf-8'))
+            while True:
+                snapshot = normalize(self._collect_stats())
+                if sent is None:
+                    await response.write(sse_event(snapshot, 'snapshot').encode('utf-8'))
+                else:
+                    delta = diff(sent, snapshot)
+                    if delta:
+                        await response.write(sse_event(delta).encode('utf-8'))
+                        idle = 0.0
+                    elif idle >= KEEPALIVE_INTERVAL:
+                        await response.write(b": keep-alive\n\n")
+                        idle = 0.0
+                sent = snapshot
+                await asyncio.sleep(interval)
+                idle += interval
+        except ConnectionResetError:
+            pass
+        return response
+
+    async def metrics(self, request):
+        """Prometheus metrics, read from the bot's counters at scrape time"""
+        writer = MetricsWriter()
+        writer.gauge('mobilebot_bot_up', 'Whether the bot is running.', self.runtime is not None)
+        writer.counter('mobilebot_webhook_requests_total', 'Webhook requests accepted.', self.status['total_requests'])
+        if self.bot:
+            collect_bot_metrics(writer, self.bot, self.runtime)
+        collect_process_metrics(writer)
+        return web.Response(body=writer.render().encode('utf-8'), headers={'Content-Type': CONTENT_TYPE})
+
+    async def debug_scrape_users(self, request):
+        """Scrape queue depth and wait times per user id (needs DEBUG_TOKEN)"""
+        if not self.config.DEBUG_TOKEN:
+            raise web.HTTPNotFound()
+        if not authorized(self.config.DEBUG_TOKEN, request.headers):
+            return web.json_response({'error': 'Unauthorized'}, status=401)
+        if not self.bot:
+            return web.json_response({})
+        users = self.bot.handlers.scrape_scheduler.user_stats()
+        return web.json_response({str(user_id): s for user_id, s in users.items()})
+
+    async def debug_profile(self, request):
+        """Sample every thread and task for a few seconds (needs DEBUG_TOKEN)"""
+        if not self.config.DEBUG_TOKEN:
+            raise web.HTTPNotFound()
+        if not authorized(self.config.DEBUG_TOKEN, request.headers):
+            return web.json_response({'error': 'Unauthorized'}, status=401)
+        try:
+            options = profile_options(request.query)
+        except ValueError as e:
+            return web.json_response({'error': str(e)}, status=400)
+        output = options.pop('format')
+        # Sampled from a worker thread so this loop keeps running and shows up in the profile
+        try:
+            result = await asyncio.to_thread(self.profiler.run, loops=[asyncio.get_running_loop()], **options)
+        except ProfilerBusy as e:
+            return web.json_response({'error': str(e)}, status=409)
+        if output == 'collapsed':
+            return web.Response(text=result['collapsed'] + '\n', content_type='text/plain')
+        return web.json_response(result)
+
+    async def webhook(self, request):
+        """Queue a Telegram update and acknowledge it right away"""
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.json_response({'error': 'No JSON data'}, status=400)
+        if not data:
+            return web.json_response({'error': 'No JSON data'}, status=400)
+
+        if not self.runtime:
+            return web.json_response({'error': 'Bot starting'}, status=503, headers={'Retry-After': '5'})
+        try:
+            accepted = self.runtime.submit(data)
+        except ValueError as e:
+            # Redelivering it would fail the same way
+            logger.warning(f"Dropping webhook request: {e}")
+            return web.json_response({'error': 'Malformed update'}, status=400)
+        if not accepted:
+            logger.warning("Update queue full, asking Telegram to retry")
+            return web.json_response({'error': 'Busy'}, status=503, headers={'Retry-After': '1'})
+
+        self.status['total_requests'] += 1
+        self.status['last_update'] = datetime.now().strftime('%H:%M:%S')
+        return web.json_response({'status': 'ok'})
+
+    async def set_webhook(self, request):
+        """Re-register the webhook, for operators holding DEBUG_TOKEN"""
+        # Startup already registers the webhook; without a token nobody may repoint it
+        if not self.config.DEBUG_TOKEN:
+            raise web.HTTPNotFound()
+        if not authorized(self.config.DEBUG_TOKEN, request.headers):
+            return web.json_response({'error': 'Unauthorized'}, status=401)
+        if not self.runtime:
+            return web.json_response({'error': 'Bot not initialized'}, status=500)
+        try:
+            data = await request.json() if request.can_read_body else {}
+        except ValueError:
+            data = {}
+        webhook_url = (data or {}).get('url') or f"https://{request.host}/webhook"
+
+        try:
+            await self.runtime.set_webhook(webhook_url)
+        except Exception as e:
+            logger.error(f"Failed to set webhook: {e}")
+            return web.json_response({'error': f'Failed to set webhook: {str(e)}'}, status=500)
+
+        self.status['webhook_url'] = webhook_url
+        self.status['is_webhook'] = True
+        return web.json_response({
+            'status': 'success',
+            'webhook_url': webhook_url,
+            'message': 'Webhook set successfully'
+        })
+
+def main():
+    """Serve the bot and its HTTP endpoints from one process"""
+    config = Config()
+    server = UnifiedServer(config)
+    port = int(os.environ.get('PORT', 10000))
+    logger.info(f"Starting unified server on port {port}")
+    web.run_app(server.app, host='0.0.0.0', port=port, print=None)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,2 @@
+#!/bin/sh
+exec python server.py
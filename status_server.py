@@ -6,7 +6,11 @@ import os
 import logging
 import json
 from datetime import datetime
-from flask import Flask, render_template_string, request, jsonify
+from flask import Flask, request, jsonify
+from config import Config
+from utils.heartbeat import HeartbeatReader
+from utils.metrics import CONTENT_TYPE, MetricsWriter, collect_process_metrics
+from utils.status_stream import STREAM_CLIENT_JS, SSE_HEADERS, StatsBroadcaster, page_etag
 
 # Configure logging
 logging.basicConfig(
@@ -16,6 +20,10 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+config = Config()
+
+# Heartbeat published by the bot process
+heartbeat = HeartbeatReader(config.STATUS_FILE_PATH)
 
 # Bot status tracking
 bot_status = {
@@ -28,7 +36,27 @@ bot_status = {
     'bot_token_present': bool(os.getenv('TELEGRAM_BOT_TOKEN'))
 }
 
-# HTML template for status page
+def refresh_status():
+    """Update bot_status from the bot's heartbeat file"""
+    state = heartbeat.read()
+    if state is None:
+        bot_status['status'] = 'Unknown'
+        return
+    if state['alive']:
+        bot_status['status'] = 'Running'
+        bot_status['start_time'] = datetime.fromtimestamp(state['started'])
+    elif state['running']:
+        bot_status['status'] = 'Not Responding'
+    else:
+        bot_status['status'] = 'Stopped'
+    bot_status['total_requests'] = state['updates']
+    bot_status['errors'] = state['errors']
+    bot_status['is_webhook'] = state['webhook']
+    if state['last_update']:
+        bot_status['last_update'] = datetime.fromtimestamp(state['last_update']).strftime('%H:%M:%S')
+    bot_status['last_heartbeat'] = round(state['age'], 1)
+
+# Static status page; the counters are filled in from the stats stream
 STATUS_HTML = """
 <!DOCTYPE html>
 <html lang="en">
@@ -64,9 +92,7 @@ STATUS_HTML = """
         .btn-secondary:hover { background: #545b62; }
     </style>
     <script>
-        function refreshStatus() {
-            location.reload();
-        }
+/*STREAM_CLIENT_JS*/
         function setWebhook() {
             const url = document.getElementById('webhook-url').value || generateWebhookUrl();
             fetch('/set_webhook', {
@@ -75,10 +101,7 @@ STATUS_HTML = """
                 body: JSON.stringify({url: url})
             })
             .then(response => response.json())
-            .then(data => {
-                alert(data.message || 'Webhook operation completed');
-                refreshStatus();
-            })
+            .then(data => alert(data.message || 'Webhook operation completed'))
             .catch(error => {
                 alert('Error: ' + error);
             });
@@ -86,8 +109,21 @@ STATUS_HTML = """
         function generateWebhookUrl() {
             return `https://${window.location.host}:5000/webhook`;
         }
-        // Auto-refresh every 30 seconds
-        setTimeout(function(){ location.reload(); }, 30000);
+        function render(stats) {
+            document.getElementById('status-card').className = 'status-card ' + (stats.status === 'Running' ? 'status-online' : 'status-offline');
+            setText('status', stats.status || 'Unknown');
+            setText('uptime', formatUptime(stats.uptime_seconds));
+            setText('total-requests', stats.total_requests || 0);
+            setText('mode', stats.is_webhook ? 'Webhook' : 'Polling');
+            setText('last-update', stats.last_update || 'Never');
+            setText('bot-token', stats.bot_token_present ? 'Configured ✓' : 'Missing ✗');
+            setText('errors', stats.errors || 0);
+            setText('heartbeat', stats.last_heartbeat === undefined ? 'n/a' : `${stats.last_heartbeat}s ago`);
+        }
+        document.addEventListener('DOMContentLoaded', () => {
+            setText('default-webhook', generateWebhookUrl());
+            streamStats('/api/stats/stream', render);
+        });
     </script>
 </head>
 <body>
@@ -98,34 +134,44 @@ STATUS_HTML = """
         </div>
         
         <div class="status-grid">
-            <div class="status-card {{ 'status-online' if status.status == 'Running' else 'status-offline' }}">
+            <div class="status-card status-offline" id="status-card">
                 <h3>Bot Status</h3>
-                <p>{{ status.status }}</p>
+                <p id="status">Connecting...</p>
             </div>
             
             <div class="status-card">
                 <h3>Uptime</h3>
-                <p>{{ uptime }}</p>
+                <p id="uptime">-</p>
             </div>
             
             <div class="status-card">
                 <h3>Total Requests</h3>
-                <p>{{ status.total_requests }}</p>
+                <p id="total-requests">-</p>
             </div>
             
             <div class="status-card">
                 <h3>Connection Type</h3>
-                <p>{{ 'Webhook' if status.is_webhook else 'Polling' }}</p>
+                <p id="mode">-</p>
             </div>
             
             <div class="status-card">
                 <h3>Last Update</h3>
-                <p>{{ status.last_update or 'Never' }}</p>
+                <p id="last-update">-</p>
             </div>
             
             <div class="status-card">
                 <h3>Bot Token</h3>
-                <p>{{ 'Configured ✓' if status.bot_token_present else 'Missing ✗' }}</p>
+                <p id="bot-token">-</p>
+            </div>
+            
+            <div class="status-card">
+                <h3>Errors</h3>
+                <p id="errors">-</p>
+            </div>
+            
+            <div class="status-card">
+                <h3>Last Heartbeat</h3>
+                <p id="heartbeat">-</p>
             </div>
         </div>
         
@@ -137,7 +183,7 @@ STATUS_HTML = """
             <button class="refresh-btn" onclick="setWebhook()">Set Webhook</button>
             <button class="refresh-btn btn-secondary" onclick="document.getElementById('webhook-url').value = generateWebhookUrl()">Use Default URL</button>
             <p style="font-size: 12px; color: #6c757d; margin-top: 10px;">
-                Default: https://{{ request.host }}:5000/webhook
+                Default: <span id="default-webhook"></span>
             </p>
         </div>
         
@@ -153,45 +199,20 @@ STATUS_HTML = """
             </ul>
         </div>
         
-        <button class="refresh-btn" onclick="refreshStatus()">🔄 Refresh Status</button>
-        <p style="text-align: center; color: #6c757d; margin-top: 30px;">
-            Last updated: {{ datetime.now().strftime('%Y-%m-%d %H:%M:%S UTC') }}
-        </p>
+        <p style="text-align: center; color: #6c757d; margin-top: 30px;" id="live">Connecting...</p>
     </div>
 </body>
 </html>
-"""
+""".replace('/*STREAM_CLIENT_JS*/', STREAM_CLIENT_JS)
+STATUS_ETAG = page_etag(STATUS_HTML)
 
 @app.route('/')
 def status_page():
-    """Display bot status page"""
-    global bot_status
-    
-    # Try to read status from main bot if available
-    try:
-        # Check if main bot is running by looking for its process
-        import subprocess
-        result = subprocess.run(['pgrep', '-f', 'main.py'], capture_output=True, text=True)
-        if result.returncode == 0:
-            bot_status['status'] = 'Running'
-        else:
-            bot_status['status'] = 'Stopped'
-    except:
-        bot_status['status'] = 'Unknown'
-    
-    # Calculate uptime
-    uptime_delta = datetime.now() - bot_status['start_time']
-    hours, remainder = divmod(int(uptime_delta.total_seconds()), 3600)
-    minutes, seconds = divmod(remainder, 60)
-    uptime = f"{hours}h {minutes}m {seconds}s"
-    
-    return render_template_string(
-        STATUS_HTML,
-        status=bot_status,
-        uptime=uptime,
-        datetime=datetime,
-        request=request
-    )
+    """Display bot status page (static, revalidated by ETag)"""
+    response = app.response_class(STATUS_HTML, mimetype='text/html')
+    response.set_etag(STATUS_ETAG)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 @app.route('/webhook', methods=['POST'])
 def webhook():
@@ -243,10 +264,38 @@ def set_webhook():
         logger.error(f"Error setting webhook: {e}")
         return jsonify({'error': str(e)}), 500
 
+def collect_stats():
+    """Current bot statistics, shared by the stats API and its stream"""
+    refresh_status()
+    stats = dict(bot_status)
+    stats['uptime_seconds'] = int((datetime.now() - bot_status['start_time']).total_seconds())
+    return stats
+
+stats_broadcaster = StatsBroadcaster(collect_stats, config.STATS_STREAM_INTERVAL)
+
 @app.route('/api/stats')
 def api_stats():
     """API endpoint for bot statistics"""
-    return jsonify(bot_status)
+    return jsonify(collect_stats())
+
+@app.route('/api/stats/stream')
+def api_stats_stream():
+    """Server-Sent Events stream of the statistics, sending only what changed"""
+    return app.response_class(stats_broadcaster.stream(), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics from the bot's heartbeat file"""
+    writer = MetricsWriter()
+    state = heartbeat.read()
+    writer.gauge('mobilebot_bot_up', 'Whether the bot is running.', bool(state and state['alive']))
+    if state:
+        writer.gauge('mobilebot_heartbeat_age_seconds', 'Seconds since the bot last published a heartbeat.',
+                     round(state['age'], 3))
+        writer.counter('mobilebot_updates_processed_total', 'Telegram updates handled.', state['updates'])
+        writer.counter('mobilebot_handler_errors_total', 'Errors raised by update handlers.', state['errors'])
+    collect_process_metrics(writer)
+    return app.response_class(writer.render(), content_type=CONTENT_TYPE)
 
 @app.route('/health')
 def health_check():
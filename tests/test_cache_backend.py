@@ -0,0 +1,141 @@
+import socket
+import socketserver
+import threading
+import time
+
+import pytest
+
+from utils.cache_backend import CacheUnavailable, RedisCache
+
+class FakeRedis(socketserver.ThreadingTCPServer):
+    """RESP server with just the commands RedisCache sends"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, password=None):
+        super().__init__(('127.0.0.1', 0), FakeRedisHandler)
+        self.password = password
+        self.data = {}
+        self.connections = 0
+        self.clients = []
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def drop_clients(self):
+        for client in self.clients:
+            try:
+                client.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.clients = []
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self.drop_clients()
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.server.connections += 1
+        self.server.clients.append(self.request)
+        authed = self.server.password is None
+        while True:
+            try:
+                args = self._read_command()
+            except (OSError, ValueError):
+                return
+            if args is None:
+                return
+            command = args[0].upper()
+            if command == b'AUTH':
+                authed = args[-1].decode() == self.server.password
+                self.wfile.write(b'+OK\r\n' if authed else b'-WRONGPASS invalid password\r\n')
+            elif not authed:
+                self.wfile.write(b'-NOAUTH Authentication required\r\n')
+            elif command == b'SELECT':
+                self.wfile.write(b'+OK\r\n')
+            elif command == b'GET':
+                value = self.server.data.get(args[1])
+                self.wfile.write(b'$-1\r\n' if value is None else b'$%d\r\n%s\r\n' % (len(value), value))
+            elif command == b'SET':
+                self.server.data[args[1]] = args[2]
+                self.wfile.write(b'+OK\r\n')
+            elif command == b'DEL':
+                self.wfile.write(b':%d\r\n' % int(self.server.data.pop(args[1], None) is not None))
+            else:
+                self.wfile.write(b'-ERR unknown command\r\n')
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+@pytest.fixture
+def server():
+    server = FakeRedis()
+    yield server
+    server.stop()
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def test_get_set_delete(server):
+    cache = RedisCache(port=server.port, db=1)
+    assert cache.get('missing') is None
+    cache.set('key', b'value', ttl=60)
+    assert cache.get('key') == b'value'
+    cache.delete('key')
+    assert cache.get('key') is None
+    assert server.connections == 1
+
+def test_reconnects_after_the_connection_drops(server):
+    cache = RedisCache(port=server.port)
+    cache.set('key', b'value', ttl=60)
+    server.drop_clients()
+    assert cache.get('key') == b'value'
+    assert server.connections == 2
+
+def test_backs_off_while_the_server_is_down():
+    cache = RedisCache(port=_free_port(), timeout=0.5)
+    with pytest.raises(CacheUnavailable):
+        cache.get('key')
+    assert cache._backoff == RedisCache.BACKOFF_INITIAL
+    started = time.monotonic()
+    with pytest.raises(CacheUnavailable):
+        cache.get('key')
+    # Skipped without another connection attempt
+    assert time.monotonic() - started < 0.1
+    cache._retry_at = 0.0
+    with pytest.raises(CacheUnavailable):
+        cache.get('key')
+    assert cache._backoff == RedisCache.BACKOFF_INITIAL * 2
+
+def test_rejected_auth_closes_the_socket_and_backs_off():
+    server = FakeRedis(password='secret')
+    try:
+        cache = RedisCache(port=server.port, password='wrong')
+        with pytest.raises(CacheUnavailable):
+            cache.get('key')
+        assert cache._sock is None
+        assert cache._retry_at > time.monotonic()
+        with pytest.raises(CacheUnavailable):
+            cache.get('key')
+        assert server.connections == 1
+    finally:
+        server.stop()
+
+def test_json_helpers_treat_an_outage_as_a_miss():
+    cache = RedisCache(port=_free_port(), timeout=0.5)
+    assert cache.get_json('key') == (False, None)
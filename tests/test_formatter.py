@@ -0,0 +1,37 @@
+from utils.formatter import CAPTION_LIMIT, MARKDOWN_SPECIAL_CHARS, MessageFormatter
+
+def _telegram_length(text):
+    return len(text.encode('utf-16-le')) // 2
+
+def _assert_valid_escapes(caption):
+    index = 0
+    while index < len(caption):
+        if caption[index] == '\\':
+            assert index + 1 < len(caption), "caption ends inside an escape"
+            assert caption[index + 1] in MARKDOWN_SPECIAL_CHARS
+            index += 2
+            continue
+        assert caption[index] not in MARKDOWN_SPECIAL_CHARS.replace('*', ''), f"unescaped {caption[index]!r}"
+        index += 1
+
+def test_oversized_caption_fits_and_keeps_escapes_whole():
+    formatter = MessageFormatter()
+    for prefix in range(4):
+        product = {'name': 'x' * prefix + 'Galaxy_S24 [5G] (v1.0)! ' * 200, 'price': '₹1,00,000'}
+        caption = formatter.format_product_caption(product)
+        assert _telegram_length(caption) <= CAPTION_LIMIT
+        assert '*' not in caption
+        _assert_valid_escapes(caption)
+    assert formatter.caption_stats['truncated'] == 4
+
+def test_truncation_cuts_plain_text_before_escaping():
+    formatter = MessageFormatter()
+    # Every character needs escaping, so any odd cut would split an escape
+    caption = formatter._truncate_plain('*' + '\\_' * 50 + '*', 7)
+    assert caption == '\\_\\_\\_'
+
+def test_caption_within_limit_is_not_truncated():
+    formatter = MessageFormatter()
+    caption = formatter.format_product_caption({'name': 'Pixel 9', 'price': '₹79,999'})
+    assert 'Pixel 9' in caption
+    assert formatter.caption_stats['truncated'] == 0
@@ -0,0 +1,38 @@
+"""
+Entry points must bind their port quickly: the bot stack, bs4 and
+trafilatura are loaded in the background after the web server is up
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds an entry point may take to import, as measured by -X importtime
+BUDGET = 1.5
+HEAVY_MODULES = ('telegram', 'bs4', 'trafilatura')
+
+def _import_times(module):
+    """Cumulative import time in seconds of every module imported by ``module``"""
+    env = dict(os.environ, TELEGRAM_BOT_TOKEN='', PYTHONDONTWRITEBYTECODE='1')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+@pytest.mark.parametrize('module', ['server', 'web_service', 'render_app', 'status_server'])
+def test_entry_point_imports_within_budget(module):
+    times = _import_times(module)
+    heavy = sorted({name.split('.')[0] for name in times} & set(HEAVY_MODULES))
+    assert not heavy, f"{module} imports {', '.join(heavy)} at import time"
+    assert times[module] < BUDGET, f"{module} took {times[module]:.3f}s to import (budget {BUDGET}s)"
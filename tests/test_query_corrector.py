@@ -0,0 +1,27 @@
+from utils.query_corrector import QueryCorrector
+
+def _corrector():
+    corrector = QueryCorrector(['samsung', 'apple', 'xiaomi'])
+    for name in ('Samsung Galaxy Z Fold5 5G', 'Xiaomi Redmi Note13 Pro', 'Apple iPhone 15 Pro'):
+        corrector.add_name(name)
+    return corrector
+
+def test_known_glued_tokens_are_not_split():
+    corrector = _corrector()
+    assert corrector.correct('galaxy fold5') == 'galaxy fold5'
+    assert corrector.correct('redmi note13 pro') == 'redmi note13 pro'
+
+def test_unknown_glued_tokens_are_split():
+    corrector = _corrector()
+    assert corrector.correct('iphone15pro') == 'iphone 15 pro'
+    assert corrector.correct('flip6') == 'flip 6'
+
+def test_letter_stays_with_its_number():
+    corrector = _corrector()
+    assert corrector.correct('galaxys24') == 'galaxy s24'
+    assert corrector.correct('samsung a15') == 'samsung a15'
+
+def test_misspellings_are_corrected():
+    corrector = _corrector()
+    assert corrector.correct('samsnug galxy') == 'samsung galaxy'
+    assert corrector.correct('iphnoe 15') == 'iphone 15'
@@ -0,0 +1,294 @@
+"""
+Key-value cache backends shared by scraper processes and replicas
+"""
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+logger = logging.getLogger(__name__)
+
+class CacheUnavailable(ConnectionError):
+    """The backend is known to be down and is skipped for now"""
+
+class CacheBackend(ABC):
+    """Byte-string cache with per-entry expiry
+
+    Subclasses implement ``get``, ``set`` and ``delete``. The JSON helpers
+    are what the scraper uses; they swallow backend errors, so an
+    unreachable cache only costs a cache miss and never fails a search.
+    """
+
+    name = 'cache'
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        """Return a stored value, or None if missing or expired"""
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: float):
+        """Store a value for ``ttl`` seconds"""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Remove a value if present"""
+
+    def get_json(self, key: str) -> Tuple[bool, Any]:
+        """Return (found, value) for a JSON entry"""
+        try:
+            raw = self.get(key)
+        except CacheUnavailable:
+            return False, None
+        except Exception as e:
+            logger.warning(f"{self.name} cache read failed for {key}: {e}")
+            return False, None
+        if raw is None:
+            return False, None
+        try:
+            return True, json.loads(raw)
+        except ValueError:
+            return False, None
+
+    def set_json(self, key: str, value: Any, ttl: float):
+        try:
+            self.set(key, json.dumps(value, default=str).encode('utf-8'), ttl)
+        except CacheUnavailable:
+            pass
+        except Exception as e:
+            logger.warning(f"{self.name} cache write failed for {key}: {e}")
+
+class MemoryCache(CacheBackend):
+    """Per-process LRU cache, the default for a single instance"""
+
+    name = 'memory'
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: bytes, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+class SQLiteCache(CacheBackend):
+    """Cache in a SQLite file, shared by every process on the same host"""
+
+    name = 'sqlite'
+
+    # Expired rows are purged after this many writes
+    PURGE_EVERY = 500
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._connection().execute(
+            "SELECT value FROM cache WHERE key = ? AND expires >= ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl: float):
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)", (key, value, time.time() + ttl)
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM cache WHERE expires < ?", (time.time(),))
+
+    def delete(self, key: str):
+        self._connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+class RedisError(Exception):
+    """Error reply from a Redis server"""
+
+class RedisCache(CacheBackend):
+    """Minimal Redis client (RESP over a plain socket) for caches shared by replicas
+
+    Only GET, SET with expiry, DEL, AUTH and SELECT are needed, so this
+    avoids a client library dependency. Any server speaking RESP works,
+    including Redis-compatible services and local stand-ins. A dropped
+    connection is reopened once; if the server cannot be reached or
+    rejects AUTH/SELECT it is skipped for a backoff period (doubling up
+    to ``BACKOFF_MAX``), so an outage costs cache misses rather than a
+    connect timeout per lookup.
+    """
+
+    name = 'redis'
+
+    # Seconds the server is skipped after it could not be reached
+    BACKOFF_INITIAL = 1.0
+    BACKOFF_MAX = 30.0
+
+    def __init__(self, host: str = 'localhost', port: int = 6379, db: int = 0,
+                 password: Optional[str] = None, username: Optional[str] = None, timeout: float = 2.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.username = username
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._sock: Optional[socket.socket] = None
+        self._reader = None
+        self._backoff = 0.0
+        self._retry_at = 0.0
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._reader = self._sock.makefile('rb')
+        if self.password:
+            auth = ('AUTH', self.username, self.password) if self.username else ('AUTH', self.password)
+            self._command(*auth)
+        if self.db:
+            self._command('SELECT', str(self.db))
+
+    def _close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._reader = None
+
+    def _command(self, *args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        self._sock.sendall(b''.join(parts))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode('utf-8')
+        if kind == b'-':
+            raise RedisError(payload.decode('utf-8'))
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            count = int(payload)
+            return None if count < 0 else [self._read_reply() for _ in range(count)]
+        raise RedisError(f"Unexpected reply: {line!r}")
+
+    def execute(self, *args):
+        """Send one command, reconnecting once if the connection went away"""
+        with self._lock:
+            if time.monotonic() < self._retry_at:
+                raise CacheUnavailable(f"Redis at {self.host}:{self.port} is unavailable")
+            for attempt in (1, 2):
+                fresh = self._sock is None
+                if fresh:
+                    try:
+                        self._connect()
+                    except (OSError, RedisError) as e:
+                        # Unreachable, or refused AUTH/SELECT: either way the server is unusable for now
+                        self._close()
+                        raise self._back_off(e) from e
+                try:
+                    result = self._command(*args)
+                    self._backoff = 0.0
+                    return result
+                except (OSError, ConnectionError) as e:
+                    self._close()
+                    # A stale connection gets one retry, a failed new one means the server is down
+                    if fresh or attempt == 2:
+                        raise self._back_off(e) from e
+
+    def _back_off(self, error: Exception) -> CacheUnavailable:
+        """Skip the server for the next, longer backoff period"""
+        self._backoff = min(self._backoff * 2 or self.BACKOFF_INITIAL, self.BACKOFF_MAX)
+        self._retry_at = time.monotonic() + self._backoff
+        logger.warning(f"Redis at {self.host}:{self.port} unreachable ({error}), "
+                       f"skipping it for {self._backoff:g}s")
+        return CacheUnavailable(str(error))
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.execute('GET', key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self.execute('SET', key, value, 'PX', str(max(1, int(ttl * 1000))))
+
+    def delete(self, key: str):
+        self.execute('DEL', key)
+
+def create_cache(url: str) -> CacheBackend:
+    """Build a cache backend from a URL
+
+    ``memory://`` keeps entries in this process, ``sqlite:///path/to/file.db``
+    shares them between processes on one host, and
+    ``redis://[user:password@]host:port/db`` between hosts.
+    """
+    parsed = urlparse(url or 'memory://')
+    if parsed.scheme == 'memory':
+        return MemoryCache()
+    if parsed.scheme == 'sqlite':
+        # sqlite:///relative.db and sqlite:////absolute.db
+        return SQLiteCache(parsed.path[1:] or 'data/cache.db')
+    if parsed.scheme == 'redis':
+        return RedisCache(
+            host=parsed.hostname or 'localhost',
+            port=parsed.port or 6379,
+            db=int(parsed.path[1:] or 0),
+            password=unquote(parsed.password) if parsed.password else None,
+            username=unquote(parsed.username) if parsed.username else None,
+        )
+    raise ValueError(f"Unsupported cache backend: {url}")
@@ -0,0 +1,112 @@
+"""
+Persistent cache of Telegram file_ids for product images
+"""
+import asyncio
+import os
+import sqlite3
+import logging
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class FileIdCache:
+    """Map remote image URLs to the file_id Telegram returned for them
+
+    Re-sending a photo by file_id is instant and does not make Telegram
+    fetch the image from 91mobiles or GSMArena again. Entries are kept in
+    memory for lookups and written to a small SQLite file so they survive
+    restarts. Writes are batched and committed from a worker thread, so
+    sending a photo never waits on SQLite in the event loop.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file_ids: Dict[str, str] = {}
+        self._conn = None
+        # image URL -> file_id to store, or None to delete
+        self._pending: Dict[str, Optional[str]] = {}
+        self._pending_lock = threading.Lock()
+        self._commit_scheduled = False
+
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS file_ids (image_url TEXT PRIMARY KEY, file_id TEXT NOT NULL)"
+            )
+            self._conn.commit()
+            self._file_ids = dict(self._conn.execute("SELECT image_url, file_id FROM file_ids"))
+            logger.info(f"Loaded {len(self._file_ids)} cached image file_ids")
+        except sqlite3.Error as e:
+            # Fall back to an in-memory only cache
+            logger.error(f"File id cache unavailable at {path}: {e}")
+            self._conn = None
+
+    def get(self, image_url: Optional[str]) -> Optional[str]:
+        """Return the cached file_id for an image URL, if any"""
+        if not image_url:
+            return None
+        return self._file_ids.get(image_url)
+
+    def set(self, image_url: Optional[str], file_id: Optional[str]):
+        """Remember the file_id Telegram assigned to an image URL"""
+        if not image_url or not file_id or self._file_ids.get(image_url) == file_id:
+            return
+        self._file_ids[image_url] = file_id
+        self._queue_write(image_url, file_id)
+
+    def forget(self, image_url: Optional[str]):
+        """Drop a file_id that Telegram no longer accepts"""
+        if not image_url or image_url not in self._file_ids:
+            return
+        self._file_ids.pop(image_url, None)
+        self._queue_write(image_url, None)
+
+    # Batched writes
+
+    def _queue_write(self, image_url: str, file_id: Optional[str]):
+        if not self._conn:
+            return
+        with self._pending_lock:
+            self._pending[image_url] = file_id
+        if self._commit_scheduled:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Not called from the bot's loop, write right away
+            self.flush()
+            return
+        self._commit_scheduled = True
+        loop.call_soon(lambda: loop.create_task(self._commit_async()))
+
+    async def _commit_async(self):
+        self._commit_scheduled = False
+        await asyncio.to_thread(self.flush)
+
+    def flush(self):
+        """Write pending changes to the SQLite file"""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        if not pending or not self._conn:
+            return
+        with self._lock:
+            try:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO file_ids (image_url, file_id) VALUES (?, ?)",
+                        [(url, file_id) for url, file_id in pending.items() if file_id is not None]
+                    )
+                    self._conn.executemany(
+                        "DELETE FROM file_ids WHERE image_url = ?",
+                        [(url,) for url, file_id in pending.items() if file_id is None]
+                    )
+            except sqlite3.Error as e:
+                logger.error(f"Error storing {len(pending)} image file_ids: {e}")
+
+    def __len__(self) -> int:
+        return len(self._file_ids)
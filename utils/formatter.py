@@ -2,40 +2,158 @@
 Message formatting utilities for the Telegram bot
 """
 import re
-from typing import Dict, List
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+# Characters that need to be escaped in MarkdownV2
+MARKDOWN_SPECIAL_CHARS = '_*[]()~`>#+-=|{}.!'
+_MARKDOWN_ESCAPE_TABLE = str.maketrans({char: f'\\{char}' for char in MARKDOWN_SPECIAL_CHARS})
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+# An escaped character, or a bold marker
+_MARKUP_RE = re.compile(r'\\(.)|\*', re.S)
+
+# Number of rendered product cards kept in memory
+CARD_CACHE_SIZE = 512
+
+# Telegram's limit for photo captions, in UTF-16 code units
+CAPTION_LIMIT = 1024
+
+# Progressively smaller layouts tried until a caption fits its budget:
+# (features, specs, summary length, show footer)
+CAPTION_LAYOUTS = (
+    (5, 10, 150, True),
+    (5, 10, 150, False),
+    (5, 6, 150, False),
+    (3, 6, 80, False),
+    (3, 3, 80, False),
+    (0, 3, 0, False),
+    (0, 0, 0, False),
+)
 
 class MessageFormatter:
     """Class to format messages for Telegram"""
     
     def __init__(self):
-        pass
+        self._card_cache = OrderedDict()
+        self.caption_stats = {
+            'rendered': 0,
+            'over_limit': 0,
+            'truncated': 0,
+        }
     
     def format_product_card(self, product: Dict) -> str:
         """Format comprehensive product information as a Telegram message"""
-        name = self._escape_markdown(product.get('name', 'Unknown'))
-        price = self._escape_markdown(product.get('price', 'Price not available'))
+        key = self._product_key(product)
+        return self._cached(key, lambda: self._render_product_card(product))
+    
+    def format_product_caption(self, product: Dict, limit: int = CAPTION_LIMIT) -> str:
+        """Format a product card that fits in a photo caption
+        
+        Sections are shortened or dropped, smallest loss first, until the
+        escaped output fits ``limit``; a caption that still does not fit is
+        cut at a line boundary, or as plain text if a single line is too long.
+        """
+        key = (self._product_key(product), limit)
+        return self._cached(key, lambda: self._render_caption(product, limit))
+    
+    def _cached(self, key, render) -> str:
+        """Return a rendered card from the LRU cache, rendering it on a miss"""
+        cached = self._card_cache.get(key)
+        if cached is not None:
+            self._card_cache.move_to_end(key)
+            return cached
+        
+        message = render()
+        
+        self._card_cache[key] = message
+        if len(self._card_cache) > CARD_CACHE_SIZE:
+            self._card_cache.popitem(last=False)
+        return message
+    
+    def _render_caption(self, product: Dict, limit: int) -> str:
+        """Render the most complete layout that fits in ``limit``"""
+        self.caption_stats['rendered'] += 1
+        
+        for index, (max_features, max_specs, summary_length, footer) in enumerate(CAPTION_LAYOUTS):
+            caption = self._render_product_card(product, max_features, max_specs, summary_length, footer)
+            if self._telegram_length(caption) <= limit:
+                if index:
+                    self.caption_stats['over_limit'] += 1
+                return caption
+        
+        self.caption_stats['over_limit'] += 1
+        self.caption_stats['truncated'] += 1
+        lines = caption.split("\n")
+        while len(lines) > 1 and self._telegram_length("\n".join(lines)) > limit:
+            lines.pop()
+        caption = "\n".join(lines)
+        if self._telegram_length(caption) > limit:
+            # A single line over the limit, drop the formatting rather than break it
+            caption = self._truncate_plain(caption, limit)
+        return caption
+    
+    def _truncate_plain(self, caption: str, limit: int) -> str:
+        """Cut a caption as plain text and escape it again, so no escape is split"""
+        plain = _MARKUP_RE.sub(lambda match: match.group(1) or '', caption)
+        pieces = []
+        used = 0
+        for char in plain:
+            piece = char.translate(_MARKDOWN_ESCAPE_TABLE)
+            size = self._telegram_length(piece)
+            if used + size > limit:
+                break
+            pieces.append(piece)
+            used += size
+        return ''.join(pieces)
+    
+    @staticmethod
+    def _telegram_length(text: str) -> int:
+        """Length of text as Telegram counts it (UTF-16 code units)"""
+        return len(text.encode('utf-16-le')) // 2
+    
+    def _product_key(self, product: Dict) -> Tuple:
+        """Build a hashable key from the product fields that appear on a card"""
+        return (
+            product.get('name', 'Unknown'),
+            product.get('price', 'Price not available'),
+            product.get('source', 'Unknown'),
+            product.get('product_url', ''),
+            product.get('summary', ''),
+            tuple(product.get('features', ()) or ()),
+            tuple(product.get('detailed_specs', ()) or ()),
+            tuple(product.get('specs', ()) or ()),
+        )
+    
+    def _render_product_card(self, product: Dict, max_features: int = 5, max_specs: int = 10,
+                             summary_length: int = 150, footer: bool = True) -> str:
+        """Render a product card without consulting the cache"""
+        escape = self._escape_markdown
+        clean = self._clean_spec_text
+        name = escape(product.get('name', 'Unknown'))
+        price = escape(product.get('price', 'Price not available'))
         source = product.get('source', 'Unknown')
         product_url = product.get('product_url', '')
         
         # Format message header
-        message = f"📱 *{name}*\n"
-        message += f"💰 *Price:* {price}\n"
-        message += f"🔗 *Source:* {source}\n\n"
+        parts = [
+            f"📱 *{name}*\n",
+            f"💰 *Price:* {price}\n",
+            f"🔗 *Source:* {source}\n\n",
+        ]
         
         # Add product summary if available
         summary = product.get('summary', '')
-        if summary:
-            clean_summary = self._escape_markdown(summary[:150])
-            message += f"📝 *Overview:*\n{clean_summary}\n\n"
+        if summary and summary_length:
+            parts.append(f"📝 *Overview:*\n{escape(summary[:summary_length])}\n\n")
         
         # Add key features if available
         features = product.get('features', [])
-        if features:
-            message += "*⭐ Key Features:*\n"
-            for feature in features[:5]:
-                clean_feature = self._escape_markdown(self._clean_spec_text(feature))
-                message += f"• {clean_feature}\n"
-            message += "\n"
+        if features and max_features:
+            parts.append("*⭐ Key Features:*\n")
+            parts.extend(f"• {escape(clean(feature))}\n" for feature in features[:max_features])
+            parts.append("\n")
         
         # Add detailed specifications
         detailed_specs = product.get('detailed_specs', [])
@@ -43,43 +161,41 @@ class MessageFormatter:
         
         all_specs = detailed_specs + specs if detailed_specs else specs
         
-        if all_specs:
-            message += "*📋 Full Specifications:*\n"
-            for i, spec in enumerate(all_specs[:10], 1):  # Show more comprehensive specs
-                clean_spec = self._escape_markdown(self._clean_spec_text(spec))
-                message += f"{i}\. {clean_spec}\n"
-            message += "\n"
+        if all_specs and max_specs:
+            parts.append("*📋 Full Specifications:*\n")
+            parts.extend(
+                f"{i}\\. {escape(clean(spec))}\n"
+                for i, spec in enumerate(all_specs[:max_specs], 1)  # Show more comprehensive specs
+            )
+            parts.append("\n")
         
         # Add purchase link
         if product_url:
-            message += f"🛒 [👆 View Complete Details & Buy Here]({product_url})\n\n"
+            parts.append(f"🛒 [👆 View Complete Details & Buy Here]({product_url})\n\n")
+        
+        if not footer:
+            return "".join(parts).rstrip()
         
         # Add additional product information
-        message += "*📊 Product Information:*\n"
-        message += f"• *Source:* {source}\n"
+        parts.append("*📊 Product Information:*\n")
+        parts.append(f"• *Source:* {source}\n")
         
         if source == '91mobiles':
-            message += "• *Includes:* Prices, offers, reviews & comparisons\n"
+            parts.append("• *Includes:* Prices, offers, reviews & comparisons\n")
         elif source == 'GSMArena':
-            message += "• *Includes:* Technical specs & expert reviews\n"
+            parts.append("• *Includes:* Technical specs & expert reviews\n")
             
         # Add call to action
-        message += "\n💡 _Tap the link above for live pricing and availability_"
+        parts.append("\n💡 _Tap the link above for live pricing and availability_")
         
-        return message
+        return "".join(parts)
     
     def _escape_markdown(self, text: str) -> str:
         """Escape special characters for Markdown formatting"""
         if not text:
             return ""
         
-        # Characters that need to be escaped in MarkdownV2
-        special_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-        
-        for char in special_chars:
-            text = text.replace(char, f'\\{char}')
-        
-        return text
+        return text.translate(_MARKDOWN_ESCAPE_TABLE)
     
     def _clean_spec_text(self, spec: str) -> str:
         """Clean specification text for better formatting"""
@@ -87,10 +203,10 @@ class MessageFormatter:
             return ""
         
         # Remove excessive whitespace
-        spec = re.sub(r'\s+', ' ', spec.strip())
+        spec = _WHITESPACE_RE.sub(' ', spec.strip())
         
         # Remove HTML tags if any
-        spec = re.sub(r'<[^>]+>', '', spec)
+        spec = _HTML_TAG_RE.sub('', spec)
         
         # Limit length
         if len(spec) > 80:
@@ -0,0 +1,133 @@
+"""
+Bot liveness and counters published through a small memory-mapped file
+"""
+import logging
+import mmap
+import os
+import struct
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'MSFB'
+VERSION = 1
+
+# magic, version, sequence number, then the published fields
+_HEADER = struct.Struct('<4sH2xQ')
+_BODY = struct.Struct('<IddddQQ??2x')
+SIZE = _HEADER.size + _BODY.size
+
+class HeartbeatWriter:
+    """Publish the bot's state into a fixed-size mmap'd file
+
+    The bot calls ``beat`` from its event loop every ``interval`` seconds,
+    so a stalled loop shows up as a stale heartbeat rather than a live
+    process. Each write is bracketed by a sequence number that is odd
+    while the write is in progress, which lets readers in other processes
+    detect and retry a torn read without any locking.
+    """
+
+    def __init__(self, path: str, interval: float = 5):
+        self.path = path
+        self.interval = interval
+        self.started = time.time()
+        self._seq = 0
+        self._processed = 0
+        self._last_update = 0.0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, SIZE)
+            self._map = mmap.mmap(fd, SIZE)
+        finally:
+            os.close(fd)
+
+    def _write(self, running: bool, updates: int, errors: int, webhook: bool):
+        now = time.time()
+        if updates != self._processed:
+            self._processed = updates
+            self._last_update = now
+
+        self._seq += 1
+        _HEADER.pack_into(self._map, 0, MAGIC, VERSION, self._seq)
+        _BODY.pack_into(
+            self._map, _HEADER.size, os.getpid(), self.started, now, self.interval,
+            self._last_update, updates, errors, running, webhook
+        )
+        self._seq += 1
+        _HEADER.pack_into(self._map, 0, MAGIC, VERSION, self._seq)
+
+    def beat(self, updates: int = 0, errors: int = 0, webhook: bool = False):
+        """Record that the bot is alive along with its current counters"""
+        self._write(True, updates, errors, webhook)
+
+    def stop(self, updates: int = 0, errors: int = 0, webhook: bool = False):
+        """Record a clean shutdown so readers report the bot as stopped"""
+        self._write(False, updates, errors, webhook)
+        self._map.flush()
+
+class HeartbeatReader:
+    """Read the state published by a HeartbeatWriter
+
+    The file is mapped once, so each ``read`` is a couple of struct
+    unpacks with no syscalls or subprocesses. The heartbeat counts as
+    stale once three beat intervals pass without a write.
+    """
+
+    # Attempts before giving up on a read racing a write
+    MAX_RETRIES = 10
+
+    def __init__(self, path: str):
+        self.path = path
+        self._map: Optional[mmap.mmap] = None
+
+    def _open(self) -> Optional[mmap.mmap]:
+        if self._map is None:
+            try:
+                fd = os.open(self.path, os.O_RDONLY)
+            except FileNotFoundError:
+                return None
+            try:
+                if os.fstat(fd).st_size < SIZE:
+                    return None
+                self._map = mmap.mmap(fd, SIZE, access=mmap.ACCESS_READ)
+            finally:
+                os.close(fd)
+        return self._map
+
+    def read(self) -> Optional[Dict]:
+        """Return the bot's last published state, or None if it never published"""
+        status_map = self._open()
+        if status_map is None:
+            return None
+
+        for _ in range(self.MAX_RETRIES):
+            magic, version, seq = _HEADER.unpack_from(status_map, 0)
+            if magic != MAGIC or version != VERSION:
+                return None
+            if seq % 2:
+                continue
+            body = _BODY.unpack_from(status_map, _HEADER.size)
+            if _HEADER.unpack_from(status_map, 0)[2] == seq:
+                break
+        else:
+            return None
+
+        pid, started, beat, interval, last_update, updates, errors, running, webhook = body
+        age = time.time() - beat
+        return {
+            'pid': pid,
+            'started': started,
+            'last_beat': beat,
+            'age': age,
+            'running': running,
+            'alive': running and age < interval * 3,
+            'updates': updates,
+            'errors': errors,
+            'last_update': last_update or None,
+            'webhook': webhook,
+        }
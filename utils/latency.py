@@ -0,0 +1,151 @@
+"""
+Rolling latency histograms for the stages of the search pipeline
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Bucket upper bounds in seconds, from 1ms to 2 minutes
+BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 25.0, 60.0, 120.0, math.inf,
+)
+
+class LatencyHistogram:
+    """Bucketed latency histogram over a sliding time window
+
+    The window is split into ``slots`` sub-histograms; recording only
+    touches the current one, and slots older than the window are cleared
+    as time moves on, so percentiles reflect roughly the last ``window``
+    seconds. Lifetime bucket counts and sums are kept as well for
+    exporting cumulative histograms.
+    """
+
+    def __init__(self, window: float = 300, slots: int = 10):
+        self.slot_width = window / slots
+        self._lock = threading.Lock()
+        # Per slot: [epoch, count, sum, bucket counts]
+        self._slots: List[list] = [[-1, 0, 0.0, [0] * len(BUCKETS)] for _ in range(slots)]
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def _slot(self, now: float) -> list:
+        epoch = int(now / self.slot_width)
+        slot = self._slots[epoch % len(self._slots)]
+        if slot[0] != epoch:
+            slot[0], slot[1], slot[2] = epoch, 0, 0.0
+            slot[3] = [0] * len(BUCKETS)
+        return slot
+
+    def observe(self, seconds: float):
+        index = bisect.bisect_left(BUCKETS, seconds)
+        with self._lock:
+            slot = self._slot(time.monotonic())
+            slot[1] += 1
+            slot[2] += seconds
+            slot[3][index] += 1
+            self.buckets[index] += 1
+            self.count += 1
+            self.sum += seconds
+
+    def totals(self) -> Tuple[List[int], int, float]:
+        """Lifetime (bucket counts, count, sum), for cumulative exports"""
+        with self._lock:
+            return list(self.buckets), self.count, self.sum
+
+    def _window(self) -> Tuple[int, float, List[int]]:
+        oldest = int(time.monotonic() / self.slot_width) - len(self._slots) + 1
+        count, total, buckets = 0, 0.0, [0] * len(BUCKETS)
+        for epoch, slot_count, slot_sum, slot_buckets in self._slots:
+            if epoch >= oldest:
+                count += slot_count
+                total += slot_sum
+                buckets = [a + b for a, b in zip(buckets, slot_buckets)]
+        return count, total, buckets
+
+    @staticmethod
+    def _quantile(buckets: List[int], count: int, q: float) -> float:
+        """Estimate a quantile by interpolating inside its bucket"""
+        rank = q * count
+        seen = 0
+        for index, bucket_count in enumerate(buckets):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = BUCKETS[index - 1] if index else 0.0
+                upper = BUCKETS[index]
+                if math.isinf(upper):
+                    return lower
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return 0.0
+
+    def summary(self) -> Dict:
+        """Count, mean and p50/p95/p99 in seconds over the window"""
+        with self._lock:
+            count, total, buckets = self._window()
+        if not count:
+            return {'count': 0}
+        return {
+            'count': count,
+            'mean': round(total / count, 4),
+            'p50': round(self._quantile(buckets, count, 0.50), 4),
+            'p95': round(self._quantile(buckets, count, 0.95), 4),
+            'p99': round(self._quantile(buckets, count, 0.99), 4),
+        }
+
+class LatencyTracker:
+    """Latency histograms per pipeline stage, and per source within a stage
+
+    Timings are recorded with ``time.monotonic`` through ``timer`` or
+    ``observe`` from any thread. ``source`` only ever names the upstream
+    site a timing belongs to (91mobiles, GSMArena); variants of a stage
+    such as send kinds get their own stage name. A timing with a source
+    counts towards both the stage's overall histogram and that source's.
+    """
+
+    def __init__(self, window: float = 300):
+        self.window = window
+        self._lock = threading.Lock()
+        # (stage, source or None) -> histogram
+        self.histograms: Dict[Tuple[str, Optional[str]], LatencyHistogram] = {}
+
+    def _histogram(self, stage: str, source: Optional[str]) -> LatencyHistogram:
+        key = (stage, source)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(key, LatencyHistogram(self.window))
+        return histogram
+
+    def observe(self, stage: str, seconds: float, source: Optional[str] = None):
+        self._histogram(stage, None).observe(seconds)
+        if source:
+            self._histogram(stage, source).observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str, source: Optional[str] = None) -> Iterator[None]:
+        """Time the enclosed block as one sample of ``stage``"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.monotonic() - start, source)
+
+    def items(self) -> List[Tuple[Tuple[str, Optional[str]], LatencyHistogram]]:
+        """((stage, source), histogram) pairs, sorted by stage and source"""
+        with self._lock:
+            return sorted(self.histograms.items(), key=lambda item: (item[0][0], item[0][1] or ''))
+
+    def snapshot(self) -> Dict:
+        """Percentiles per stage, with a ``sources`` breakdown where recorded"""
+        histograms = self.items()
+        stats: Dict[str, Dict] = {}
+        for (stage, source), histogram in histograms:
+            if source is None:
+                stats.setdefault(stage, {}).update(histogram.summary())
+            else:
+                stats.setdefault(stage, {}).setdefault('sources', {})[source] = histogram.summary()
+        return stats
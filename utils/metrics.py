@@ -0,0 +1,164 @@
+"""
+Prometheus text exposition of the bot's counters
+"""
+import math
+import os
+from typing import Dict, List, Optional, Tuple
+
+from utils.latency import BUCKETS
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Content type of the text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_value(value) -> str:
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
+
+class MetricsWriter:
+    """Collect samples and render them in the Prometheus text format
+
+    Nothing is tracked here: the bot keeps plain counters in its stats
+    dicts and histograms, and they are only read and formatted when
+    ``/metrics`` is scraped, so monitoring adds no work to the hot path.
+    Samples of one metric are grouped under a single HELP/TYPE header
+    whatever order they are added in.
+    """
+
+    def __init__(self):
+        # name -> (type, help, [(suffix, labels, value)])
+        self._families: Dict[str, Tuple[str, str, List[tuple]]] = {}
+
+    def _add(self, kind: str, name: str, help_text: str, value, labels: Optional[Dict] = None, suffix: str = ''):
+        family = self._families.setdefault(name, (kind, help_text, []))
+        family[2].append((suffix, labels or {}, value))
+
+    def counter(self, name: str, help_text: str, value, labels: Optional[Dict] = None):
+        self._add('counter', name, help_text, value, labels)
+
+    def gauge(self, name: str, help_text: str, value, labels: Optional[Dict] = None):
+        self._add('gauge', name, help_text, value, labels)
+
+    def histogram(self, name: str, help_text: str, histogram, labels: Optional[Dict] = None):
+        """Export a LatencyHistogram's lifetime buckets as a cumulative histogram"""
+        buckets, count, total = histogram.totals()
+        labels = labels or {}
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKETS, buckets):
+            cumulative += bucket_count
+            self._add('histogram', name, help_text, cumulative, dict(labels, le=_format_value(float(bound))), '_bucket')
+        self._add('histogram', name, help_text, total, labels, '_sum')
+        self._add('histogram', name, help_text, count, labels, '_count')
+
+    def render(self) -> str:
+        lines = []
+        for name, (kind, help_text, samples) in self._families.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                label_text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+                lines.append(f"{name}{suffix}{{{label_text}}} {_format_value(value)}" if label_text
+                             else f"{name}{suffix} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+def collect_process_metrics(writer: MetricsWriter):
+    """Memory and CPU of this process, with the standard process_* names"""
+    times = os.times()
+    writer.counter('process_cpu_seconds_total', 'Total user and system CPU time spent in seconds.',
+                   times.user + times.system)
+    try:
+        with open('/proc/self/statm') as statm:
+            size, resident = (int(field) for field in statm.read().split()[:2])
+        page_size = os.sysconf('SC_PAGE_SIZE')
+        writer.gauge('process_resident_memory_bytes', 'Resident memory size in bytes.', resident * page_size)
+        writer.gauge('process_virtual_memory_bytes', 'Virtual memory size in bytes.', size * page_size)
+    except (OSError, ValueError):
+        pass
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux
+        writer.gauge('process_max_resident_memory_bytes', 'Peak resident memory size in bytes.',
+                     resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+
+def _collect_latency(writer: MetricsWriter, tracker):
+    histograms = tracker.items()
+    with_sources = {stage for (stage, source), _ in histograms if source}
+    for (stage, source), histogram in histograms:
+        # Stages timed per source are exported per source only, so sums add up
+        if source is None and stage in with_sources:
+            continue
+        labels = {'stage': stage, 'source': source or ''}
+        writer.histogram('mobilebot_stage_duration_seconds', 'Duration of search pipeline stages.', histogram, labels)
+
+def collect_bot_metrics(writer: MetricsWriter, bot, runtime=None):
+    """Scraper, cache, scheduling and Telegram I/O counters of a MobileBot"""
+    scraper = bot.scraper
+    handlers = bot.handlers
+
+    # Upstream scraping
+    for (host, status), count in list(scraper.request_stats.items()):
+        writer.counter('mobilebot_upstream_requests_total', 'HTTP requests made to scraped sites.', count,
+                       {'host': host, 'status': status})
+    _collect_latency(writer, scraper.latency)
+
+    # Caches
+    cache_stats = scraper.cache_stats
+    result_stats = handlers.result_store.stats
+    for cache, result, count in (
+        ('search', 'hit', cache_stats['search_hits']),
+        ('search', 'miss', cache_stats['search_misses']),
+        ('details', 'hit', cache_stats['detail_hits']),
+        ('details', 'miss', cache_stats['detail_misses']),
+        ('failed_urls', 'hit', cache_stats['negative_hits']),
+        ('result_sets', 'hit', result_stats['hits']),
+        ('result_sets', 'miss', result_stats['misses']),
+    ):
+        writer.counter('mobilebot_cache_requests_total', 'Cache lookups by cache and result.', count,
+                       {'cache': cache, 'result': result})
+    evictions = [('result_sets', result_stats['evicted'])]
+    if hasattr(scraper.cache, 'evictions'):
+        evictions.append((scraper.cache.name, scraper.cache.evictions))
+    for cache, count in evictions:
+        writer.counter('mobilebot_cache_evictions_total', 'Entries dropped to stay within a cache size limit.', count,
+                       {'cache': cache})
+
+    # Search scheduling
+    scheduler = handlers.scrape_scheduler
+    writer.gauge('mobilebot_active_searches', 'Searches currently scraping.', scheduler.active_searches())
+    writer.gauge('mobilebot_queued_searches', 'Searches waiting for a scrape slot.', scheduler.queue_depth())
+    writer.counter('mobilebot_searches_rejected_total', 'Searches refused by the per-user quota.',
+                   scheduler.stats['rejected'])
+
+    # Telegram Bot API
+    outbound = handlers.outbound
+    for method, count in list(outbound.method_calls.items()):
+        writer.counter('mobilebot_bot_api_calls_total', 'Bot API calls made, retries included.', count,
+                       {'method': method})
+    for result in ('sent', 'failed'):
+        writer.counter('mobilebot_bot_api_results_total', 'Bot API calls by final outcome.', outbound.stats[result],
+                       {'result': result})
+    writer.counter('mobilebot_bot_api_retry_after_total', 'RetryAfter (flood control) responses from Telegram.',
+                   outbound.stats['retry_after'])
+    writer.gauge('mobilebot_bot_api_queue_depth', 'Bot API calls waiting to be sent.', outbound.queue_depth())
+
+    # Updates
+    processor = bot.application.update_processor
+    writer.counter('mobilebot_updates_processed_total', 'Telegram updates handled.', processor.stats['processed'])
+    writer.gauge('mobilebot_updates_running', 'Telegram updates being handled right now.', processor.running_updates())
+    writer.counter('mobilebot_handler_errors_total', 'Errors raised by update handlers.', bot.stats['errors'])
+    if runtime is not None:
+        for result in ('received', 'rejected', 'duplicates', 'malformed', 'errors'):
+            writer.counter('mobilebot_webhook_updates_total', 'Webhook updates by outcome.', runtime.stats[result],
+                           {'result': result})
+        writer.gauge('mobilebot_webhook_queue_depth', 'Webhook updates waiting or in flight.', runtime.queue_depth())
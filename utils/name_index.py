@@ -0,0 +1,137 @@
+"""
+In-memory index of phone names seen by the scraper, used for inline queries
+"""
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Longest token prefix kept in the prefix map
+MAX_PREFIX_LENGTH = 12
+
+class PhoneNameIndex:
+    """Prefix and trigram index over known phone names
+
+    Each name is split into tokens and every token prefix maps to the
+    entries containing it, so "galaxy s2" finds "Samsung Galaxy S24".
+    Queries whose tokens do not line up with the name ("iphone15pro") fall
+    back to trigram overlap on the name with spaces removed. Lookups only
+    touch in-memory dictionaries and never wait on a scrape.
+    """
+
+    def __init__(self, max_entries: int = 5000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._prefixes: Dict[str, set] = {}
+        self._trigrams: Dict[str, set] = {}
+
+    @staticmethod
+    def normalize(name: str) -> str:
+        """Lower-case a name and keep only its alphanumeric tokens"""
+        return " ".join(_TOKEN_RE.findall((name or "").lower()))
+
+    @staticmethod
+    def _trigrams_of(text: str) -> set:
+        compact = text.replace(" ", "")
+        return {compact[i:i + 3] for i in range(len(compact) - 2)}
+
+    def add(self, product: Dict):
+        """Add or refresh a product seen by the scraper"""
+        key = self.normalize(product.get('name', ''))
+        if not key:
+            return
+
+        entry = {
+            'name': product.get('name'),
+            'price': product.get('price'),
+            'source': product.get('source'),
+            'image_url': product.get('image_url'),
+            'product_url': product.get('product_url'),
+            'specs': list((product.get('detailed_specs') or []) + (product.get('specs') or []))[:5],
+        }
+
+        with self._lock:
+            if key in self._entries:
+                # Keep details we already know if this sighting has fewer
+                previous = self._entries[key]
+                for field, value in previous.items():
+                    if not entry.get(field):
+                        entry[field] = value
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                return
+
+            self._entries[key] = entry
+            for token in key.split():
+                for length in range(1, min(len(token), MAX_PREFIX_LENGTH) + 1):
+                    self._prefixes.setdefault(token[:length], set()).add(key)
+            for trigram in self._trigrams_of(key):
+                self._trigrams.setdefault(trigram, set()).add(key)
+
+            if len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str):
+        """Drop an entry and its postings (caller holds the lock)"""
+        self._entries.pop(key, None)
+        for token in key.split():
+            for length in range(1, min(len(token), MAX_PREFIX_LENGTH) + 1):
+                postings = self._prefixes.get(token[:length])
+                if postings is not None:
+                    postings.discard(key)
+                    if not postings:
+                        del self._prefixes[token[:length]]
+        for trigram in self._trigrams_of(key):
+            postings = self._trigrams.get(trigram)
+            if postings is not None:
+                postings.discard(key)
+                if not postings:
+                    del self._trigrams[trigram]
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """Return up to ``limit`` known products matching a partial name"""
+        normalized = self.normalize(query)
+        if not normalized:
+            return []
+
+        with self._lock:
+            matches = None
+            for token in normalized.split():
+                postings = self._prefixes.get(token[:MAX_PREFIX_LENGTH], set())
+                matches = set(postings) if matches is None else matches & postings
+                if not matches:
+                    break
+
+            if matches:
+                ranked = sorted(matches, key=lambda key: (len(key), key))
+            else:
+                # Tokens did not line up, rank by shared trigrams instead
+                query_trigrams = self._trigrams_of(normalized)
+                scores: Dict[str, int] = {}
+                for trigram in query_trigrams:
+                    for key in self._trigrams.get(trigram, ()):
+                        scores[key] = scores.get(key, 0) + 1
+                threshold = max(1, len(query_trigrams) // 2)
+                ranked = sorted(
+                    (key for key, score in scores.items() if score >= threshold),
+                    key=lambda key: (-scores[key], len(key), key)
+                )
+
+            return [dict(self._entries[key]) for key in ranked[:limit]]
+
+    def names(self) -> List[str]:
+        """All indexed phone names"""
+        with self._lock:
+            return [entry['name'] for entry in self._entries.values()]
+
+    def get(self, name: str) -> Optional[Dict]:
+        """Look up a product by its exact (normalised) name"""
+        with self._lock:
+            entry = self._entries.get(self.normalize(name))
+            return dict(entry) if entry else None
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,177 @@
+"""
+On-demand sampling profiler for live processes
+"""
+import asyncio
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List
+
+# Upper bounds on a single profiling run
+MAX_SECONDS = 60
+MIN_INTERVAL = 0.001
+MAX_INTERVAL = 1.0
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep
+
+class ProfilerBusy(Exception):
+    """Another profiling run is already in progress"""
+
+def _label(code) -> str:
+    """Readable frame name without the ';' collapsed stacks use as separator"""
+    filename = code.co_filename
+    if filename.startswith(_ROOT):
+        filename = filename[len(_ROOT):]
+    else:
+        filename = '/'.join(filename.split(os.sep)[-2:])
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f"{name} ({filename}:{code.co_firstlineno})".replace(';', ':')
+
+def _frame_stack(frame) -> List[str]:
+    """Labels of a thread's frames, outermost first"""
+    stack = []
+    while frame is not None:
+        stack.append(_label(frame.f_code))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+def _task_stack(task) -> List[str]:
+    """Labels along a task's await chain, outermost first"""
+    stack = []
+    coro = task.get_coro()
+    while coro is not None:
+        frame = getattr(coro, 'cr_frame', None) or getattr(coro, 'ag_frame', None) or getattr(coro, 'gi_frame', None)
+        if frame is None:
+            break
+        stack.append(_label(frame.f_code))
+        coro = getattr(coro, 'cr_await', None) or getattr(coro, 'gi_yieldfrom', None)
+    return stack
+
+def _thread_running(native_id: int) -> bool:
+    """Whether a thread is on a CPU, from /proc (assumed running where unavailable)"""
+    try:
+        with open(f"/proc/self/task/{native_id}/stat", 'rb') as stat:
+            # The state follows the parenthesised command name
+            return stat.read().rsplit(b')', 1)[1].split()[0] == b'R'
+    except (OSError, IndexError):
+        return True
+
+class SamplingProfiler:
+    """Sample the stacks of every thread and event-loop task for a while
+
+    Nothing is installed while idle, so the profiler costs nothing until
+    ``run`` is called. A run samples ``sys._current_frames`` from the
+    calling thread every ``interval`` seconds; in 'cpu' mode only threads
+    the kernel reports as running are counted, so idle waits do not drown
+    out the hot path, while 'wall' mode counts every thread. The await
+    chains of the given loops' tasks are sampled alongside, showing what
+    suspended coroutines are waiting on. Only one run at a time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def run(self, seconds: float, interval: float = 0.01, mode: str = 'cpu',
+            loops: Iterable[asyncio.AbstractEventLoop] = ()) -> Dict:
+        """Profile for ``seconds`` and return collapsed stacks and top functions"""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already running")
+        try:
+            interval = min(max(interval, MIN_INTERVAL), MAX_INTERVAL)
+            seconds = min(max(seconds, interval), MAX_SECONDS)
+            return self._run(seconds, interval, mode, [loop for loop in loops if loop is not None])
+        finally:
+            self._lock.release()
+
+    def _run(self, seconds: float, interval: float, mode: str, loops: List) -> Dict:
+        own_ident = threading.get_ident()
+        stacks: Counter = Counter()
+        task_stacks: Counter = Counter()
+        samples = 0
+        started = time.monotonic()
+        deadline = started + seconds
+
+        while time.monotonic() < deadline:
+            threads = {thread.ident: thread for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                thread = threads.get(ident)
+                if mode == 'cpu' and thread is not None and thread.native_id and not _thread_running(thread.native_id):
+                    continue
+                name = thread.name if thread is not None else f"thread-{ident}"
+                stacks[tuple([name] + _frame_stack(frame))] += 1
+            for loop in loops:
+                try:
+                    tasks = list(asyncio.all_tasks(loop))
+                except RuntimeError:
+                    # The loop's task set changed while being copied
+                    continue
+                for task in tasks:
+                    stack = _task_stack(task)
+                    if stack:
+                        task_stacks[tuple(['asyncio-tasks'] + stack)] += 1
+            samples += 1
+            time.sleep(interval)
+
+        return {
+            'seconds': round(time.monotonic() - started, 3),
+            'interval': interval,
+            'mode': mode,
+            'samples': samples,
+            'top': self._top_functions(stacks, samples),
+            'collapsed': self._collapse(stacks),
+            'tasks_collapsed': self._collapse(task_stacks),
+        }
+
+    @staticmethod
+    def _collapse(stacks: Counter) -> str:
+        """Brendan Gregg's collapsed stack format, one 'a;b;c count' line per stack"""
+        return '\n'.join(f"{';'.join(stack)} {count}" for stack, count in stacks.most_common())
+
+    @staticmethod
+    def _top_functions(stacks: Counter, samples: int, limit: int = 30) -> List[Dict]:
+        """Functions by samples as the innermost frame (self) and anywhere on the stack (total)"""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in stacks.items():
+            frames = stack[1:]
+            if not frames:
+                continue
+            own[frames[-1]] += count
+            for function in set(frames):
+                total[function] += count
+        return [
+            {
+                'function': function,
+                'self': own[function],
+                'total': total[function],
+                'self_percent': round(100 * own[function] / samples, 1) if samples else 0.0,
+                'total_percent': round(100 * total[function] / samples, 1) if samples else 0.0,
+            }
+            for function, _ in sorted(total.items(), key=lambda item: (own[item[0]], item[1]), reverse=True)[:limit]
+        ]
+
+def authorized(token: str, headers) -> bool:
+    """Check a request's ``Authorization: Bearer`` or ``X-Debug-Token`` header in constant time"""
+    provided = headers.get('X-Debug-Token', '')
+    authorization = headers.get('Authorization', '')
+    if authorization.startswith('Bearer '):
+        provided = authorization[len('Bearer '):]
+    if not token or not provided:
+        return False
+    return hmac.compare_digest(token.encode('utf-8'), provided.encode('utf-8'))
+
+def profile_options(args) -> Dict:
+    """Profile settings from query parameters, raising ValueError on bad input"""
+    seconds = float(args.get('seconds', 10))
+    interval = float(args.get('interval', 0.01))
+    mode = args.get('mode', 'cpu')
+    output = args.get('format', 'json')
+    if not (0 < seconds and 0 < interval) or mode not in ('cpu', 'wall') or output not in ('json', 'collapsed'):
+        raise ValueError("Expected seconds > 0, interval > 0, mode=cpu|wall and format=json|collapsed")
+    return {'seconds': seconds, 'interval': interval, 'mode': mode, 'format': output}
@@ -0,0 +1,138 @@
+"""
+Spelling correction and normalisation of search queries
+"""
+import re
+import threading
+from typing import Dict, Iterable, List, Set
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+_RUN_RE = re.compile(r'[a-z]+|[0-9]+')
+
+# Words that appear in phone names but not in brand names
+COMMON_MODEL_WORDS = [
+    'galaxy', 'iphone', 'pixel', 'redmi', 'note', 'nord', 'pro', 'max', 'ultra',
+    'plus', 'mini', 'lite', 'fold', 'flip', 'edge', 'neo', 'prime', 'poco',
+    'narzo', 'reno', 'find', 'moto', 'mate', 'magic', 'phone', 'pad', 'fan',
+    'edition', 'turbo', 'power', 'play', 'smart', 'mobile',
+]
+
+class QueryCorrector:
+    """Symmetric-delete spelling corrector over known phone-name words
+
+    Every vocabulary word is stored under all strings obtained by deleting
+    up to ``max_distance`` characters from it. A misspelled query word is
+    looked up through its own deletes, so candidates are found with a few
+    dictionary probes and only those are checked with a real edit distance.
+    """
+
+    def __init__(self, brands: Iterable[str], max_distance: int = 2):
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {}
+        self._deletes: Dict[str, Set[str]] = {}
+        # Glued model tokens such as "fold5", kept whole rather than split
+        self._terms: Set[str] = set()
+
+        for word in list(brands) + COMMON_MODEL_WORDS:
+            self.add_name(word)
+
+    def add_name(self, name: str):
+        """Add the words of a phone name to the vocabulary"""
+        for word in _TOKEN_RE.findall((name or "").lower()):
+            if len(word) < 3 or word.isdigit():
+                continue
+            if any(char.isdigit() for char in word):
+                with self._lock:
+                    self._terms.add(word)
+                continue
+            with self._lock:
+                if word in self._counts:
+                    self._counts[word] += 1
+                    continue
+                self._counts[word] = 1
+                for variant in self._variants(word, self._max_distance_for(word)):
+                    self._deletes.setdefault(variant, set()).add(word)
+
+    def _max_distance_for(self, word: str) -> int:
+        """Short words only tolerate a single typo"""
+        return min(self.max_distance, 1 if len(word) < 6 else 2)
+
+    @staticmethod
+    def _variants(word: str, distance: int) -> Set[str]:
+        """The word and every string reachable by deleting up to ``distance`` characters"""
+        variants = {word}
+        frontier = {word}
+        for _ in range(distance):
+            frontier = {w[:i] + w[i + 1:] for w in frontier if len(w) > 1 for i in range(len(w))}
+            variants |= frontier
+        return variants
+
+    @staticmethod
+    def _distance(a: str, b: str) -> int:
+        """Optimal string alignment (Damerau-Levenshtein) distance"""
+        previous_row = None
+        row = list(range(len(b) + 1))
+        for i in range(1, len(a) + 1):
+            before, previous_row, row = previous_row, row, [i] + [0] * len(b)
+            for j in range(1, len(b) + 1):
+                cost = 0 if a[i - 1] == b[j - 1] else 1
+                row[j] = min(previous_row[j] + 1, row[j - 1] + 1, previous_row[j - 1] + cost)
+                if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                    row[j] = min(row[j], before[j - 2] + 1)
+        return row[-1]
+
+    def correct_word(self, word: str) -> str:
+        """Return the closest known word, or the word itself"""
+        if len(word) < 3 or word.isdigit() or word in self._counts or word in self._terms:
+            return word
+
+        max_distance = self._max_distance_for(word)
+        with self._lock:
+            candidates = set()
+            for variant in self._variants(word, max_distance):
+                candidates |= self._deletes.get(variant, set())
+            counts = {candidate: self._counts[candidate] for candidate in candidates}
+
+        best = None
+        best_key = None
+        for candidate, count in counts.items():
+            distance = self._distance(word, candidate)
+            if distance > max_distance:
+                continue
+            key = (distance, -count, candidate)
+            if best_key is None or key < best_key:
+                best, best_key = candidate, key
+        return best or word
+
+    def _split_word(self, token: str) -> List[str]:
+        """Split glued words and numbers such as "iphone15pro" into "iphone 15 pro"
+
+        Single letters stay attached to their numbers so "s24" or "a15" are
+        kept intact, also when glued to a known word as in "galaxys24".
+        Tokens seen whole in phone names, like "fold5", are not split.
+        """
+        if token in self._terms:
+            return [token]
+        runs = _RUN_RE.findall(token)
+        words = [runs[0]] if runs else []
+        for previous, run in zip(runs, runs[1:]):
+            if previous.isalpha() and len(previous) >= 3 or run.isalpha() and len(run) >= 3:
+                words.append(run)
+            else:
+                words[-1] += run
+
+        for i in range(len(words) - 1):
+            word = words[i]
+            if word.isalpha() and word not in self._counts and word[:-1] in self._counts and words[i + 1][0].isdigit():
+                words[i], words[i + 1] = word[:-1], word[-1] + words[i + 1]
+        return words
+
+    def correct(self, query: str) -> str:
+        """Normalise and spell-correct a search query"""
+        words = []
+        for token in _TOKEN_RE.findall((query or "").lower()):
+            words.extend(self.correct_word(word) for word in self._split_word(token))
+        return " ".join(words)
+
+    def __len__(self) -> int:
+        return len(self._counts)
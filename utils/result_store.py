@@ -0,0 +1,135 @@
+"""
+Shared, deduplicated store of search result sets
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+class ResultSetStore:
+    """Keep search results once for all users instead of per user_data
+
+    A result set is identified by a short id derived from the query,
+    filters and the products found, so users running the same search with
+    the same results share it, while a search that finds something else
+    gets a new id and never changes the products behind pagination
+    buttons already sent. Products are interned by content so identical
+    products are stored once across sets. Sets expire after ``ttl``
+    seconds, and the least recently used ones are evicted when the
+    estimated size exceeds ``max_bytes``.
+
+    An optional ``backing`` store (see bot.persistence.SQLitePersistence)
+    receives every new set and is consulted on a miss, so result sets
+    outlive restarts and evictions until their TTL runs out.
+    """
+
+    def __init__(self, ttl: float = 1800, max_bytes: int = 32 * 1024 * 1024, backing=None):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.backing = backing
+        self._lock = threading.Lock()
+        # result set id -> (created, [product keys])
+        self._sets: "OrderedDict[str, tuple]" = OrderedDict()
+        # product key -> [product, size, reference count]
+        self._products: Dict[str, list] = {}
+        self._bytes = 0
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'evicted': 0,
+        }
+
+    @staticmethod
+    def result_set_id(query: str, filters: Optional[Dict], product_keys: List[str]) -> str:
+        """Id of a search and its exact results, short enough for callback data"""
+        payload = json.dumps([" ".join(query.lower().split()), filters or {}, product_keys], sort_keys=True)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:12]
+
+    @staticmethod
+    def _encode(products: List[Dict]) -> tuple:
+        """Content keys of products, and (product, size) entries to intern"""
+        keys = []
+        entries = []
+        for product in products:
+            encoded = json.dumps(product, sort_keys=True, default=str)
+            keys.append(hashlib.sha1(encoded.encode('utf-8')).hexdigest())
+            entries.append((product, len(encoded)))
+        return keys, entries
+
+    def put(self, query: str, filters: Optional[Dict], products: List[Dict]) -> str:
+        """Store the products of a search and return the result set id"""
+        keys, entries = self._encode(products)
+        rsid = self.result_set_id(query, filters, keys)
+        self._insert(rsid, keys, entries, time.monotonic())
+        if self.backing:
+            self.backing.save_result_set(rsid, products)
+        return rsid
+
+    def _insert(self, rsid: str, keys: List[str], entries: List[tuple], created: float):
+        """Intern the products of a result set in memory"""
+        with self._lock:
+            self._drop_set(rsid)
+            for key, (product, size) in zip(keys, entries):
+                stored = self._products.get(key)
+                if stored:
+                    stored[2] += 1
+                else:
+                    self._products[key] = [product, size, 1]
+                    self._bytes += size
+            self._sets[rsid] = (created, keys)
+            self._evict()
+
+    def get(self, rsid: str) -> Optional[List[Dict]]:
+        """Return the products of a result set, or None if it expired"""
+        with self._lock:
+            entry = self._sets.get(rsid)
+            if entry is not None:
+                created, keys = entry
+                if time.monotonic() - created <= self.ttl:
+                    self._sets.move_to_end(rsid)
+                    self.stats['hits'] += 1
+                    return [self._products[key][0] for key in keys]
+                self._drop_set(rsid)
+                self.stats['expired'] += 1
+
+        stored = self.backing.load_result_set(rsid, self.ttl) if self.backing else None
+        if stored is None:
+            self.stats['misses'] += 1
+            return None
+
+        age, products = stored
+        self._insert(rsid, *self._encode(products), time.monotonic() - age)
+        self.stats['hits'] += 1
+        return products
+
+    def _drop_set(self, rsid: str):
+        """Remove a result set and release its products (caller holds the lock)"""
+        entry = self._sets.pop(rsid, None)
+        if entry is None:
+            return
+        for key in entry[1]:
+            stored = self._products[key]
+            stored[2] -= 1
+            if stored[2] <= 0:
+                self._bytes -= stored[1]
+                del self._products[key]
+
+    def _evict(self):
+        """Drop expired sets, then least recently used ones over the size cap"""
+        now = time.monotonic()
+        for rsid in [rsid for rsid, (created, _) in self._sets.items() if now - created > self.ttl]:
+            self._drop_set(rsid)
+            self.stats['expired'] += 1
+        while self._bytes > self.max_bytes and len(self._sets) > 1:
+            self._drop_set(next(iter(self._sets)))
+            self.stats['evicted'] += 1
+
+    def memory_usage(self) -> int:
+        """Estimated bytes held by stored products"""
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._sets)
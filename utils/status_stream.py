@@ -0,0 +1,151 @@
+"""
+Server-Sent Events stream of status counters for the dashboards
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Seconds between keep-alive comments on an idle stream
+KEEPALIVE_INTERVAL = 15
+
+# Response headers for an event stream, also telling proxies not to buffer it
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',
+}
+
+# Client side of the stream, inlined into each static status page. The
+# first event of a connection is a full snapshot, later ones only carry
+# the counters that changed (removed keys are sent as null).
+STREAM_CLIENT_JS = """
+        function mergeStats(target, delta) {
+            for (const [key, value] of Object.entries(delta)) {
+                if (value === null) {
+                    delete target[key];
+                } else if (typeof value === 'object' && !Array.isArray(value)) {
+                    target[key] = mergeStats(target[key] || {}, value);
+                } else {
+                    target[key] = value;
+                }
+            }
+            return target;
+        }
+        function formatUptime(seconds) {
+            seconds = Math.floor(seconds || 0);
+            return `${Math.floor(seconds / 3600)}h ${Math.floor(seconds % 3600 / 60)}m ${seconds % 60}s`;
+        }
+        function formatRate(rate) {
+            return rate === undefined || rate === null ? 'n/a' : `${(rate * 100).toFixed(1)}%`;
+        }
+        function setText(id, value) {
+            const element = document.getElementById(id);
+            if (element) element.textContent = value;
+        }
+        function streamStats(url, render) {
+            let state = {};
+            const source = new EventSource(url);
+            source.addEventListener('snapshot', event => { state = JSON.parse(event.data); render(state); });
+            source.onmessage = event => { mergeStats(state, JSON.parse(event.data)); render(state); };
+            source.onopen = () => setText('live', '● Live');
+            source.onerror = () => setText('live', '○ Reconnecting...');
+        }
+"""
+
+def page_etag(page: str) -> str:
+    """Strong ETag of a pre-rendered page"""
+    return hashlib.sha1(page.encode('utf-8')).hexdigest()
+
+def normalize(stats: Dict) -> Dict:
+    """Deep copy of a stats dict as plain JSON values"""
+    return json.loads(json.dumps(stats, default=str))
+
+def diff(previous: Dict, current: Dict) -> Dict:
+    """Keys of ``current`` that differ from ``previous``, recursing into dicts"""
+    delta: Dict[str, Any] = {}
+    for key, value in current.items():
+        old = previous.get(key)
+        if isinstance(value, dict) and isinstance(old, dict):
+            nested = diff(old, value)
+            if nested:
+                delta[key] = nested
+        elif key not in previous or old != value:
+            delta[key] = value
+    for key in previous.keys() - current.keys():
+        delta[key] = None
+    return delta
+
+def sse_event(data: Dict, event: Optional[str] = None) -> str:
+    """Format one Server-Sent Event"""
+    prefix = f"event: {event}\n" if event else ''
+    return f"{prefix}data: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+class StatsBroadcaster:
+    """Share one stats collector between every open dashboard
+
+    A single thread calls ``collect`` every ``interval`` seconds while at
+    least one client is subscribed, and stops once the last one leaves.
+    Each subscriber only waits on a condition and sends the difference
+    from what it last sent, so an open dashboard costs an idle thread and
+    a few bytes per change, not a page render every refresh.
+    """
+
+    def __init__(self, collect: Callable[[], Dict], interval: float = 2):
+        self.collect = collect
+        self.interval = interval
+        self._condition = threading.Condition()
+        self._snapshot: Optional[Dict] = None
+        self._version = 0
+        self._subscribers = 0
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        while True:
+            try:
+                snapshot = normalize(self.collect())
+            except Exception as e:
+                logger.error(f"Stats collection failed: {e}")
+                snapshot = self._snapshot
+            with self._condition:
+                if snapshot != self._snapshot:
+                    self._snapshot = snapshot
+                    self._version += 1
+                    self._condition.notify_all()
+                if not self._subscribers:
+                    self._thread = None
+                    return
+            time.sleep(self.interval)
+
+    def stream(self) -> Iterator[str]:
+        """Yield SSE text for one client: a snapshot, then deltas"""
+        with self._condition:
+            self._subscribers += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stats-stream", daemon=True)
+                self._thread.start()
+        try:
+            yield f"retry: {int(self.interval * 2000)}\n\n"
+            sent: Optional[Dict] = None
+            version = 0
+            while True:
+                with self._condition:
+                    self._condition.wait_for(lambda: self._version != version, KEEPALIVE_INTERVAL)
+                    snapshot, current = self._snapshot, self._version
+                if current == version or snapshot is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                version = current
+                if sent is None:
+                    yield sse_event(snapshot, 'snapshot')
+                else:
+                    delta = diff(sent, snapshot)
+                    if delta:
+                        yield sse_event(delta)
+                sent = snapshot
+        finally:
+            with self._condition:
+                self._subscribers -= 1
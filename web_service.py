@@ -5,17 +5,12 @@ Web service for Telegram bot with status page and webhook support
 import os
 import logging
 from datetime import datetime
-from flask import Flask, render_template_string, request, jsonify
-try:
-    from telegram import Update
-    from telegram.ext import Application
-except ImportError:
-    # Fallback if telegram imports fail
-    Update = None
-    Application = None
+from flask import Flask, request, jsonify
 from config import Config
-from bot.telegram_bot import MobileBot
-import asyncio
+from utils.metrics import CONTENT_TYPE, MetricsWriter, collect_bot_metrics, collect_process_metrics
+from utils.profiler import ProfilerBusy, SamplingProfiler, authorized, profile_options
+from utils.status_stream import STREAM_CLIENT_JS, SSE_HEADERS, StatsBroadcaster, page_etag
+import atexit
 import threading
 
 # Configure logging
@@ -28,6 +23,8 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 config = Config()
 bot_instance = None
+bot_runtime = None
+profiler = SamplingProfiler()
 bot_status = {
     'status': 'Starting...',
     'start_time': datetime.now(),
@@ -37,7 +34,7 @@ bot_status = {
     'is_webhook': False
 }
 
-# HTML template for status page
+# Static status page; the counters are filled in from the stats stream
 STATUS_HTML = """
 <!DOCTYPE html>
 <html lang="en">
@@ -62,18 +59,28 @@ STATUS_HTML = """
         .feature-list { list-style: none; padding: 0; }
         .feature-list li { padding: 10px; background: #e9ecef; margin: 5px 0; border-radius: 5px; }
         .feature-list li::before { content: "✓ "; color: #28a745; font-weight: bold; }
-        .refresh-btn { 
-            background: #007bff; color: white; border: none; padding: 10px 20px; 
-            border-radius: 5px; cursor: pointer; font-size: 16px; margin-top: 20px;
-        }
-        .refresh-btn:hover { background: #0056b3; }
+        .live { text-align: center; color: #6c757d; margin-top: 30px; }
     </style>
     <script>
-        function refreshStatus() {
-            location.reload();
+/*STREAM_CLIENT_JS*/
+        function render(stats) {
+            const running = (stats.status || '').startsWith('Running');
+            document.getElementById('status-card').className = 'status-card ' + (running ? 'status-online' : 'status-offline');
+            setText('status', stats.status || 'Unknown');
+            setText('uptime', formatUptime(stats.uptime_seconds));
+            setText('total-requests', stats.total_requests || 0);
+            setText('mode', stats.is_webhook ? 'Webhook' : 'Polling');
+            setText('last-update', stats.last_update || 'Never');
+            setText('bot-token', stats.bot_token ? 'Configured ✓' : 'Missing ✗');
+            const rates = stats.cache_hit_rates || {};
+            setText('search-cache', formatRate(rates.search));
+            setText('details-cache', formatRate(rates.details));
+            const search = (stats.latency || {}).search || {};
+            setText('search-latency', search.count ? `${search.p50}s / ${search.p95}s` : 'n/a');
+            setText('scrape-queue', (stats.scrape_queue || {}).depth || 0);
+            setText('update-queue', (stats.update_queue || {}).depth || 0);
         }
-        // Auto-refresh every 30 seconds
-        setTimeout(function(){ location.reload(); }, 30000);
+        document.addEventListener('DOMContentLoaded', () => streamStats('/api/stats/stream', render));
     </script>
 </head>
 <body>
@@ -84,34 +91,59 @@ STATUS_HTML = """
         </div>
         
         <div class="status-grid">
-            <div class="status-card {{ 'status-online' if status.status == 'Running' else 'status-offline' }}">
+            <div class="status-card status-offline" id="status-card">
                 <h3>Bot Status</h3>
-                <p>{{ status.status }}</p>
+                <p id="status">Connecting...</p>
             </div>
             
             <div class="status-card">
                 <h3>Uptime</h3>
-                <p>{{ uptime }}</p>
+                <p id="uptime">-</p>
             </div>
             
             <div class="status-card">
                 <h3>Total Requests</h3>
-                <p>{{ status.total_requests }}</p>
+                <p id="total-requests">-</p>
             </div>
             
             <div class="status-card">
                 <h3>Connection Type</h3>
-                <p>{{ 'Webhook' if status.is_webhook else 'Polling' }}</p>
+                <p id="mode">-</p>
             </div>
             
             <div class="status-card">
                 <h3>Last Update</h3>
-                <p>{{ status.last_update or 'Never' }}</p>
+                <p id="last-update">-</p>
             </div>
             
             <div class="status-card">
                 <h3>Bot Token</h3>
-                <p>{{ 'Configured ✓' if bot_token else 'Missing ✗' }}</p>
+                <p id="bot-token">-</p>
+            </div>
+            
+            <div class="status-card">
+                <h3>Search Cache Hits</h3>
+                <p id="search-cache">-</p>
+            </div>
+            
+            <div class="status-card">
+                <h3>Details Cache Hits</h3>
+                <p id="details-cache">-</p>
+            </div>
+            
+            <div class="status-card">
+                <h3>Search Time p50 / p95</h3>
+                <p id="search-latency">-</p>
+            </div>
+            
+            <div class="status-card">
+                <h3>Queued Searches</h3>
+                <p id="scrape-queue">-</p>
+            </div>
+            
+            <div class="status-card">
+                <h3>Queued Updates</h3>
+                <p id="update-queue">-</p>
             </div>
         </div>
         
@@ -127,33 +159,20 @@ STATUS_HTML = """
             </ul>
         </div>
         
-        <button class="refresh-btn" onclick="refreshStatus()">🔄 Refresh Status</button>
-        <p style="text-align: center; color: #6c757d; margin-top: 30px;">
-            Last updated: {{ datetime.now().strftime('%Y-%m-%d %H:%M:%S UTC') }}
-        </p>
+        <p class="live" id="live">Connecting...</p>
     </div>
 </body>
 </html>
-"""
+""".replace('/*STREAM_CLIENT_JS*/', STREAM_CLIENT_JS)
+STATUS_ETAG = page_etag(STATUS_HTML)
 
 @app.route('/')
 def status_page():
-    """Display bot status page"""
-    global bot_status
-    
-    # Calculate uptime
-    uptime_delta = datetime.now() - bot_status['start_time']
-    hours, remainder = divmod(int(uptime_delta.total_seconds()), 3600)
-    minutes, seconds = divmod(remainder, 60)
-    uptime = f"{hours}h {minutes}m {seconds}s"
-    
-    return render_template_string(
-        STATUS_HTML,
-        status=bot_status,
-        uptime=uptime,
-        bot_token=bool(config.BOT_TOKEN),
-        datetime=datetime
-    )
+    """Display bot status page (static, revalidated by ETag)"""
+    response = app.response_class(STATUS_HTML, mimetype='text/html')
+    response.set_etag(STATUS_ETAG)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 @app.route('/webhook', methods=['POST'])
 def webhook():
@@ -161,33 +180,28 @@ def webhook():
     global bot_status
     
     try:
-        if not bot_instance:
+        if not bot_runtime:
             return jsonify({'error': 'Bot not initialized'}), 500
             
         # Get update from Telegram
         json_data = request.get_json()
         if not json_data:
             return jsonify({'error': 'No JSON data'}), 400
-            
-        if Update and bot_instance:
-            # Create Update object and process it
-            update = Update.de_json(json_data, bot_instance.application.bot)
-            
-            # Update statistics
-            bot_status['total_requests'] += 1
-            bot_status['last_update'] = datetime.now().strftime('%H:%M:%S')
-            
-            # Process the update in a separate thread to avoid blocking
-            def process_update():
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                loop.run_until_complete(bot_instance.application.process_update(update))
-                loop.close()
-            
-            threading.Thread(target=process_update, daemon=True).start()
-        else:
-            bot_status['total_requests'] += 1
-            bot_status['last_update'] = datetime.now().strftime('%H:%M:%S')
+        
+        # Hand the update to the bot loop and acknowledge right away; when
+        # the queue is full Telegram is asked to redeliver it later
+        try:
+            accepted = bot_runtime.submit(json_data)
+        except ValueError as e:
+            logger.warning(f"Dropping webhook request: {e}")
+            return jsonify({'error': 'Malformed update'}), 400
+        if not accepted:
+            logger.warning("Update queue full, asking Telegram to retry")
+            return jsonify({'error': 'Busy'}), 503, {'Retry-After': '1'}
+        
+        # Update statistics
+        bot_status['total_requests'] += 1
+        bot_status['last_update'] = datetime.now().strftime('%H:%M:%S')
         
         return jsonify({'status': 'ok'}), 200
         
@@ -197,25 +211,25 @@ def webhook():
 
 @app.route('/set_webhook', methods=['POST'])
 def set_webhook():
-    """Set webhook URL for the bot"""
+    """Set webhook URL for the bot (needs DEBUG_TOKEN)"""
     global bot_status
     
+    # Anyone could otherwise point the bot's updates at their own server
+    if not config.DEBUG_TOKEN:
+        return jsonify({'error': 'Not found'}), 404
+    if not authorized(config.DEBUG_TOKEN, request.headers):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
     try:
         webhook_url = request.json.get('url') if request.json else None
         if not webhook_url:
             # Use default webhook URL
             webhook_url = f"https://{os.getenv('REPL_SLUG', 'telegram-bot')}.{os.getenv('REPL_OWNER', 'user')}.repl.co/webhook"
         
-        if bot_instance and hasattr(bot_instance, 'application'):
+        if bot_runtime:
             try:
-                # Set webhook in separate thread
-                def set_webhook_async():
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    loop.run_until_complete(bot_instance.application.bot.set_webhook(url=webhook_url))
-                    loop.close()
-                
-                threading.Thread(target=set_webhook_async, daemon=True).start()
+                # Registered from the bot loop, which also stops polling
+                bot_runtime.run(bot_runtime.set_webhook(webhook_url))
                 
                 bot_status['webhook_url'] = webhook_url
                 bot_status['is_webhook'] = True
@@ -236,14 +250,93 @@ def set_webhook():
         logger.error(f"Error setting webhook: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/health')
+def health_check():
+    """Health check endpoint, answered while the bot is still starting"""
+    return jsonify({
+        'status': 'healthy',
+        'bot': bot_status['status'],
+        'timestamp': datetime.now().isoformat(),
+        'service': 'telegram-mobile-bot'
+    }), 200
+
+def collect_stats():
+    """Current bot statistics, shared by the stats API and its stream"""
+    stats = dict(bot_status)
+    stats['uptime_seconds'] = int((datetime.now() - bot_status['start_time']).total_seconds())
+    stats['bot_token'] = bool(config.BOT_TOKEN)
+    if bot_instance:
+        # Share of searches and product pages answered from the scrape cache
+        stats['cache_hit_rates'] = bot_instance.scraper.cache_hit_rates()
+        # Search pipeline stage latencies (p50/p95/p99 seconds, per source)
+        stats['latency'] = bot_instance.handlers.latency.snapshot()
+        # How often product captions had to be shortened to fit Telegram's limit
+        stats['captions'] = dict(bot_instance.handlers.formatter.caption_stats)
+        # Scrape scheduling: waiting searches, and active users and worst waits
+        # (per user only behind DEBUG_TOKEN, at /debug/scrape_users)
+        scheduler = bot_instance.handlers.scrape_scheduler
+        stats['scrape_queue'] = dict(scheduler.stats, depth=scheduler.queue_depth())
+        stats['scrape_users'] = scheduler.user_summary()
+    if bot_runtime:
+        stats['update_queue'] = dict(bot_runtime.stats, depth=bot_runtime.queue_depth())
+    return stats
+
+stats_broadcaster = StatsBroadcaster(collect_stats, config.STATS_STREAM_INTERVAL)
+
 @app.route('/api/stats')
 def api_stats():
     """API endpoint for bot statistics"""
-    return jsonify(bot_status)
+    return jsonify(collect_stats())
+
+@app.route('/api/stats/stream')
+def api_stats_stream():
+    """Server-Sent Events stream of the statistics, sending only what changed"""
+    return app.response_class(stats_broadcaster.stream(), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics, read from the bot's counters at scrape time"""
+    writer = MetricsWriter()
+    writer.gauge('mobilebot_bot_up', 'Whether the bot is running.', bot_runtime is not None)
+    writer.counter('mobilebot_webhook_requests_total', 'Webhook requests accepted.', bot_status['total_requests'])
+    if bot_instance:
+        collect_bot_metrics(writer, bot_instance, bot_runtime)
+    collect_process_metrics(writer)
+    return app.response_class(writer.render(), content_type=CONTENT_TYPE)
+
+@app.route('/debug/scrape_users')
+def debug_scrape_users():
+    """Scrape queue depth and wait times per user id (needs DEBUG_TOKEN)"""
+    if not config.DEBUG_TOKEN:
+        return jsonify({'error': 'Not found'}), 404
+    if not authorized(config.DEBUG_TOKEN, request.headers):
+        return jsonify({'error': 'Unauthorized'}), 401
+    users = bot_instance.handlers.scrape_scheduler.user_stats() if bot_instance else {}
+    return jsonify({str(user_id): s for user_id, s in users.items()})
+
+@app.route('/debug/profile')
+def debug_profile():
+    """Sample every thread and the bot's tasks for a few seconds (needs DEBUG_TOKEN)"""
+    if not config.DEBUG_TOKEN:
+        return jsonify({'error': 'Not found'}), 404
+    if not authorized(config.DEBUG_TOKEN, request.headers):
+        return jsonify({'error': 'Unauthorized'}), 401
+    try:
+        options = profile_options(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    output = options.pop('format')
+    try:
+        result = profiler.run(loops=[bot_runtime.loop] if bot_runtime else [], **options)
+    except ProfilerBusy as e:
+        return jsonify({'error': str(e)}), 409
+    if output == 'collapsed':
+        return app.response_class(result['collapsed'] + '\n', content_type='text/plain; charset=utf-8')
+    return jsonify(result)
 
 def start_bot():
     """Start the Telegram bot"""
-    global bot_instance, bot_status
+    global bot_instance, bot_runtime, bot_status
     
     try:
         if not config.BOT_TOKEN:
@@ -251,22 +344,20 @@ def start_bot():
             logger.error("BOT_TOKEN not found")
             return
             
-        # Initialize bot
+        # Initialize bot; the bot stack is imported here so the web
+        # endpoints are up before it has loaded
         try:
-            bot_instance = MobileBot(config)
+            from bot.telegram_bot import MobileBot
+            from bot.runtime import BotRuntime
+            bot = MobileBot(config)
+            
+            # One event loop for the bot, polling until a webhook is set
+            runtime = BotRuntime(bot, config.WEBHOOK_QUEUE_SIZE, config.WEBHOOK_DEDUP_WINDOW)
+            runtime.start(polling=True)
+            atexit.register(runtime.stop)
+            bot_instance, bot_runtime = bot, runtime
             bot_status['status'] = 'Running'
             logger.info("Bot initialized successfully")
-            
-            # Start polling in a separate thread
-            def run_polling():
-                try:
-                    bot_instance.run()
-                except Exception as e:
-                    logger.error(f"Bot polling error: {e}")
-                    bot_status['status'] = f'Error: {str(e)}'
-            
-            polling_thread = threading.Thread(target=run_polling, daemon=True)
-            polling_thread.start()
         except ImportError as e:
             logger.warning(f"Bot initialization failed due to import error: {e}")
             bot_status['status'] = 'Bot Disabled (Import Error)'
@@ -279,8 +370,8 @@ def start_bot():
         bot_status['status'] = f'Error: {str(e)}'
 
 if __name__ == '__main__':
-    # Start the bot
-    start_bot()
+    # Start the bot in the background so the web service answers at once
+    threading.Thread(target=start_bot, daemon=True).start()
     
     # Start web server
     port = int(os.environ.get('PORT', 5000))